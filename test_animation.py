@@ -0,0 +1,129 @@
+"""逐帧写出动画的测试：GIF和APNG经Pillow读回后的帧数、时长、循环次数和画面"""
+import io
+
+import pytest
+
+import 全能格式转换器 as fc
+
+Image = pytest.importorskip("PIL.Image")
+
+RED = (255, 0, 0, 255)
+BLUE = (0, 0, 255, 255)
+GREEN = (0, 255, 0, 255)
+CLEAR = (0, 0, 0, 0)
+
+
+def solid(color, square=None, square_color=BLUE):
+    frame = Image.new("RGBA", (16, 16), color)
+    if square:
+        frame.paste(square_color, square)
+    return frame
+
+
+def sample_frames():
+    """第2、3帧相同；第4帧左半透明"""
+    half_clear = solid(GREEN, (0, 0, 8, 16), CLEAR)
+    return [
+        (solid(RED), 100),
+        (solid(RED, (4, 4, 8, 8)), 100),
+        (solid(RED, (4, 4, 8, 8)), 100),
+        (half_clear, 100),
+        (solid(RED, (10, 10, 14, 14)), 100),
+    ]
+
+
+def read_frames(data):
+    image = Image.open(io.BytesIO(data))
+    frames = []
+    for index in range(image.n_frames):
+        image.seek(index)
+        frames.append((image.convert("RGBA"), image.info.get("duration")))
+    return image, frames
+
+
+def same_picture(actual, expected):
+    """透明像素只比较透明度"""
+    actual_bytes, expected_bytes = actual.tobytes(), expected.tobytes()
+    for offset in range(0, len(expected_bytes), 4):
+        pixel_actual, pixel_expected = actual_bytes[offset:offset + 4], expected_bytes[offset:offset + 4]
+        if pixel_expected[3] == 0:
+            if pixel_actual[3] != 0:
+                return False
+        elif pixel_actual != pixel_expected:
+            return False
+    return True
+
+
+def test_gif_round_trip():
+    frames = sample_frames()
+    fp = io.BytesIO()
+    seen = []
+    count = fc.write_gif_stream(fp, iter(frames), loop=0, on_frame=seen.append)
+    image, decoded = read_frames(fp.getvalue())
+    assert count == 4
+    assert seen == [0, 1, 3, 4]  # 与上一帧相同的帧合并，不单独回调
+    assert image.info["loop"] == 0
+    assert [duration for _, duration in decoded] == [100, 200, 100, 100]
+    expected = [frames[0][0], frames[1][0], frames[3][0], frames[4][0]]
+    for (actual, _), picture in zip(decoded, expected):
+        assert same_picture(actual, picture)  # 第4帧左半透明，不露出上一帧的画面
+
+
+def test_gif_without_loop_plays_once():
+    fp = io.BytesIO()
+    fc.write_gif_stream(fp, iter(sample_frames()[:2]))
+    image = Image.open(io.BytesIO(fp.getvalue()))
+    assert "loop" not in image.info
+    assert b"NETSCAPE2.0" not in fp.getvalue()
+    assert image.n_frames == 2
+
+
+def test_apng_round_trip():
+    frames = sample_frames()
+    fp = io.BytesIO()
+    seen = []
+    written = fc.write_apng_stream(fp, iter(frames), len(frames), loop=3, on_frame=seen.append)
+    image, decoded = read_frames(fp.getvalue())
+    assert written == 5
+    assert seen == [0, 1, 2, 3, 4]
+    assert image.info["loop"] == 3
+    assert [duration for _, duration in decoded] == [100] * 5
+    for (actual, _), (picture, _) in zip(decoded, frames):
+        assert actual.tobytes() == picture.tobytes()
+
+
+def test_apng_rewrites_frame_count_when_source_is_short():
+    frames = sample_frames()[:3]
+    fp = io.BytesIO()
+    assert fc.write_apng_stream(fp, iter(frames), 5) == 3
+    image, decoded = read_frames(fp.getvalue())
+    assert image.n_frames == 3
+    assert decoded[-1][0].tobytes() == frames[-1][0].tobytes()
+
+
+def test_apng_stops_at_frame_count():
+    fp = io.BytesIO()
+    assert fc.write_apng_stream(fp, iter(sample_frames()), 2) == 2
+    assert Image.open(io.BytesIO(fp.getvalue())).n_frames == 2
+
+
+def test_apng_without_frames_fails():
+    with pytest.raises(ValueError):
+        fc.write_apng_stream(io.BytesIO(), iter([]), 3)
+
+
+class UnseekableWriter(io.RawIOBase):
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+
+def test_apng_short_source_on_unseekable_output_fails():
+    with pytest.raises(ValueError):
+        fc.write_apng_stream(UnseekableWriter(), iter(sample_frames()[:2]), 5)
@@ -0,0 +1,57 @@
+"""并行批量执行器的测试：进程池中的任务回报进度，各通道共用并行名额"""
+import threading
+import time
+
+import 全能格式转换器 as fc
+
+
+def report_half(path, progress=None):
+    """进程池中的任务：回报50%后等待主进程看到进度（以文件出现为信号）再结束"""
+    progress(50)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            with open(path):
+                return "done"
+        except OSError:
+            time.sleep(0.05)
+    return "timeout"
+
+
+def sleep_job(seconds, progress=None):
+    time.sleep(seconds)
+    return seconds
+
+
+def test_process_jobs_report_progress(tmp_path):
+    signal_file = tmp_path / "seen"
+    seen = []
+    
+    def on_progress(value):
+        seen.append(value)
+        if value == 50 and not signal_file.exists():
+            signal_file.write_text("ok")
+    
+    results = []
+    fc.BatchExecutor(2).run([fc.BatchJob(0, "a", "process", report_half, (str(signal_file),))],
+                            lambda job, result, error: results.append((result, error)), on_progress)
+    assert results == [("done", None)]
+    assert 50 in seen and seen[-1] == 100
+
+
+def test_lanes_share_one_limit():
+    running = []
+    peak = [0]
+    lock = threading.Lock()
+    
+    def tracked(progress=None):
+        with lock:
+            running.append(1)
+            peak[0] = max(peak[0], len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+    
+    jobs = [fc.BatchJob(index, str(index), "subprocess" if index % 2 else "serial", tracked) for index in range(8)]
+    fc.BatchExecutor(2).run(jobs, lambda job, result, error: None)
+    assert peak[0] <= 2
@@ -0,0 +1,53 @@
+"""基准测试结果对比和百分位数的测试"""
+import pytest
+
+import 全能格式转换器 as fc
+
+
+def result(**cases):
+    return {"cases": cases}
+
+
+def case(files_per_sec=10.0, p50_ms=100.0, p95_ms=200.0, peak_rss_mb=50.0, output_bytes=1000, converted=5, **extra):
+    return dict(files_per_sec=files_per_sec, p50_ms=p50_ms, p95_ms=p95_ms, peak_rss_mb=peak_rss_mb,
+                output_bytes=output_bytes, converted=converted, **extra)
+
+
+def test_percentile_interpolates():
+    assert fc._percentile([], 0.5) is None
+    assert fc._percentile([5], 0.95) == 5
+    assert fc._percentile([4, 1, 3, 2], 0.5) == 2.5
+    assert fc._percentile([1, 2, 3, 4, 5], 1.0) == 5
+    assert fc._percentile(list(range(101)), 0.95) == pytest.approx(95)
+
+
+def test_unchanged_results_have_no_regressions():
+    rows = fc.compare_bench_results(result(a=case()), result(a=case()))
+    assert len(rows) == len(fc.BENCH_METRICS)
+    assert not any(row[5] for row in rows)
+
+
+def test_direction_of_each_metric():
+    rows = fc.compare_bench_results(result(a=case()), result(a=case(files_per_sec=8.0, peak_rss_mb=40.0)))
+    regressed = {row[1] for row in rows if row[5]}
+    assert regressed == {"files_per_sec"}  # 吞吐量下降是退化，内存减少是改进
+
+
+def test_threshold():
+    rows = fc.compare_bench_results(result(a=case()), result(a=case(p95_ms=215.0)), threshold=0.10)
+    assert not any(row[5] for row in rows)
+    rows = fc.compare_bench_results(result(a=case()), result(a=case(p95_ms=215.0)), threshold=0.05)
+    assert [row[1] for row in rows if row[5]] == ["p95_ms"]
+
+
+def test_small_latency_changes_are_noise():
+    rows = fc.compare_bench_results(result(a=case(p50_ms=1.0)), result(a=case(p50_ms=2.5)))
+    assert not any(row[5] for row in rows)
+
+
+def test_skipped_cases_and_different_file_counts():
+    baseline = result(a=case(), b=case(), c=case())
+    current = result(a=case(output_bytes=5000, converted=4), b={"skipped": "未安装"}, d=case())
+    rows = fc.compare_bench_results(baseline, current)
+    assert {row[0] for row in rows} == {"a"}
+    assert "output_bytes" not in {row[1] for row in rows}
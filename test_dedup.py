@@ -0,0 +1,87 @@
+"""按内容查重的测试：大小预筛、哈希分组和重复文件输出的生成"""
+import os
+
+import pytest
+
+import 全能格式转换器 as fc
+
+
+def write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.fixture
+def batch(tmp_path):
+    src = tmp_path / "src"
+    return {
+        "a": write(src / "a.png", b"same content"),
+        "copy": write(src / "x" / "copy.png", b"same content"),
+        "other": write(src / "b.png", b"SAME CONTENT"),  # 大小相同、内容不同
+        "small": write(src / "c.png", b"tiny"),
+    }
+
+
+def test_only_files_with_equal_sizes_are_hashed(batch):
+    plan = fc.DuplicatePlan(list(batch.values()))
+    assert plan.unique == [batch["a"], batch["other"], batch["small"]]
+    assert plan.duplicates == {batch["a"]: [batch["copy"]]}
+    assert plan.duplicate_count == 1
+    assert batch["small"] not in plan.hashes
+    assert plan.hashed_bytes == 3 * len(b"same content")
+
+
+def test_different_conversion_types_are_not_duplicates(batch):
+    kinds = {path: "image_convert" for path in batch.values()}
+    kinds[batch["copy"]] = "pdf_to_word"
+    assert fc.DuplicatePlan(list(batch.values()), kinds).duplicates == {}
+
+
+def test_materialize_hardlinks_duplicate_output(batch, tmp_path):
+    plan = fc.DuplicatePlan(list(batch.values()))
+    output = write(tmp_path / "out" / "a.webp", b"converted")
+    write(tmp_path / "out" / "copy.webp", b"from an earlier run")
+    created, failed = plan.materialize(batch["a"], output)
+    duplicate_output = str(tmp_path / "out" / "copy.webp")
+    assert created == [(batch["copy"], duplicate_output)] and failed == []
+    assert os.path.samefile(output, duplicate_output)
+    assert (plan.saved_files, plan.saved_bytes) == (1, len(b"same content"))
+
+
+def test_materialize_copies_when_hardlinks_fail(batch, tmp_path, monkeypatch):
+    def no_links(source, target):
+        raise OSError("not supported")
+    monkeypatch.setattr(os, "link", no_links)
+    plan = fc.DuplicatePlan(list(batch.values()))
+    output = write(tmp_path / "out" / "a.webp", b"converted")
+    created, failed = plan.materialize(batch["a"], output)
+    assert failed == []
+    assert open(created[0][1], "rb").read() == b"converted"
+    assert not os.path.samefile(output, created[0][1])
+
+
+def test_duplicate_never_replaces_another_output(tmp_path):
+    src = tmp_path / "src"
+    primary = write(src / "a.png", b"red")
+    duplicate = write(src / "x" / "photo.png", b"red")
+    unrelated = write(src / "y" / "photo.png", b"blu")
+    plan = fc.DuplicatePlan([primary, duplicate, unrelated])
+    write(tmp_path / "out" / "photo.webp", b"converted from y/photo.png")
+    output = write(tmp_path / "out" / "a.webp", b"converted from a.png")
+    created, failed = plan.materialize(primary, output)
+    assert created == []
+    assert [path for path, _ in failed] == [duplicate]
+    assert (tmp_path / "out" / "photo.webp").read_bytes() == b"converted from y/photo.png"
+
+
+def test_two_duplicates_with_the_same_name(tmp_path):
+    src = tmp_path / "src"
+    primary = write(src / "a.png", b"red")
+    first = write(src / "x" / "photo.png", b"red")
+    second = write(src / "y" / "photo.png", b"red")
+    plan = fc.DuplicatePlan([primary, first, second])
+    output = write(tmp_path / "out" / "a.webp", b"converted")
+    created, failed = plan.materialize(primary, output)
+    assert [path for path, _ in created] == [first]
+    assert [path for path, _ in failed] == [second]
@@ -0,0 +1,54 @@
+"""目录扫描的测试：扩展名、通配符、深度和符号链接处理方式"""
+import os
+
+import pytest
+
+import 全能格式转换器 as fc
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for path in ("a.jpg", "b.PNG", "notes.txt", "sub/c.jpg", "sub/deep/d.jpg", "skip/e.jpg"):
+        target = tmp_path / "root" / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(b"x")
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "linked.jpg").write_bytes(b"x")
+    return tmp_path
+
+
+def scan(root, **kwargs):
+    return sorted(os.path.relpath(path, root) for path in fc.DirectoryScanner(str(root), **kwargs).scan())
+
+
+def test_extensions_are_case_insensitive(tree):
+    root = tree / "root"
+    assert scan(root, extensions=[".jpg", ".png"]) == ["a.jpg", "b.PNG", "skip/e.jpg", "sub/c.jpg", "sub/deep/d.jpg"]
+
+
+def test_include_exclude_and_depth(tree):
+    root = tree / "root"
+    assert scan(root, extensions=[".jpg"], exclude=["skip"]) == ["a.jpg", "sub/c.jpg", "sub/deep/d.jpg"]
+    assert scan(root, extensions=[".jpg"], include=["*/deep/*"]) == ["sub/deep/d.jpg"]
+    assert scan(root, extensions=[".jpg"], max_depth=0) == ["a.jpg"]
+    assert scan(root, extensions=[".jpg"], max_depth=1) == ["a.jpg", "skip/e.jpg", "sub/c.jpg"]
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink") or os.name == "nt", reason="需要符号链接")
+def test_symlink_policies(tree):
+    root = tree / "root"
+    os.symlink(tree / "outside" / "linked.jpg", root / "file-link.jpg")
+    os.symlink(tree / "outside", root / "dir-link")
+    os.symlink(root, root / "sub" / "loop")  # 链接成环
+    files = scan(root, extensions=[".jpg"], symlinks="files")
+    assert "file-link.jpg" in files and not any(path.startswith("dir-link") for path in files)
+    followed = scan(root, extensions=[".jpg"], symlinks="follow")
+    assert "dir-link/linked.jpg" in followed
+    assert len(followed) == len(set(followed)) and not any("loop" in path for path in followed)
+    assert "file-link.jpg" not in scan(root, extensions=[".jpg"], symlinks="skip")
+
+
+def test_unknown_symlink_policy():
+    with pytest.raises(ValueError):
+        fc.DirectoryScanner(".", symlinks="bogus")
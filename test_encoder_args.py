@@ -0,0 +1,22 @@
+"""音视频编码预设参数的测试，不需要ffmpeg"""
+import 全能格式转换器 as fc
+
+
+def test_video_args_default_preset_is_empty():
+    assert fc.build_video_args("mp4", {}) == []
+
+
+def test_video_args_quality_implies_balanced_preset():
+    assert fc.build_video_args("mp4", {"crf": 28}) == ["-c:v", "libx264", "-preset", "medium", "-crf", "28"]
+    assert fc.build_video_args("mp4", {"video_bitrate": "4M"}) == ["-c:v", "libx264", "-preset", "medium", "-b:v", "4M"]
+
+
+def test_video_args_custom_codec_drops_preset_arguments():
+    assert fc.build_video_args("mp4", {"preset": "fast", "video_codec": "mpeg4", "crf": 20}) == ["-c:v", "mpeg4"]
+    assert fc.build_video_args("mkv", {"video_codec": "libx265", "crf": 20}) == ["-c:v", "libx265", "-crf", "20"]
+
+
+def test_audio_args():
+    assert fc.build_audio_args("mp3", {}) == []
+    assert fc.build_audio_args("mp3", {"preset": "archive"}) == ["-c:a", "libmp3lame", "-q:a", "0"]
+    assert fc.build_audio_args("mp3", {"audio_bitrate": "320k", "sample_rate": 44100}) == ["-c:a", "libmp3lame", "-b:a", "320k", "-ar", "44100"]
@@ -0,0 +1,237 @@
+"""转换服务的测试：任务队列的状态变化，以及HTTP接口的校验（Host、Content-Type、令牌、允许的目录）"""
+import http.client
+import json
+import os
+import threading
+
+import pytest
+
+import 全能格式转换器 as fc
+
+TOKEN = "test-token"
+
+
+@pytest.fixture
+def job_queue(tmp_path):
+    job_queue = fc.JobQueue(str(tmp_path / "jobs.sqlite3"))
+    yield job_queue
+    job_queue.close()
+
+
+def submit(job_queue, source="/data/a.png", output_dir="/data/out", options=None, **kwargs):
+    return job_queue.submit("image_convert", source, output_dir, options or {"target_format": "webp"}, **kwargs)
+
+
+def test_submit_and_claim_in_priority_order(job_queue):
+    first, _ = submit(job_queue, "/data/a.png")
+    second, _ = submit(job_queue, "/data/b.png")
+    urgent, _ = submit(job_queue, "/data/c.png", priority=5)
+    assert first["state"] == "queued" and first["options"] == {"target_format": "webp"}
+    assert [job_queue.claim(["image_convert"])["id"] for _ in range(3)] == [urgent["id"], first["id"], second["id"]]
+    assert job_queue.claim(["image_convert"]) is None
+    assert job_queue.get(first["id"])["state"] == "running"
+
+
+def test_claim_only_takes_requested_types(job_queue):
+    job_queue.submit("audio_convert", "/data/a.wav", "/data/out", {"target_format": "mp3"})
+    assert job_queue.claim(["image_convert"]) is None
+    assert job_queue.claim(["audio_convert", "video_convert"])["conversion_type"] == "audio_convert"
+
+
+def test_same_unfinished_job_is_reused(job_queue):
+    job, reused = submit(job_queue)
+    assert not reused
+    again, reused = submit(job_queue)
+    assert reused and again["id"] == job["id"]
+    forced, reused = submit(job_queue, incremental=False)
+    assert not reused and forced["id"] != job["id"]
+    other, reused = submit(job_queue, options={"target_format": "png"})
+    assert not reused
+    job_queue.finish(job["id"], "done", "/data/out/a.webp")
+    job_queue.finish(forced["id"], "failed", error="坏文件")
+    assert not submit(job_queue)[1]  # 已结束的任务不复用
+
+
+def test_finish_and_cancel(job_queue):
+    running, _ = submit(job_queue, "/data/a.png")
+    queued, _ = submit(job_queue, "/data/b.png")
+    job_queue.claim(["image_convert"])
+    assert not job_queue.cancel_queued(running["id"])
+    assert job_queue.cancel_queued(queued["id"])
+    assert not job_queue.cancel_queued(queued["id"])
+    job_queue.finish(running["id"], "done", "/data/out/a.webp", "encode", 1.5)
+    done = job_queue.get(running["id"])
+    assert (done["state"], done["output"], done["method"], done["elapsed"]) == ("done", "/data/out/a.webp", "encode", 1.5)
+    assert job_queue.get(queued["id"])["error"] == "已取消"
+    assert job_queue.counts() == {"queued": 0, "running": 0, "done": 1, "failed": 0, "cancelled": 1}
+    assert [job["id"] for job in job_queue.list(state="done")] == [running["id"]]
+    assert job_queue.get(12345) is None
+
+
+def test_running_jobs_are_requeued_after_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    job_queue = fc.JobQueue(path)
+    job, _ = submit(job_queue)
+    job_queue.claim(["image_convert"])
+    job_queue.close()
+    job_queue = fc.JobQueue(path)
+    try:
+        assert job_queue.requeued == 1
+        assert job_queue.get(job["id"])["state"] == "queued"
+        assert job_queue.get(job["id"])["started"] is None
+    finally:
+        job_queue.close()
+
+
+def test_wait_returns_when_job_finishes(job_queue):
+    job, _ = submit(job_queue)
+    assert job_queue.wait(job["id"], 0.05)["state"] == "queued"
+    timer = threading.Timer(0.05, job_queue.finish, (job["id"], "failed"), {"error": "坏文件"})
+    timer.start()
+    try:
+        assert job_queue.wait(job["id"], 10)["error"] == "坏文件"
+    finally:
+        timer.join()
+
+
+def test_server_owned_options_cannot_be_overridden():
+    base = dict(fc.DEFAULT_OPTIONS, office_backend="libreoffice", threads=0)
+    options = fc.normalize_job_options("word_to_pdf", {"office_backend": "fake", "threads": 64, "pdf_workers": 64, "office_recycle_after": 1}, base)
+    assert options["office_backend"] == "libreoffice"
+    assert (options["threads"], options["pdf_workers"], options["office_recycle_after"]) == (0, 0, fc.DEFAULT_OPTIONS["office_recycle_after"])
+
+
+def test_numeric_options_are_clamped():
+    options = fc.normalize_job_options("video_convert", {"crf": 500, "segments": 10 ** 6, "image_quality": 0, "segment_min_duration": -1})
+    assert options["crf"] == 63
+    assert options["segments"] == (os.cpu_count() or 1)
+    assert options["image_quality"] == 1
+    assert options["segment_min_duration"] == 0.0
+
+
+@pytest.mark.parametrize("options", [
+    {"crf": "18"},
+    {"preset": "ludicrous"},
+    {"excel_orientation": "sideways"},
+    {"stream_copy": "yes"},
+    {"video_codec": "libx264 -y"},
+    {"ico_sizes": [[16, 16, 16]]},
+    {"ico_sizes": [[1024, 1024]]},
+    {"not_an_option": 1},
+])
+def test_invalid_option_values_are_rejected(options):
+    with pytest.raises(ValueError):
+        fc.normalize_job_options("video_convert", options)
+
+
+@pytest.fixture
+def server(tmp_path, job_queue):
+    """不启动工作线程的转换服务（任务停留在队列中），只允许tmp_path/data中的文件"""
+    root = tmp_path / "data"
+    root.mkdir()
+    (root / "a.png").write_bytes(b"\x89PNG\r\n\x1a\n")
+    messages = []
+    job_server = fc.JobServer(job_queue, 1, roots=[str(root)], status=messages.append)
+    http_server = fc.serve_jobs(job_server, "127.0.0.1", 0, TOKEN)
+    http_server.root = root
+    http_server.messages = messages
+    yield http_server
+    http_server.shutdown()
+    http_server.server_close()
+
+
+def request(server, method, path, payload=None, headers=None):
+    """发送请求，返回 (状态码, JSON内容, 服务端是否要求关闭连接)"""
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+    base = {"Authorization": f"Bearer {TOKEN}", "Content-Type": "application/json"}
+    base.update(headers or {})
+    body = None if payload is None else json.dumps(payload).encode("utf-8")
+    try:
+        connection.request(method, path, body=body, headers={key: value for key, value in base.items() if value is not None})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b"{}"), response.getheader("Connection") == "close"
+    finally:
+        connection.close()
+
+
+def submit_payload(server, **kwargs):
+    payload = {"type": "image_convert", "sources": [str(server.root / "a.png")], "output_dir": str(server.root / "out"), "options": {"target_format": "webp"}}
+    payload.update(kwargs)
+    return payload
+
+
+def test_submit_query_and_cancel(server):
+    status, body, _ = request(server, "POST", "/jobs", submit_payload(server))
+    assert status == 201 and body["rejected"] == []
+    job_id = body["jobs"][0]["id"]
+    status, body, _ = request(server, "GET", f"/jobs/{job_id}")
+    assert status == 200 and body["state"] == "queued"
+    assert request(server, "POST", f"/jobs/{job_id}/cancel")[1]["state"] == "cancelled"
+    assert request(server, "POST", f"/jobs/{job_id}/cancel")[0] == 200  # 已取消的任务再次取消不报错
+    assert request(server, "GET", f"/jobs/{job_id}/result")[0] == 409
+    assert request(server, "GET", "/jobs/999")[0] == 404
+
+
+def test_rejects_foreign_host_wrong_content_type_and_missing_token(server):
+    assert request(server, "GET", "/status", headers={"Host": "attacker.example"})[0] == 403
+    assert request(server, "GET", "/status", headers={"Host": "localhost:8765"})[0] == 200
+    status, _, closed = request(server, "POST", "/jobs", submit_payload(server), headers={"Content-Type": "text/plain"})
+    assert status == 415 and closed
+    assert request(server, "POST", "/jobs", submit_payload(server), headers={"Content-Type": None})[0] == 415
+    assert request(server, "GET", "/status", headers={"Authorization": None})[0] == 401
+    assert request(server, "GET", "/status", headers={"Authorization": "Bearer wrong"})[0] == 401
+
+
+def test_paths_must_be_inside_roots(server, tmp_path):
+    outside = tmp_path / "outside.png"
+    outside.write_bytes(b"\x89PNG\r\n\x1a\n")
+    status, body, _ = request(server, "POST", "/jobs", submit_payload(server, output_dir=str(tmp_path / "out")))
+    assert status == 403
+    status, body, _ = request(server, "POST", "/jobs", submit_payload(server, sources=[str(outside), str(server.root / ".." / "outside.png")]))
+    assert status == 201 and body["jobs"] == []
+    assert [item["error"] for item in body["rejected"]] == ["不在允许的目录中"] * 2
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink") or os.name == "nt", reason="需要符号链接")
+def test_symlinks_out_of_roots_are_rejected(server, tmp_path):
+    outside = tmp_path / "secret.png"
+    outside.write_bytes(b"\x89PNG\r\n\x1a\n")
+    os.symlink(outside, server.root / "link.png")
+    status, body, _ = request(server, "POST", "/jobs", submit_payload(server, sources=[str(server.root)]))
+    assert [job["source"] for job in body["jobs"]] == [str(server.root / "a.png")]
+    assert body["rejected"] == [{"source": str(server.root / "link.png"), "error": "不在允许的目录中"}]
+
+
+def test_result_outside_roots_is_not_served(server, tmp_path, job_queue):
+    outside = tmp_path / "elsewhere.webp"
+    outside.write_bytes(b"data")
+    job, _ = job_queue.submit("image_convert", str(server.root / "a.png"), str(server.root), {"target_format": "webp"})
+    job_queue.finish(job["id"], "done", str(outside))
+    assert request(server, "GET", f"/jobs/{job['id']}/result")[0] == 403
+
+
+def test_oversized_body_closes_connection(server):
+    status, body, closed = request(server, "POST", "/jobs", headers={"Content-Length": str(fc.SERVER_MAX_BODY + 1)})
+    assert status == 400 and closed
+
+
+def test_internal_errors_return_500(server, job_queue):
+    job_queue.conn.close()
+    status, body, closed = request(server, "GET", "/jobs")
+    assert status == 500 and closed
+    assert body == {"error": "服务内部错误"}
+    assert any("GET /jobs" in message for message in server.messages)
+
+
+def test_generated_token_is_private_and_used_by_local_clients(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+    assert fc.load_server_token() is None
+    token = fc.load_server_token(create=True)
+    assert token and fc.load_server_token(create=True) == token
+    if os.name != "nt":
+        assert os.stat(fc.server_token_path()).st_mode & 0o777 == 0o600
+    assert fc.JobClient("http://127.0.0.1:8765").token == token
+    assert fc.JobClient("http://localhost:8765").token == token
+    assert fc.JobClient("http://converter.example:8765").token is None
+    assert fc.JobClient("http://127.0.0.1:8765", "explicit").token == "explicit"
@@ -0,0 +1,89 @@
+"""批量转换日志（中断后继续）和残留临时文件清理的测试"""
+import os
+import time
+
+import pytest
+
+import 全能格式转换器 as fc
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def sources(tmp_path):
+    paths = []
+    for name in ("a.png", "b.png", "c.png"):
+        path = tmp_path / name
+        path.write_bytes(b"x")
+        paths.append(str(path))
+    return paths
+
+
+def test_create_and_resume(tmp_path, sources):
+    options = {"target_format": "ico", "ico_sizes": [(16, 16), (32, 32)]}
+    journal = fc.BatchJournal.create("image_convert", str(tmp_path / "out"), options, sources, {"incremental": False})
+    output = tmp_path / "a.ico"
+    output.write_bytes(b"ico")
+    journal.mark_done(sources[0], str(output))
+    journal.close()
+    
+    assert fc.BatchJournal.find_unfinished() == [journal.path]
+    loaded = fc.BatchJournal.load(journal.path)
+    try:
+        assert loaded.header["options"]["ico_sizes"] == [(16, 16), (32, 32)]
+        assert loaded.header["settings"] == {"incremental": False}
+        assert loaded.done == {sources[0]: str(output)}
+        assert loaded.pending_files() == sources[1:]
+        output.unlink()  # 输出文件被删除后重新转换
+        assert loaded.pending_files() == sources
+    finally:
+        loaded.close()
+
+
+def test_torn_last_line_is_ignored(tmp_path, sources):
+    journal = fc.BatchJournal.create("image_convert", str(tmp_path), {}, sources)
+    journal.mark_done(sources[0], sources[0])
+    journal.file.write('{"source": "' + sources[1][:5])  # 写到一半时程序崩溃
+    journal.close()
+    loaded = fc.BatchJournal.load(journal.path)
+    try:
+        assert list(loaded.done) == [sources[0]]
+        assert loaded.pending_files() == sources[1:]
+    finally:
+        loaded.close()
+
+
+def test_finish_removes_journal(tmp_path, sources):
+    journal = fc.BatchJournal.create("image_convert", str(tmp_path), {}, sources)
+    journal.finish()
+    assert not os.path.exists(journal.path)
+    assert fc.BatchJournal.find_unfinished() == []
+
+
+def test_batches_started_in_the_same_second_keep_separate_journals(tmp_path, sources):
+    first = fc.BatchJournal.create("image_convert", str(tmp_path), {}, sources)
+    first.mark_done(sources[0], sources[0])
+    first.close()
+    second = fc.BatchJournal.create("image_convert", str(tmp_path), {}, sources[1:])
+    second.close()
+    assert first.path != second.path
+    loaded = fc.BatchJournal.load(first.path)
+    loaded.close()
+    assert loaded.done == {sources[0]: sources[0]}
+
+
+def test_remove_stale_partials(tmp_path):
+    stale = tmp_path / f".a.1234abcd{fc.PARTIAL_SUFFIX}.png"
+    fresh = tmp_path / f".b.5678abcd{fc.PARTIAL_SUFFIX}.png"
+    finished = tmp_path / "c.png"
+    for path in (stale, fresh, finished):
+        path.write_bytes(b"x")
+    old = time.time() - fc.PARTIAL_STALE_SECONDS - 10
+    os.utime(stale, (old, old))
+    os.utime(finished, (old, old))
+    assert fc.remove_stale_partials(str(tmp_path)) == 1
+    assert not stale.exists() and fresh.exists() and finished.exists()
@@ -0,0 +1,88 @@
+"""转换记录（增量转换）的测试：源文件、选项或输出文件变化时不跳过"""
+import os
+
+import pytest
+
+import 全能格式转换器 as fc
+
+OPTIONS = {"target_format": "webp", "image_quality": 80}
+
+
+@pytest.fixture
+def converted(tmp_path):
+    """一个已记录的转换：(转换记录, 源文件, 输出目录, 输出文件)"""
+    manifest = fc.ConversionManifest(str(tmp_path / "manifest.sqlite3"))
+    source = tmp_path / "a.png"
+    source.write_bytes(b"source")
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    output = output_dir / "a.webp"
+    output.write_bytes(b"output")
+    manifest.record("image_convert", str(source), str(output_dir), OPTIONS, str(output), "encode")
+    yield manifest, source, output_dir, output
+    manifest.close()
+
+
+def lookup(manifest, source, output_dir, options=OPTIONS):
+    return manifest.lookup("image_convert", str(source), str(output_dir), fc.ConversionManifest.options_key("image_convert", options))
+
+
+def test_options_key_only_uses_relevant_options():
+    key = fc.ConversionManifest.options_key
+    assert key("image_convert", {"target_format": "png", "crf": 18}) == key("image_convert", {"target_format": "png"})
+    assert key("image_convert", {"target_format": "png", "ico_sizes": [(16, 16)]}) == key("image_convert", {"target_format": "png"})
+    assert key("image_convert", {"target_format": "ico", "ico_sizes": [(16, 16)]}) != key("image_convert", {"target_format": "ico"})
+    assert key("word_to_pdf", {"image_quality": 10}) == key("word_to_pdf", {})
+
+
+def test_unchanged_source_is_skipped(converted):
+    manifest, source, output_dir, output = converted
+    assert lookup(manifest, source, output_dir) == str(output)
+    assert manifest.partition("image_convert", [str(source), str(source) + ".new"], str(output_dir), OPTIONS) == (
+        [str(source) + ".new"], [(str(source), str(output))])
+
+
+def test_changed_options_or_output_dir_converts_again(converted):
+    manifest, source, output_dir, output = converted
+    assert lookup(manifest, source, output_dir, dict(OPTIONS, image_quality=90)) is None
+    assert lookup(manifest, source, output_dir.parent) is None
+
+
+def test_changed_source_converts_again(converted):
+    manifest, source, output_dir, output = converted
+    source.write_bytes(b"changed")
+    assert lookup(manifest, source, output_dir) is None
+
+
+def test_touched_source_with_same_content_is_skipped(converted):
+    manifest, source, output_dir, output = converted
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5_000_000_000))
+    assert lookup(manifest, source, output_dir) == str(output)
+    source.write_bytes(b"SOURCE")  # 大小相同、内容不同
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 9_000_000_000))
+    assert lookup(manifest, source, output_dir) is None
+
+
+def test_modified_or_deleted_output_converts_again(converted):
+    manifest, source, output_dir, output = converted
+    output.write_bytes(b"edited by hand")
+    assert lookup(manifest, source, output_dir) is None
+    output.unlink()
+    assert lookup(manifest, source, output_dir) is None
+
+
+def test_records_survive_reopening(tmp_path):
+    source = tmp_path / "a.png"
+    source.write_bytes(b"source")
+    output = tmp_path / "a.webp"
+    output.write_bytes(b"output")
+    path = str(tmp_path / "manifest.sqlite3")
+    manifest = fc.ConversionManifest(path)
+    manifest.record("image_convert", str(source), str(tmp_path), OPTIONS, str(output))
+    manifest.close()  # 未满MANIFEST_COMMIT_EVERY条的记录在关闭时提交
+    manifest = fc.ConversionManifest(path)
+    try:
+        assert lookup(manifest, source, tmp_path) == str(output)
+    finally:
+        manifest.close()
@@ -0,0 +1,149 @@
+"""转换耗时指标的测试：Prometheus文本、JSON Lines日志和Chrome trace输出"""
+import json
+import os
+
+import 全能格式转换器 as fc
+
+
+def make_result(metrics, output, started_offset=1.0, elapsed=0.3):
+    started = metrics.started + started_offset
+    timing = {
+        "started": started,
+        "finished": started + elapsed,
+        "stages": {"decode": 0.1, "encode": 0.2},
+        "spans": [("decode", started, started + 0.1, 7), ("encode", started + 0.1, started + 0.3, 7)],
+        "pid": os.getpid(),
+        "thread": 7,
+    }
+    return {"output": output, "method": "ffmpeg", "elapsed": elapsed, "timing": timing}
+
+
+def failure(metrics, message="坏文件"):
+    error = RuntimeError(message)
+    error.timing = {"started": metrics.started + 2.0, "finished": metrics.started + 2.5,
+                    "stages": {"probe": 0.5}, "pid": os.getpid(), "thread": 8}
+    return error
+
+
+def sample_lines(text, name):
+    return {line.rsplit(" ", 1)[0]: line.rsplit(" ", 1)[1] for line in text.splitlines()
+            if line.startswith(f"format_converter_{name}")}
+
+
+def test_prometheus_counts_jobs_stages_and_bytes(tmp_path):
+    source = tmp_path / "a.wav"
+    source.write_bytes(b"x" * 100)
+    output = tmp_path / "a.mp3"
+    output.write_bytes(b"y" * 40)
+    metrics = fc.ConversionMetrics()
+    metrics.record("audio_convert", str(source), make_result(metrics, str(output)), None, queued=metrics.started + 0.5)
+    metrics.record("audio_convert", str(source), None, failure(metrics))
+    metrics.record("audio_convert", str(source), None, fc.ConversionCancelled("已取消"))
+    text = metrics.prometheus_text()
+    metrics.close()
+
+    jobs = sample_lines(text, "jobs_total")
+    assert jobs['format_converter_jobs_total{type="audio_convert",status="ok"}'] == "1"
+    assert jobs['format_converter_jobs_total{type="audio_convert",status="failed"}'] == "1"
+    assert jobs['format_converter_jobs_total{type="audio_convert",status="cancelled"}'] == "1"
+    assert "# TYPE format_converter_jobs_total counter" in text
+
+    stages = sample_lines(text, "stage_seconds_total")
+    assert float(stages['format_converter_stage_seconds_total{type="audio_convert",stage="queue"}']) == 0.5
+    assert float(stages['format_converter_stage_seconds_total{type="audio_convert",stage="probe"}']) == 0.5
+    assert float(stages['format_converter_stage_seconds_total{type="audio_convert",stage="encode"}']) == 0.2
+
+    assert sample_lines(text, "input_bytes_total")['format_converter_input_bytes_total{type="audio_convert"}'] == "300"
+    assert sample_lines(text, "output_bytes_total")['format_converter_output_bytes_total{type="audio_convert"}'] == "40"
+    assert metrics.totals()["decode"] == 0.1
+
+
+def test_duration_histogram_is_cumulative(tmp_path):
+    metrics = fc.ConversionMetrics()
+    source = str(tmp_path / "missing.png")
+    for elapsed in (0.03, 0.3, 4.0, 4000.0):
+        metrics.record("image_convert", source, make_result(metrics, None, elapsed=elapsed), None)
+    samples = sample_lines(metrics.prometheus_text(), "job_duration_seconds")
+    metrics.close()
+
+    def bucket(bound):
+        return int(samples[f'format_converter_job_duration_seconds_bucket{{type="image_convert",le="{bound}"}}'])
+
+    assert bucket(0.05) == 1
+    assert bucket(0.5) == 2
+    assert bucket(5) == 3
+    assert bucket(1800) == 3
+    assert bucket("+Inf") == 4
+    assert samples['format_converter_job_duration_seconds_count{type="image_convert"}'] == "4"
+    assert float(samples['format_converter_job_duration_seconds_sum{type="image_convert"}']) == 4004.33
+
+
+def test_gauges_are_exported():
+    metrics = fc.ConversionMetrics(gauges=lambda: {"watch_backlog": ("Files waiting", 5)})
+    text = metrics.prometheus_text()
+    metrics.close()
+    assert "# TYPE format_converter_watch_backlog gauge" in text
+    assert "format_converter_watch_backlog 5" in text.splitlines()
+
+
+def test_prometheus_file_written_on_close(tmp_path):
+    path = tmp_path / "metrics.prom"
+    metrics = fc.ConversionMetrics(prometheus_path=str(path))
+    metrics.last_written = fc.time.time()  # 刚写过，record不会立即重写
+    metrics.record("image_convert", str(tmp_path / "a.png"), make_result(metrics, None), None)
+    assert not path.exists()
+    metrics.close()
+    assert 'status="ok"} 1' in path.read_text(encoding="utf-8")
+    assert not os.path.exists(str(path) + ".tmp")
+
+
+def test_log_has_one_line_per_job(tmp_path):
+    log_path = tmp_path / "jobs.jsonl"
+    metrics = fc.ConversionMetrics(log_path=str(log_path))
+    metrics.record("audio_convert", str(tmp_path / "a.wav"), make_result(metrics, None), None)
+    metrics.record("audio_convert", str(tmp_path / "b.wav"), None, failure(metrics))
+    metrics.close()
+
+    first, second = [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+    assert first["status"] == "ok"
+    assert first["method"] == "ffmpeg"
+    assert first["stages"] == {"decode": 0.1, "encode": 0.2}
+    assert first["thread"] == 7
+    assert second["status"] == "failed"
+    assert second["error"] == "坏文件"
+    assert second["elapsed"] == 0.5
+
+
+def test_trace_has_job_and_stage_events(tmp_path):
+    trace_path = tmp_path / "trace.json"
+    metrics = fc.ConversionMetrics(trace_path=str(trace_path))
+    metrics.record("audio_convert", str(tmp_path / "a.wav"), make_result(metrics, None), None)
+    metrics.record("audio_convert", str(tmp_path / "b.wav"), None, failure(metrics))
+    metrics.record("audio_convert", str(tmp_path / "c.wav"), None, RuntimeError("没有计时"))
+    assert not trace_path.exists()
+    metrics.close()
+
+    trace = json.loads(trace_path.read_text(encoding="utf-8"))
+    events = trace["traceEvents"]
+    assert trace["otherData"]["dropped_events"] == 0
+    assert [event["name"] for event in events if event["ph"] == "M"] == ["process_name"]
+    jobs = [event for event in events if event.get("cat") == "audio_convert"]
+    assert [(event["name"], event["args"]["status"]) for event in jobs] == [("a.wav", "ok"), ("b.wav", "failed")]
+    assert round(jobs[0]["ts"]) == 1000000
+    assert round(jobs[0]["dur"]) == 300000
+    stages = [event for event in events if event.get("cat") in ("decode", "encode")]
+    assert [event["name"] for event in stages] == [fc.STAGE_NAMES["decode"], fc.STAGE_NAMES["encode"]]
+    assert all(event["tid"] == 7 and event["ph"] == "X" for event in stages)
+    assert round(stages[1]["ts"] - stages[0]["ts"]) == 100000
+
+
+def test_trace_drops_events_over_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(fc, "TRACE_MAX_EVENTS", 4)
+    trace_path = tmp_path / "trace.json"
+    metrics = fc.ConversionMetrics(trace_path=str(trace_path))
+    for name in ("a.wav", "b.wav"):
+        metrics.record("audio_convert", str(tmp_path / name), make_result(metrics, None), None)
+    metrics.close()
+    trace = json.loads(trace_path.read_text(encoding="utf-8"))
+    assert len([event for event in trace["traceEvents"] if event["ph"] == "X"]) == 4
+    assert trace["otherData"]["dropped_events"] == 2
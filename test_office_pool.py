@@ -0,0 +1,127 @@
+"""Office实例池的测试：用模拟后端在Linux上验证实例复用、定期重启、崩溃恢复和退出"""
+import threading
+
+import pytest
+
+import 全能格式转换器 as fc
+
+
+def make_pool(tmp_path, recycle_after=50, crash_every=0):
+    backend = fc.FakeOfficeBackend(launch_delay=0, export_delay=0, crash_every=crash_every)
+    return fc.OfficeAppPool(backend, recycle_after), backend
+
+
+def export(pool, tmp_path, app_name, count):
+    outputs = []
+    for index in range(count):
+        output = tmp_path / f"{app_name}-{index}.pdf"
+        pool.export_pdf(app_name, str(tmp_path / f"{app_name}-{index}.docx"), str(output), {})
+        outputs.append(output)
+    return outputs
+
+
+def actions(backend, action):
+    return [call for call in backend.calls if call[0] == action]
+
+
+def test_instance_reused_within_app(tmp_path):
+    pool, backend = make_pool(tmp_path)
+    outputs = export(pool, tmp_path, "Word", 3)
+    export(pool, tmp_path, "Excel", 2)
+    assert all(output.read_bytes() == fc.FAKE_PDF for output in outputs)
+    assert [call[1] for call in actions(backend, "launch")] == ["Word", "Excel"]
+    assert pool.stats == {"launches": 2, "documents": 5, "recycles": 0, "crashes": 0}
+
+
+def test_recycle_after_n_documents(tmp_path):
+    pool, backend = make_pool(tmp_path, recycle_after=2)
+    export(pool, tmp_path, "Word", 5)
+    # 第2、4个文档后各重启一次，第5个文档用第3个实例
+    assert len(actions(backend, "launch")) == 3
+    assert len(actions(backend, "quit")) == 2
+    assert pool.stats["recycles"] == 2
+    assert pool.stats["documents"] == 5
+    assert "Word" in pool.apps and pool.apps["Word"][1] == 1
+
+
+def test_crash_discards_instance_and_retries(tmp_path):
+    pool, backend = make_pool(tmp_path, crash_every=2)
+    outputs = export(pool, tmp_path, "Word", 3)
+    assert all(output.exists() for output in outputs)
+    # 第2、4次导出崩溃，各自在新实例上重试
+    assert pool.stats["crashes"] == 2
+    assert pool.stats["documents"] == 3
+    assert len(actions(backend, "launch")) == 3
+    assert [(call[0], call[2]) for call in backend.calls if call[0] in ("crash", "export")] == [
+        ("export", "Word-0.docx"), ("crash", "Word-1.docx"), ("export", "Word-1.docx"),
+        ("crash", "Word-2.docx"), ("export", "Word-2.docx"),
+    ]
+
+
+def test_repeated_crash_raises(tmp_path):
+    pool, backend = make_pool(tmp_path, crash_every=1)
+    with pytest.raises(Exception, match="崩溃"):
+        export(pool, tmp_path, "Word", 1)
+    assert pool.stats["crashes"] == 2
+    assert pool.stats["documents"] == 0
+    assert "Word" not in pool.apps
+
+
+def test_document_error_keeps_live_instance(tmp_path):
+    pool, backend = make_pool(tmp_path)
+
+    def broken_export(app, app_name, file_path, output_file, options):
+        raise Exception("文档已损坏")
+
+    export(pool, tmp_path, "Word", 1)
+    backend.export_pdf = broken_export
+    with pytest.raises(Exception, match="文档已损坏"):
+        export(pool, tmp_path, "Word", 1)
+    assert pool.stats["crashes"] == 0
+    assert len(actions(backend, "launch")) == 1
+    assert pool.apps["Word"][0]["alive"]
+
+
+def test_close_quits_every_instance(tmp_path):
+    pool, backend = make_pool(tmp_path)
+    export(pool, tmp_path, "Word", 1)
+    export(pool, tmp_path, "PowerPoint", 1)
+    pool.close()
+    assert sorted(call[1] for call in actions(backend, "quit")) == ["PowerPoint", "Word"]
+    assert pool.apps == {}
+
+
+def test_release_office_pools_is_per_thread_and_always_releases(tmp_path):
+    results = {}
+
+    def worker():
+        pool = fc.get_office_pool("fake")
+        pool.backend.launch_delay = 0
+        pool.backend.export_delay = 0
+        export(pool, tmp_path, "Excel", 2)
+        # 另一个后端退出失败时，其余后端的实例仍然退出
+        failing, failing_backend = make_pool(tmp_path)
+        export(failing, tmp_path, "Word", 1)
+
+        def stop():
+            raise OSError("soffice已退出")
+
+        failing_backend.stop = stop
+        fc._office_pools.pools = {"broken": failing, "fake": pool}
+        try:
+            fc.release_office_pools()
+        except OSError as e:
+            results["error"] = e
+        results["backends"] = (pool.backend, failing_backend)
+        results["pools_after"] = fc._office_pools.pools
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    backend, failing_backend = results["backends"]
+    assert isinstance(results["error"], OSError)
+    assert len(actions(backend, "quit")) == 1
+    assert len(actions(failing_backend, "quit")) == 1
+    assert results["pools_after"] == {}
+    # 其他线程的实例池不受影响
+    assert getattr(fc._office_pools, "pools", None) in (None, {})
@@ -0,0 +1,93 @@
+"""混合类型批次的测试：按文件头识别类型、路由规则和分组"""
+import zipfile
+
+import pytest
+
+import 全能格式转换器 as fc
+
+
+def write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def write_ooxml(tmp_path, name, part):
+    path = tmp_path / name
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("[Content_Types].xml", "<Types/>")
+        archive.writestr(part, "<document/>")
+    return str(path)
+
+
+@pytest.mark.parametrize("data, conv_type", [
+    (b"%PDF-1.7\n", "pdf_to_word"),
+    (b"\x89PNG\r\n\x1a\n" + b"\0" * 8, "image_convert"),
+    (b"\xff\xd8\xff\xe0", "image_convert"),
+    (b"RIFF\0\0\0\0WEBPVP8 ", "image_convert"),
+    (b"RIFF\0\0\0\0WAVEfmt ", "audio_convert"),
+    (b"RIFF\0\0\0\0AVI LIST", "video_convert"),
+    (b"\0\0\0\x20ftypM4A \0\0\0\0", "audio_convert"),
+    (b"\0\0\0\x20ftypisom\0\0\0\0", "video_convert"),
+    (b"OggS\0\x02" + b"\0" * 22 + b"\x80theora", "video_convert"),
+    (b"OggS\0\x02" + b"\0" * 22 + b"\x01vorbis", "audio_convert"),
+    (b"ID3\x04\0", "audio_convert"),
+    (b"\x1a\x45\xdf\xa3", "video_convert"),
+    (b"BM\0\0\0\0\0\0\0\0", "image_convert"),
+    (b"just some text", None),
+])
+def test_sniff_signatures(tmp_path, data, conv_type):
+    assert fc.sniff_conversion_type(write(tmp_path, "file.bin", data)) == conv_type
+
+
+def test_sniff_office_documents(tmp_path):
+    assert fc.sniff_conversion_type(write_ooxml(tmp_path, "a.zip", "word/document.xml")) == "word_to_pdf"
+    assert fc.sniff_conversion_type(write_ooxml(tmp_path, "b", "xl/workbook.xml")) == "excel_to_pdf"
+    assert fc.sniff_conversion_type(write_ooxml(tmp_path, "c.pptx", "ppt/presentation.xml")) == "ppt_to_pdf"
+    assert fc.sniff_conversion_type(write_ooxml(tmp_path, "d.docx", "other.xml")) is None
+    # 旧版Office文档只能按扩展名区分
+    assert fc.sniff_conversion_type(write(tmp_path, "e.xls", fc.OLE2_SIGNATURE)) == "excel_to_pdf"
+    assert fc.sniff_conversion_type(write(tmp_path, "e.bin", fc.OLE2_SIGNATURE)) is None
+
+
+def test_route_prefers_content_over_extension(tmp_path):
+    assert fc.route_conversion_type(write(tmp_path, "photo.pdf", b"\x89PNG\r\n\x1a\n")) == "image_convert"
+    assert fc.route_conversion_type(write(tmp_path, "song.mp3", b"unknown")) == "audio_convert"
+    assert fc.route_conversion_type(write(tmp_path, "notes.txt", b"unknown")) is None
+    assert fc.route_conversion_type(str(tmp_path / "missing.png")) == "image_convert"
+
+
+def test_parse_routes():
+    routes = fc.parse_routes(["image=webp", "video=skip", "ppt=skip", "audio_convert=flac"])
+    assert routes["image_convert"] == "webp"
+    assert routes["audio_convert"] == "flac"
+    assert routes["word_to_pdf"] is None
+    assert "video_convert" not in routes and "ppt_to_pdf" not in routes
+    assert fc.parse_routes(None) == fc.default_routes()
+
+
+@pytest.mark.parametrize("spec", ["sound=mp3", "image=mp3", "word=pdf"])
+def test_parse_routes_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        fc.parse_routes([spec])
+
+
+def test_route_batch_single_type_is_one_group():
+    options = {"target_format": "png"}
+    assert fc.route_batch("image_convert", ["a.jpg", "b.gif"], options) == ([("image_convert", ["a.jpg", "b.gif"], options)], [])
+
+
+def test_route_batch_groups_by_type(tmp_path):
+    image = write(tmp_path, "a.dat", b"GIF89a")
+    pdf = write(tmp_path, "b.pdf", b"%PDF-1.4")
+    audio = write(tmp_path, "c.wav", b"RIFF\0\0\0\0WAVEfmt ")
+    unknown = write(tmp_path, "d.txt", b"hello")
+    routes = fc.parse_routes(["image=webp", "audio=skip"])
+    groups, unrouted = fc.route_batch(fc.AUTO_CONVERSION, [image, pdf, audio, unknown], {"routes": routes, "image_quality": 80, "target_format": "mp3"})
+    assert sorted(groups) == [
+        ("image_convert", [image], {"image_quality": 80, "target_format": "webp"}),
+        ("pdf_to_word", [pdf], {"image_quality": 80}),
+    ]
+    assert unrouted == [(audio, "audio_convert"), (unknown, None)]
+    assert fc.describe_unrouted(None) == "无法识别的文件类型"
+    assert fc.CONVERSION_TYPE_NAMES["audio_convert"] in fc.describe_unrouted("audio_convert")
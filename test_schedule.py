@@ -0,0 +1,74 @@
+"""调度的测试：最长任务优先的开始顺序、快速通道、耗时模型和批次的预计完成时间"""
+import os
+
+import pytest
+
+import 全能格式转换器 as fc
+
+
+def test_single_worker_runs_shortest_first():
+    order, makespan = fc.plan_schedule([3.0, 1.0, 2.0], 1)
+    assert order == [1, 2, 0]
+    assert makespan == 6.0
+
+
+def test_longest_first_balances_workers():
+    costs = [1.0, 8.0, 3.0, 4.0, 2.0]
+    order, makespan = fc.plan_schedule(costs, 2)
+    assert order[:2] == [1, 3]
+    assert sorted(order) == list(range(len(costs)))
+    assert makespan == 9.0  # 8+1 与 4+3+2
+
+
+def test_fast_lane_takes_small_jobs_first():
+    costs = [100.0, 90.0, 80.0, 1.0, 2.0]
+    order, makespan = fc.plan_schedule(costs, 3)
+    assert order[0] == 3  # 0号执行者先处理最小的任务
+    assert set(order[1:3]) == {0, 1}
+    assert makespan == 100.0
+
+
+def test_workers_capped_by_job_count():
+    assert fc.plan_schedule([5.0, 5.0], 8) == ([0, 1], 5.0)
+    assert fc.plan_schedule([], 4) == ([], 0)
+
+
+def test_cost_model_prior_and_fit(tmp_path):
+    model = fc.CostModel(str(tmp_path / "model.json"))
+    assert model.coefficients("image_convert", {}) == fc.COST_PRIORS["image_convert"]
+    for units in (1, 2, 4, 8):
+        model.observe("image_convert", {}, units, 0.5 + 0.25 * units)
+    assert model.estimate("image_convert", {}, 10) == pytest.approx(3.0)
+    # 不同选项的历史数据不足时使用同一转换类型的数据
+    assert model.estimate("image_convert", {"target_format": "webp"}, 10) == pytest.approx(3.0)
+    model.save()
+    assert fc.CostModel(model.path).estimate("image_convert", {}, 10) == pytest.approx(3.0)
+
+
+def test_cost_model_single_size_scales_proportionally(tmp_path):
+    model = fc.CostModel(str(tmp_path / "model.json"))
+    model.observe("pdf_to_word", {}, 10, 5.0)
+    assert model.coefficients("pdf_to_word", {}) == (0.0, 0.5)
+
+
+def test_cost_model_ignores_unreadable_file(tmp_path):
+    path = tmp_path / "model.json"
+    path.write_text("{不是JSON", encoding="utf-8")
+    assert fc.CostModel(str(path)).samples == {}
+
+
+def test_batch_schedule_office_lane(tmp_path):
+    model = fc.CostModel(str(tmp_path / "model.json"))
+    tasks = []
+    for name, size_mb in (("a.docx", 4), ("b.docx", 1), ("c.xlsx", 2)):
+        path = tmp_path / name
+        path.write_bytes(b"\0" * (size_mb * 1024 * 1024))
+        tasks.append(("excel_to_pdf" if name.endswith(".xlsx") else "word_to_pdf", str(path), {}))
+    schedule = fc.BatchSchedule(tasks, fc.BatchExecutor(4), model=model)
+    # Office通道只有一个执行者，从短到长
+    assert [os.path.basename(path) for path in schedule.file_paths] == ["b.docx", "c.xlsx", "a.docx"]
+    assert schedule.work == pytest.approx(1.0 * 3 + 0.5 * 7)
+    assert schedule.makespan == pytest.approx(schedule.work)
+    assert schedule.lower_bound <= schedule.makespan
+    schedule.observe(tasks[0][1], {"elapsed": 9.0})
+    assert model.samples
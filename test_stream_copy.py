@@ -0,0 +1,47 @@
+"""判断能否直接复制音视频流（不重新编码）的测试，不需要ffmpeg"""
+import 全能格式转换器 as fc
+
+
+def media(*streams):
+    return {"streams": [{"type": kind, "codec": codec, "attached_pic": attached} for kind, codec, attached in streams]}
+
+
+H264_AAC = media(("video", "h264", False), ("audio", "aac", False))
+
+
+def test_compatible_streams_are_remuxed():
+    method, args = fc.plan_stream_copy(H264_AAC, "mkv", "video")
+    assert method == "remux"
+    assert args == ["-map", "0:v:0", "-map", "0:a:0", "-c:v", "copy", "-c:a", "copy"]
+
+
+def test_incompatible_audio_copies_video_only():
+    method, args = fc.plan_stream_copy(H264_AAC, "avi", "video")
+    assert method == "transcode"  # avi不能直接放h264
+    method, args = fc.plan_stream_copy(media(("video", "h264", False), ("audio", "pcm_s16le", False)), "mp4", "video")
+    assert method == "copy_video"
+    assert "-c:a" not in args
+
+
+def test_user_codec_settings_disable_copy():
+    assert fc.plan_stream_copy(H264_AAC, "mp4", "video", allow_video_copy=False) == ("transcode", [])
+    method, args = fc.plan_stream_copy(H264_AAC, "mp4", "video", allow_audio_copy=False)
+    assert method == "copy_video"
+
+
+def test_hevc_in_mp4_gets_apple_tag():
+    method, args = fc.plan_stream_copy(media(("video", "hevc", False)), "mp4", "video")
+    assert method == "remux"
+    assert args[args.index("-tag:v") + 1] == "hvc1"
+    assert "-map" in args and "0:a:0" not in args
+
+
+def test_cover_art_is_not_treated_as_video():
+    audio_with_cover = media(("video", "mjpeg", True), ("audio", "mp3", False))
+    assert fc.plan_stream_copy(audio_with_cover, "mp3", "audio")[0] == "remux"
+    assert fc.plan_stream_copy(audio_with_cover, "mkv", "video") == ("transcode", [])
+
+
+def test_audio_copy_depends_on_container():
+    assert fc.plan_stream_copy(media(("audio", "aac", False)), "m4a", "audio") == ("remux", ["-map", "0:a:0", "-c:a", "copy"])
+    assert fc.plan_stream_copy(media(("audio", "aac", False)), "mp3", "audio") == ("transcode", [])
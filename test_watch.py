@@ -0,0 +1,157 @@
+"""监视模式的测试：写入完成判断、有界队列的溢出暂存和轮询监视器的变化检测"""
+import os
+import time
+
+import pytest
+
+import 全能格式转换器 as fc
+
+
+@pytest.fixture
+def make_service(tmp_path):
+    services = []
+
+    def make(**kwargs):
+        source = tmp_path / "in"
+        source.mkdir(exist_ok=True)
+        kwargs.setdefault("settle", 2.0)
+        service = fc.WatchService([str(source)], "word_to_pdf", str(tmp_path / "out"), dict(fc.DEFAULT_OPTIONS), 1,
+                                  polling=True, poll_interval=0.01, **kwargs)
+        services.append(service)
+        return service, source
+
+    yield make
+    for service in services:
+        service.watcher.close()
+
+
+def write(path, data=b"data"):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_file_settles_after_quiet_period(make_service):
+    service, source = make_service()
+    path = write(source / "a.docx")
+    service.observe(path, 100.0)
+    service.check_settled(101.0)
+    assert path in service.settling
+    assert service.queue.qsize() == 0
+    service.check_settled(102.0)
+    assert path not in service.settling
+    assert service.queue.get_nowait() == (path, 102.0)
+    assert service.snapshot()["queued_total"] == 1
+
+
+def test_change_restarts_settle_timer(make_service):
+    service, source = make_service()
+    path = write(source / "a.docx")
+    service.observe(path, 100.0)
+    write(source / "a.docx", b"longer data")
+    service.check_settled(101.5)
+    service.check_settled(102.0)
+    assert path in service.settling  # 在101.5发现变化后重新计时
+    service.check_settled(103.5)
+    assert service.queue.get_nowait() == (path, 103.5)
+
+
+def test_repeated_observe_keeps_timer(make_service):
+    service, source = make_service()
+    path = write(source / "a.docx")
+    service.observe(path, 100.0)
+    service.observe(path, 101.0)  # 大小和修改时间没有变化
+    service.check_settled(102.0)
+    assert service.queue.qsize() == 1
+    assert service.snapshot()["detected"] == 1
+
+
+def test_initial_old_files_skip_waiting(make_service):
+    service, source = make_service()
+    old = write(source / "old.docx")
+    os.utime(old, (time.time() - 60, time.time() - 60))
+    new = write(source / "new.docx")
+    now = time.time()
+    service.observe(old, now, initial=True)
+    service.observe(new, now, initial=True)
+    service.check_settled(now)
+    assert service.queue.get_nowait()[0] == old
+    assert list(service.settling) == [new]
+
+
+def test_deleted_file_is_dropped(make_service):
+    service, source = make_service()
+    path = write(source / "a.docx")
+    service.observe(path, 100.0)
+    os.remove(path)
+    service.check_settled(102.0)
+    assert service.settling == {}
+    assert service.queue.qsize() == 0
+
+
+def test_overflow_holds_files_until_queue_has_room(make_service):
+    service, source = make_service(queue_size=1)
+    paths = [write(source / f"{name}.docx") for name in "abc"]
+    for path in paths:
+        service.observe(path, 100.0)
+    service.check_settled(102.0)
+    assert service.queue.qsize() == 1
+    assert [path for path, _ in service.overflow] == paths[1:]
+    snapshot = service.snapshot()
+    assert snapshot["backlog"] == 3
+    assert snapshot["queued_total"] == 1
+    assert snapshot["settling"] == 0
+
+    assert service.queue.get_nowait()[0] == paths[0]
+    service.check_settled(103.0)
+    assert service.queue.get_nowait()[0] == paths[1]
+    assert len(service.overflow) == 1
+    assert service.snapshot()["queued_total"] == 2
+
+
+def test_waiting_file_is_not_queued_twice(make_service):
+    service, source = make_service(queue_size=1)
+    path = write(source / "a.docx")
+    service.observe(path, 100.0)
+    service.check_settled(102.0)
+    write(source / "a.docx", b"rewritten")
+    service.observe(path, 103.0)
+    service.check_settled(106.0)
+    assert service.queue.qsize() == 1
+    assert not service.overflow
+
+
+def test_wanted_filters_names_and_output_dir(make_service, tmp_path):
+    service, source = make_service()
+    assert service.wanted(str(source / "report.DOCX"))
+    assert not service.wanted(str(source / "report.pdf"))
+    assert not service.wanted(str(source / ".hidden.docx"))
+    assert not service.wanted(str(source / "~$report.docx"))
+    assert not service.wanted(str(tmp_path / "out" / "report.docx"))
+
+
+def test_polling_watcher_reports_new_and_modified_files(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / ".git").mkdir()
+    (tmp_path / "out").mkdir()
+    existing = write(tmp_path / "a.docx")
+    watcher = fc.PollingWatcher([str(tmp_path)], 0.01, {str(tmp_path / "out")})
+    assert watcher.poll(1.0) == set()
+
+    added = write(tmp_path / "sub" / "b.docx")
+    write(tmp_path / ".git" / "c.docx")
+    write(tmp_path / "out" / "d.docx")
+    write(tmp_path / "a.docx", b"modified")
+    assert watcher.poll(1.0) == {added, existing}
+    assert watcher.poll(1.0) == set()
+
+
+def test_polling_watcher_waits_for_interval(tmp_path):
+    watcher = fc.PollingWatcher([str(tmp_path)], 60)
+    write(tmp_path / "a.docx")
+    assert watcher.poll(0.01) == set()  # 未到扫描时间
+
+
+def test_service_uses_polling_watcher(make_service):
+    service, _ = make_service()
+    assert service.mode == "polling"
+    assert isinstance(service.watcher, fc.PollingWatcher)
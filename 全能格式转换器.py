@@ -1,71 +1,4744 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
 import os
 import threading
 import sys
+import argparse
+import glob
+import json
+import time
+import statistics
 import tempfile
 import shutil
-from pdf2docx import Converter
-import comtypes.client
-import win32com.client
-import ffmpeg
-from PIL import Image  # 用于图片处理
+import queue
+import importlib
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import subprocess  # 添加subprocess模块
 import platform  # 添加platform模块
+import re
+import collections
+import io
+import struct
+import zlib
+import pathlib
+import fnmatch
+import sqlite3
+import signal
+import random
+import secrets
+import contextlib
+import zipfile
 
-# 尝试导入docx2pdf的convert函数，如果失败则提供备选方案
+# 转换后端按需导入：pdf2docx会连带导入PyMuPDF等重量级依赖，
+# 只转换图片时不应为它们付出启动时间
+# 后端名称 -> (模块名, pip安装包名, 用途)
+BACKENDS = {
+    "pdf2docx": ("pdf2docx", "pdf2docx", "PDF转Word"),
+    "docx2pdf": ("docx2pdf", "docx2pdf", "Word转PDF"),
+    "win32com": ("win32com.client", "pywin32", "Word/Excel转PDF"),
+    "comtypes": ("comtypes.client", "comtypes", "PPT转PDF"),
+    "pillow": ("PIL.Image", "pillow", "图片格式转换"),
+}
+
+_backend_lock = threading.Lock()
+_loaded_backends = {}
+_backend_availability = {}
+
+def backend_available(name):
+    """检查后端是否已安装（只查找模块，不导入）"""
+    if name not in _backend_availability:
+        module_name = BACKENDS[name][0]
+        try:
+            available = importlib.util.find_spec(module_name.split(".")[0]) is not None
+        except (ImportError, ValueError):
+            available = False
+        _backend_availability[name] = available
+    return _backend_availability[name]
+
+def load_backend(name):
+    """首次使用时导入后端模块，之后直接返回缓存的模块"""
+    module = _loaded_backends.get(name)
+    if module is not None:
+        return module
+    
+    module_name, package, purpose = BACKENDS[name]
+    with _backend_lock:
+        if name not in _loaded_backends:
+            try:
+                _loaded_backends[name] = importlib.import_module(module_name)
+            except ImportError as e:
+                _backend_availability[name] = False
+                raise Exception(f"{package}库未安装或无法加载，{purpose}功能无法使用，请先运行 'pip install {package}' ({str(e)})")
+        return _loaded_backends[name]
+
+def backend_report():
+    """返回各后端的可用情况（不导入任何后端）"""
+    return {
+        name: {"module": module_name, "package": package, "purpose": purpose, "available": backend_available(name)}
+        for name, (module_name, package, purpose) in BACKENDS.items()
+    }
+
+# 无界面服务器上可能没有安装tkinter，命令行模式不依赖它
 try:
-    from docx2pdf import convert
-    docx2pdf_available = True
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, ttk
 except ImportError:
-    docx2pdf_available = False
+    tk = None
+
+FFMPEG_CACHE_STALE_DAYS = 7  # 超过此天数未使用的ffmpeg缓存副本会被清理
+
+def get_cache_dir():
+    """返回当前用户的缓存目录"""
+    if sys.platform.startswith('win'):
+        base_dir = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    else:
+        base_dir = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base_dir, "全能格式转换器")
+
+def _find_bundled_ffmpeg():
+    """查找程序自带的ffmpeg，支持PyInstaller打包的--add-data参数"""
+    names = ["ffmpeg.exe"] if sys.platform.startswith('win') else ["ffmpeg.exe", "ffmpeg"]
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    if getattr(sys, 'frozen', False):
+        # 打包后的环境：先找MEIPASS目录，再找exe所在目录
+        base_dirs = [getattr(sys, '_MEIPASS', script_dir), os.path.dirname(sys.executable), script_dir]
+    else:
+        # 开发环境：ffmpeg与程序在同一目录
+        base_dirs = [script_dir]
+    for base_dir in base_dirs:
+        for name in names:
+            path = os.path.join(base_dir, name)
+            if os.path.isfile(path):
+                return path
+    return None
+
+def _file_sha256(path, chunk_size=1024 * 1024):
+    """流式计算文件的SHA-256"""
+    import hashlib
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _ffmpeg_source_key(source_path):
+    """生成ffmpeg来源的快速标识（路径+大小+修改时间），用于跳过重复的哈希计算
+
+    单文件打包时MEIPASS每次启动都是新的临时目录，改用exe本身的大小和修改时间
+    """
+    meipass = getattr(sys, '_MEIPASS', None)
+    if meipass and os.path.dirname(os.path.abspath(source_path)) == os.path.abspath(meipass):
+        stat_path, name = sys.executable, os.path.basename(source_path)
+    else:
+        stat_path, name = source_path, ""
+    stat = os.stat(stat_path)
+    return f"{os.path.abspath(stat_path)}|{name}|{stat.st_size}|{stat.st_mtime_ns}"
+
+def _load_ffmpeg_index(index_path):
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_ffmpeg_index(index_path, index):
+    temp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, index_path)
+
+def _cleanup_stale_ffmpeg(cache_root, keep_digest):
+    """清理本程序缓存目录中长期未使用的ffmpeg副本
+
+    只处理cache_root下本程序创建的目录；共享的系统临时目录中的文件可能属于正在运行的其他程序，不做清理
+    """
+    expire_before = time.time() - FFMPEG_CACHE_STALE_DAYS * 24 * 3600
+    for name in os.listdir(cache_root):
+        path = os.path.join(cache_root, name)
+        if name == keep_digest or not os.path.isdir(path):
+            continue
+        try:
+            if os.path.getmtime(path) < expire_before:
+                shutil.rmtree(path)
+        except OSError:
+            pass  # 可能正被其他实例使用，下次启动再清理
+
+def extract_ffmpeg():
+    """获取可用的ffmpeg路径
+
+    程序自带的ffmpeg按内容哈希缓存到用户缓存目录，已有校验通过的副本时直接复用，
+    不再每次启动都复制；没有自带ffmpeg时使用PATH中的ffmpeg
+    """
+    try:
+        source_path = _find_bundled_ffmpeg()
+        if not source_path:
+            path_ffmpeg = shutil.which("ffmpeg")
+            if path_ffmpeg:
+                return path_ffmpeg
+            raise FileNotFoundError("未找到程序自带的ffmpeg.exe，PATH中也没有ffmpeg")
+        
+        cache_root = os.path.join(get_cache_dir(), "ffmpeg")
+        os.makedirs(cache_root, exist_ok=True)
+        index_path = os.path.join(cache_root, "index.json")
+        index = _load_ffmpeg_index(index_path)
+        
+        source_key = _ffmpeg_source_key(source_path)
+        source_size = os.path.getsize(source_path)
+        digest = index.get(source_key)
+        if not digest:
+            # 首次遇到该来源时计算内容哈希，之后通过快速标识直接找到缓存
+            digest = _file_sha256(source_path)
+            index = {key: value for key, value in index.items() if os.path.isdir(os.path.join(cache_root, value))}
+            index[source_key] = digest
+            _save_ffmpeg_index(index_path, index)
+        
+        cache_dir = os.path.join(cache_root, digest[:16])
+        ffmpeg_path = os.path.join(cache_dir, os.path.basename(source_path))
+        
+        # 校验缓存副本：大小和修改时间须与复制完成时记录的一致
+        verified_path = os.path.join(cache_dir, "verified.json")
+        try:
+            cached = os.stat(ffmpeg_path)
+            with open(verified_path, "r", encoding="utf-8") as f:
+                verified = json.load(f)
+            valid = cached.st_size == source_size == verified["size"] and cached.st_mtime_ns == verified["mtime_ns"]
+        except (OSError, ValueError, KeyError):
+            valid = False
+        
+        if not valid:
+            # 先复制到临时文件再重命名，多个实例同时启动时也不会读到不完整的文件
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_path = f"{ffmpeg_path}.{os.getpid()}.tmp"
+            shutil.copy2(source_path, temp_path)
+            if _file_sha256(temp_path) != digest:
+                os.remove(temp_path)
+                raise Exception("复制的ffmpeg与源文件内容不一致")
+            os.replace(temp_path, ffmpeg_path)
+            cached = os.stat(ffmpeg_path)
+            with open(verified_path, "w", encoding="utf-8") as f:
+                json.dump({"size": cached.st_size, "mtime_ns": cached.st_mtime_ns, "sha256": digest}, f)
+        
+        # 更新目录修改时间，标记该副本最近被使用过
+        os.utime(cache_dir)
+        _cleanup_stale_ffmpeg(cache_root, digest[:16])
+        return ffmpeg_path
+    except Exception as e:
+        print(f"提取ffmpeg失败: {str(e)}")
+        return shutil.which("ffmpeg")
+
+def popen_silently(cmd, **kwargs):
+    """启动子进程，Windows系统下不显示命令行窗口"""
+    if platform.system() == "Windows":
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        startupinfo.wShowWindow = 0  # 隐藏窗口
+        kwargs.setdefault("startupinfo", startupinfo)
+        kwargs.setdefault("creationflags", subprocess.CREATE_NO_WINDOW)  # 不创建窗口
+    return subprocess.Popen(cmd, **kwargs)
+
+def suspend_process(process):
+    """挂起子进程（Windows使用NtSuspendProcess，其他系统发送SIGSTOP）"""
+    if sys.platform.startswith('win'):
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x0800, False, process.pid)  # PROCESS_SUSPEND_RESUME
+        if handle:
+            ctypes.windll.ntdll.NtSuspendProcess(handle)
+            ctypes.windll.kernel32.CloseHandle(handle)
+    else:
+        process.send_signal(signal.SIGSTOP)
+
+def resume_process(process):
+    """恢复被挂起的子进程"""
+    if sys.platform.startswith('win'):
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x0800, False, process.pid)
+        if handle:
+            ctypes.windll.ntdll.NtResumeProcess(handle)
+            ctypes.windll.kernel32.CloseHandle(handle)
+    else:
+        process.send_signal(signal.SIGCONT)
+
+class ConversionCancelled(Exception):
+    """转换被用户取消"""
+
+class BatchControl:
+    """批量转换的暂停和取消控制（线程安全）
+
+    正在运行的ffmpeg等子进程通过register登记，暂停时挂起、取消时终止；
+    其余任务在开始前调用wait_if_paused，暂停期间等待，取消后不再开始
+    """
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+        self._lock = threading.Lock()
+        self._processes = set()
+        self._kill = False
+    
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+    
+    @property
+    def paused(self):
+        return not self._running.is_set()
+    
+    def _signal_processes(self, action):
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            if process.poll() is None:
+                try:
+                    action(process)
+                except OSError:
+                    pass
+    
+    def pause(self):
+        if self.cancelled or self.paused:
+            return
+        self._running.clear()
+        self._signal_processes(suspend_process)
+    
+    def resume(self):
+        if not self.paused:
+            return
+        self._running.set()
+        self._signal_processes(resume_process)
+    
+    def cancel(self, kill=False):
+        """取消批量转换：终止已登记的子进程（被挂起的先恢复，才能正常退出）
+
+        kill为True时强制结束子进程：ffmpeg收到终止信号后仍会编码完缓冲中的帧，慢速预设下可能还要很久
+        """
+        was_paused = self.paused
+        self._kill = self._kill or kill
+        self._cancelled.set()
+        self._running.set()
+        if was_paused:
+            self._signal_processes(resume_process)
+        self._signal_processes(self._stop_process)
+    
+    def _stop_process(self, process):
+        if self._kill:
+            process.kill()
+        else:
+            process.terminate()
+    
+    def wait_if_paused(self):
+        """暂停期间阻塞，返回时如已取消则返回False"""
+        while not self._running.wait(0.5):
+            pass
+        return not self.cancelled
+    
+    def register(self, process):
+        with self._lock:
+            self._processes.add(process)
+        if self.cancelled:
+            self._stop_process(process)
+        elif self.paused:
+            suspend_process(process)
+    
+    def unregister(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+def parse_timestamp(value):
+    """把ffmpeg输出的 HH:MM:SS.xx 时间转换为秒数，无法解析时返回None"""
+    match = re.match(r"^\s*(\d+):(\d{2}):(\d{2}(?:\.\d+)?)", value or "")
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def format_seconds(seconds):
+    """把秒数格式化为 HH:MM:SS"""
+    seconds = max(0, int(seconds))
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+def probe_media(ffmpeg_path, file_path):
+    """用 ffmpeg -i 探测媒体信息（不依赖ffprobe）
+
+    返回 {"duration": 秒数或None, "streams": [{"index": 0, "type": "video", "codec": "h264", "attached_pic": False}, ...]}
+    """
+    process = popen_silently(
+        [ffmpeg_path, "-hide_banner", "-i", file_path],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE
+    )
+    # 没有指定输出文件时ffmpeg以非零退出码结束，这里只需要它打印的输入信息
+    _, stderr = process.communicate()
+    output = stderr.decode("utf-8", errors="ignore")
+    
+    info = {"duration": None, "streams": []}
+    match = re.search(r"Duration:\s*([\d:.]+)", output)
+    if match:
+        info["duration"] = parse_timestamp(match.group(1))
+    
+    # 例如: Stream #0:1(eng): Audio: aac (LC) (mp4a / 0x6134706D), 44100 Hz, stereo
+    for line in output.splitlines():
+        match = re.match(r"\s*Stream #\d+:(\d+)\S*: (Video|Audio|Subtitle|Data|Attachment): (\w+)", line)
+        if match:
+            info["streams"].append({
+                "index": int(match.group(1)),
+                "type": match.group(2).lower(),
+                "codec": match.group(3),
+                "attached_pic": "(attached pic)" in line,
+            })
+    return info
+
+# 各目标容器可直接复制（不重新编码）的编码格式
+# 视频容器: (可复制的视频编码, 可复制的音频编码)
+VIDEO_CONTAINER_CODECS = {
+    "mp4": ({"h264", "hevc", "mpeg4", "av1", "vp9"}, {"aac", "mp3", "ac3", "eac3", "opus", "alac", "flac"}),
+    "mov": ({"h264", "hevc", "mpeg4", "prores", "mjpeg"}, {"aac", "mp3", "ac3", "alac", "pcm_s16le", "pcm_s24le"}),
+    "mkv": ({"h264", "hevc", "mpeg4", "av1", "vp8", "vp9", "mpeg2video", "theora", "prores", "mjpeg"},
+            {"aac", "mp3", "ac3", "eac3", "dts", "opus", "vorbis", "flac", "alac", "truehd", "pcm_s16le", "pcm_s24le"}),
+    "avi": ({"mpeg4", "mjpeg", "msmpeg4v3"}, {"mp3", "ac3", "pcm_s16le"}),
+    "flv": ({"h264", "flv1"}, {"aac", "mp3"}),
+    "wmv": ({"wmv1", "wmv2", "wmv3"}, {"wmav1", "wmav2"}),
+}
+
+# 音频容器可复制的音频编码
+AUDIO_CONTAINER_CODECS = {
+    "mp3": {"mp3"},
+    "wav": {"pcm_s16le", "pcm_s24le", "pcm_s32le", "pcm_f32le", "pcm_u8"},
+    "flac": {"flac"},
+    "m4a": {"aac", "alac"},
+    "ogg": {"vorbis", "opus", "flac"},
+    "aac": {"aac"},
+}
+
+# 转换方式及其在日志中的名称
+CONVERSION_METHOD_NAMES = {
+    "remux": "直接封装",
+    "copy_video": "复制视频+音频转码",
+    "transcode": "重新编码",
+    "segmented": "分段并行转码",
+}
+
+def describe_methods(method_counts):
+    """把各转换方式的文件数汇总为一行文字，例如"直接封装 12 个，重新编码 3 个" """
+    return "，".join(f"{CONVERSION_METHOD_NAMES[method]} {count} 个" for method, count in method_counts.items())
+
+def plan_stream_copy(media_info, target_format, kind, allow_video_copy=True, allow_audio_copy=True):
+    """根据源文件的编码和目标容器选择转换方式
+
+    返回 (方式, ffmpeg参数)，方式为 remux（全部流直接复制）、copy_video（复制视频流，
+    只转码音频，参数中不含音频编码参数）或 transcode（完全重新编码，参数为空）。
+    用户指定了视频/音频编码参数时，对应的流不能直接复制
+    """
+    streams = media_info.get("streams", [])
+    video = next((stream for stream in streams if stream["type"] == "video" and not stream["attached_pic"]), None)
+    audio = next((stream for stream in streams if stream["type"] == "audio"), None)
+    
+    if kind == "audio":
+        if allow_audio_copy and audio and audio["codec"] in AUDIO_CONTAINER_CODECS.get(target_format, set()):
+            return "remux", ["-map", "0:a:0", "-c:a", "copy"]
+        return "transcode", []
+    
+    if not allow_video_copy or not video or target_format not in VIDEO_CONTAINER_CODECS:
+        return "transcode", []
+    video_codecs, audio_codecs = VIDEO_CONTAINER_CODECS[target_format]
+    if video["codec"] not in video_codecs:
+        return "transcode", []
+    
+    args = ["-map", "0:v:0"]
+    if audio:
+        args += ["-map", "0:a:0"]
+    args += ["-c:v", "copy"]
+    if video["codec"] == "hevc" and target_format in ("mp4", "mov"):
+        args += ["-tag:v", "hvc1"]  # 苹果设备要求HEVC使用hvc1标签
+    
+    if not audio or (allow_audio_copy and audio["codec"] in audio_codecs):
+        return "remux", args + (["-c:a", "copy"] if audio else [])
+    return "copy_video", args
+
+# 编码预设，default 表示使用ffmpeg对目标格式的默认编码参数
+ENCODER_PRESET_NAMES = {
+    "default": "默认",
+    "fast": "快速",
+    "balanced": "均衡",
+    "archive": "高质量归档",
+}
+
+# 视频编码参数: 预设 -> 目标容器 -> ffmpeg参数
+_X264_FAST = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "23"]
+_X264_BALANCED = ["-c:v", "libx264", "-preset", "medium", "-crf", "21"]
+VIDEO_ENCODER_PRESETS = {
+    "fast": {
+        "mp4": _X264_FAST, "mov": _X264_FAST, "mkv": _X264_FAST, "flv": _X264_FAST,
+        "avi": ["-c:v", "mpeg4", "-q:v", "5"],
+        "wmv": ["-c:v", "wmv2", "-b:v", "2M"],
+    },
+    "balanced": {
+        "mp4": _X264_BALANCED, "mov": _X264_BALANCED, "mkv": _X264_BALANCED, "flv": _X264_BALANCED,
+        "avi": ["-c:v", "mpeg4", "-q:v", "3"],
+        "wmv": ["-c:v", "wmv2", "-b:v", "4M"],
+    },
+    "archive": {
+        "mp4": ["-c:v", "libx265", "-preset", "slow", "-crf", "22", "-tag:v", "hvc1"],
+        "mov": ["-c:v", "libx265", "-preset", "slow", "-crf", "22", "-tag:v", "hvc1"],
+        "mkv": ["-c:v", "libvpx-vp9", "-crf", "30", "-b:v", "0", "-row-mt", "1"],
+        "flv": ["-c:v", "libx264", "-preset", "slow", "-crf", "18"],
+        "avi": ["-c:v", "mpeg4", "-q:v", "2"],
+        "wmv": ["-c:v", "wmv2", "-b:v", "8M"],
+    },
+}
+
+# 支持 -crf 参数的视频编码器
+CRF_ENCODERS = {"libx264", "libx265", "libvpx", "libvpx-vp9", "libaom-av1", "libsvtav1"}
+
+# 各目标容器使用的音频编码器
+AUDIO_ENCODERS = {
+    "mp4": "aac", "mov": "aac", "mkv": "aac", "flv": "aac", "m4a": "aac", "aac": "aac",
+    "mp3": "libmp3lame", "avi": "libmp3lame",
+    "ogg": "libvorbis",
+    "flac": "flac",
+    "wav": "pcm_s16le",
+    "wmv": "wmav2",
+}
+
+# 音频编码参数: 编码器 -> 预设 -> ffmpeg参数
+AUDIO_ENCODER_PRESETS = {
+    "aac": {"fast": ["-b:a", "128k"], "balanced": ["-b:a", "192k"], "archive": ["-b:a", "256k"]},
+    "libmp3lame": {"fast": ["-q:a", "4"], "balanced": ["-q:a", "2"], "archive": ["-q:a", "0"]},
+    "libvorbis": {"fast": ["-q:a", "3"], "balanced": ["-q:a", "5"], "archive": ["-q:a", "7"]},
+    "flac": {"fast": ["-compression_level", "0"], "balanced": ["-compression_level", "5"], "archive": ["-compression_level", "8"]},
+    "wmav2": {"fast": ["-b:a", "128k"], "balanced": ["-b:a", "192k"], "archive": ["-b:a", "256k"]},
+}
+
+def _set_arg(args, key, value):
+    """设置参数列表中某个选项的值（已存在时替换）"""
+    if key in args:
+        args[args.index(key) + 1] = value
+    else:
+        args += [key, value]
+
+def _remove_arg(args, key):
+    """从参数列表中删除某个选项及其值"""
+    if key in args:
+        position = args.index(key)
+        del args[position:position + 2]
+
+def build_video_args(target_format, options):
+    """根据编码预设和用户指定的参数生成视频编码参数"""
+    preset = options.get("preset") or "default"
+    crf = options.get("crf")
+    video_bitrate = options.get("video_bitrate")
+    video_codec = options.get("video_codec")
+    
+    # 默认预设下只指定了质量参数时，以"均衡"预设为基础
+    if preset == "default" and (crf is not None or video_bitrate):
+        preset = "balanced"
+    args = list(VIDEO_ENCODER_PRESETS.get(preset, {}).get(target_format, []))
+    if video_codec:
+        # 预设中的其余参数是针对预设编码器的，换用其他编码器时不再使用
+        args = ["-c:v", video_codec]
+    
+    encoder = args[1] if args else None
+    if crf is not None and encoder in CRF_ENCODERS:
+        _set_arg(args, "-crf", str(crf))
+    if video_bitrate:
+        _remove_arg(args, "-crf")
+        _set_arg(args, "-b:v", str(video_bitrate))
+    return args
+
+def build_audio_args(target_format, options):
+    """根据编码预设和用户指定的参数生成音频编码参数"""
+    preset = options.get("preset") or "default"
+    audio_codec = options.get("audio_codec")
+    audio_bitrate = options.get("audio_bitrate")
+    sample_rate = options.get("sample_rate")
+    
+    args = []
+    if preset != "default" or audio_codec or audio_bitrate:
+        encoder = audio_codec or AUDIO_ENCODERS.get(target_format)
+        if encoder:
+            quality_preset = preset if preset != "default" else "balanced"
+            args = ["-c:a", encoder] + AUDIO_ENCODER_PRESETS.get(encoder, {}).get(quality_preset, [])
+    if audio_bitrate:
+        _remove_arg(args, "-q:a")
+        _set_arg(args, "-b:a", str(audio_bitrate))
+    if sample_rate:
+        _set_arg(args, "-ar", str(sample_rate))
+    return args
+
+def cpu_budget(parallel_jobs):
+    """同时运行多个任务时每个任务可用的线程/进程数（ffmpeg线程数、PDF解析进程数），避免总数超过CPU核心数
+
+    只有一个任务时返回0，表示自动（使用全部核心）
+    """
+    if parallel_jobs <= 1:
+        return 0
+    return max(1, default_worker_count() // parallel_jobs)
+
+PARTIAL_SUFFIX = ".partial"  # 正在写入的临时输出文件名中的标记
+FFMPEG_STDERR_TAIL_LINES = 50  # 转换失败时日志中保留的ffmpeg输出行数
+FFMPEG_PROGRESS_LOG_INTERVAL = 5  # 转换进度写入日志的间隔（秒）
+
+class FFmpegProgress:
+    """解析 ffmpeg -progress 输出的 key=value 流，计算百分比、帧率、速度和剩余时间"""
+    def __init__(self, duration=None):
+        self.duration = duration if duration and duration > 0 else None
+        self.values = {}
+        self.out_time = 0.0
+        self.finished = False
+    
+    def feed(self, line):
+        """处理一行输出，每个进度块结束（progress=continue/end）时返回True"""
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return False
+        self.values[key] = value.strip()
+        if key != "progress":
+            return False
+        
+        # out_time_ms 实际单位也是微秒（ffmpeg的历史遗留问题）
+        for time_key in ("out_time_us", "out_time_ms"):
+            raw = self.values.get(time_key, "")
+            if raw.lstrip("-").isdigit():
+                self.out_time = max(0.0, int(raw) / 1000000.0)
+                break
+        else:
+            out_time = parse_timestamp(self.values.get("out_time"))
+            if out_time is not None:
+                self.out_time = out_time
+        self.finished = value.strip() == "end"
+        return True
+    
+    @property
+    def percent(self):
+        if self.finished:
+            return 100.0
+        if not self.duration:
+            return None
+        return min(self.out_time / self.duration * 100, 99.9)
+    
+    @property
+    def fps(self):
+        try:
+            return float(self.values.get("fps", ""))
+        except ValueError:
+            return None
+    
+    @property
+    def speed(self):
+        try:
+            return float(self.values.get("speed", "").rstrip("x"))
+        except ValueError:
+            return None
+    
+    @property
+    def eta(self):
+        """剩余时间（秒），按当前处理速度估算"""
+        speed = self.speed
+        if not self.duration or not speed:
+            return None
+        return max(self.duration - self.out_time, 0) / speed
+    
+    def describe(self):
+        """生成用于日志显示的进度描述"""
+        parts = []
+        if self.percent is not None:
+            parts.append(f"{self.percent:.1f}%")
+        else:
+            parts.append(f"已处理 {format_seconds(self.out_time)}")
+        if self.fps:
+            parts.append(f"{self.fps:.0f} fps")
+        if self.speed:
+            parts.append(f"速度 {self.speed:.2f}x")
+        if self.eta is not None:
+            parts.append(f"剩余 {format_seconds(self.eta)}")
+        return " | ".join(parts)
+
+# 分段并行转码: 按关键帧切分视频，各段同时编码后无损拼接
+SEGMENT_MIN_DURATION = 300  # 时长低于此值（秒）的视频不分段，切分和拼接的开销不划算
+SEGMENT_DURATION_TOLERANCE = 1.0  # 输出时长与源文件允许的误差（秒）
+SEGMENT_SYNC_TOLERANCE = 0.2  # 输出音视频流时长差相对源文件允许的变化（秒）
+
+def measure_stream_duration(ffmpeg_path, file_path, stream_spec):
+    """复制指定的流到空输出，以实际写出的时间戳计算流的时长（秒）
+
+    stream_spec 例如 "v:0"、"a:0"；文件中没有该流时返回None
+    """
+    process = popen_silently(
+        [ffmpeg_path, "-hide_banner", "-nostats", "-i", file_path,
+         "-map", f"0:{stream_spec}", "-c", "copy", "-f", "null", "-progress", "pipe:1", "-"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
+    )
+    progress = FFmpegProgress()
+    for line in process.stdout:
+        progress.feed(line.decode("utf-8", errors="ignore"))
+    process.wait()
+    if process.returncode != 0:
+        return None
+    return progress.out_time
+
+# 转换类型及其支持的源文件扩展名
+SUPPORTED_EXTENSIONS = {
+    "pdf_to_word": [".pdf"],
+    "word_to_pdf": [".doc", ".docx"],
+    "excel_to_pdf": [".xls", ".xlsx"],
+    "ppt_to_pdf": [".ppt", ".pptx"],
+    "audio_convert": [".mp3", ".wav", ".flac", ".m4a", ".ogg", ".aac"],
+    "video_convert": [".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv"],
+    "image_convert": [".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff", ".webp", ".ico"],
+}
+
+# 音视频、图片转换可选的目标格式（第一个为默认值）
+TARGET_FORMATS = {
+    "audio_convert": ["mp3", "wav", "flac", "m4a", "ogg", "aac"],
+    "video_convert": ["mp4", "avi", "mov", "mkv", "flv", "wmv"],
+    "image_convert": ["jpg", "jpeg", "png", "bmp", "gif", "tiff", "webp", "ico"],
+}
+
+# 转换类型的显示名称
+CONVERSION_TYPE_NAMES = {
+    "pdf_to_word": "PDF转Word",
+    "word_to_pdf": "Word转PDF",
+    "excel_to_pdf": "Excel转PDF",
+    "ppt_to_pdf": "PPT转PDF",
+    "audio_convert": "音频格式转换",
+    "video_convert": "视频格式转换",
+    "image_convert": "图片格式转换",
+}
+
+# 混合类型的批次：按文件头（魔数）和扩展名识别每个文件的类型，交给对应的转换方式，
+# 各类型的目标格式由路由规则决定（{转换类型: 目标格式，没有可选格式的为None}，不在其中的类型不转换）
+AUTO_CONVERSION = "auto"
+ROUTE_NAMES = {
+    "pdf": "pdf_to_word",
+    "word": "word_to_pdf",
+    "excel": "excel_to_pdf",
+    "ppt": "ppt_to_pdf",
+    "audio": "audio_convert",
+    "video": "video_convert",
+    "image": "image_convert",
+}
+ROUTE_SKIP = "skip"  # 路由规则中表示不转换该类文件
+SNIFF_BYTES = 64  # 识别类型时读取的文件头字节数
+SNIFF_THREADS = 8  # 识别文件类型的线程数（网络共享目录上读取文件头较慢）
+
+EXTENSION_TYPES = {extension: conv_type for conv_type, extensions in SUPPORTED_EXTENSIONS.items() for extension in extensions}
+
+# 文件头特征：(偏移, 字节串, 转换类型)，按顺序匹配
+FILE_SIGNATURES = [
+    (0, b"%PDF-", "pdf_to_word"),
+    (0, b"\x89PNG\r\n\x1a\n", "image_convert"),
+    (0, b"\xff\xd8\xff", "image_convert"),
+    (0, b"GIF87a", "image_convert"),
+    (0, b"GIF89a", "image_convert"),
+    (0, b"II*\x00", "image_convert"),
+    (0, b"MM\x00*", "image_convert"),
+    (0, b"ID3", "audio_convert"),
+    (0, b"fLaC", "audio_convert"),
+    (0, b"FLV", "video_convert"),
+    (0, b"\x1a\x45\xdf\xa3", "video_convert"),  # Matroska/WebM
+    (0, b"\x30\x26\xb2\x75\x8e\x66\xcf\x11", "video_convert"),  # ASF (WMV)
+    (0, b"\x00\x00\x01\xba", "video_convert"),  # MPEG节目流
+]
+RIFF_TYPES = {b"WEBP": "image_convert", b"WAVE": "audio_convert", b"AVI ": "video_convert"}
+MP4_AUDIO_BRANDS = (b"M4A ", b"M4B ", b"M4P ")  # 只有音频的MP4容器（M4A）使用的品牌
+QUICKTIME_ATOMS = (b"moov", b"mdat", b"wide", b"free", b"skip")  # 没有ftyp的旧版MOV开头的原子
+OLE2_SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"  # 旧版Office文档（复合文档）
+# ZIP格式的Office文档中标志文档类型的部件
+OOXML_PARTS = {"word/document.xml": "word_to_pdf", "xl/workbook.xml": "excel_to_pdf", "ppt/presentation.xml": "ppt_to_pdf"}
+
+def sniff_conversion_type(file_path):
+    """根据文件头判断转换类型，无法判断时返回None"""
+    try:
+        with open(file_path, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+    except OSError:
+        return None
+    for offset, signature, conv_type in FILE_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return conv_type
+    if head[:4] == b"RIFF":
+        return RIFF_TYPES.get(head[8:12])
+    if head[4:8] == b"ftyp":
+        return "audio_convert" if head[8:12] in MP4_AUDIO_BRANDS else "video_convert"
+    if head[4:8] in QUICKTIME_ATOMS:
+        return "video_convert"
+    if head[:4] == b"OggS":
+        return "video_convert" if b"\x80theora" in head else "audio_convert"
+    if head[:4] == b"PK\x03\x04":
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                names = set(archive.namelist())
+        except (OSError, zipfile.BadZipFile):
+            return None
+        for part, conv_type in OOXML_PARTS.items():
+            if part in names:
+                return conv_type
+        return None
+    if head[:8] == OLE2_SIGNATURE:
+        # 区分旧版Word、Excel、PPT需要解析复合文档的目录，按扩展名判断
+        conv_type = EXTENSION_TYPES.get(os.path.splitext(file_path)[1].lower())
+        return conv_type if conv_type in ("word_to_pdf", "excel_to_pdf", "ppt_to_pdf") else None
+    # 特征较短的格式额外检查保留字段，减少误判
+    if head[:2] == b"BM" and head[6:10] == b"\x00\x00\x00\x00":
+        return "image_convert"
+    if head[:4] == b"\x00\x00\x01\x00" and head[4:6] != b"\x00\x00":
+        return "image_convert"  # ICO
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        return "audio_convert"  # MP3/AAC帧同步字
+    return None
+
+def route_conversion_type(file_path):
+    """识别文件的转换类型：优先按文件头，无法判断时按扩展名"""
+    return sniff_conversion_type(file_path) or EXTENSION_TYPES.get(os.path.splitext(file_path)[1].lower())
+
+def default_routes():
+    """默认的路由规则：所有类型都转换，音视频和图片转换为第一个可选格式"""
+    return {conv_type: TARGET_FORMATS[conv_type][0] if conv_type in TARGET_FORMATS else None for conv_type in SUPPORTED_EXTENSIONS}
+
+def parse_routes(specs):
+    """解析命令行的路由规则（如 image=webp、word=skip），返回完整的路由规则"""
+    routes = default_routes()
+    for spec in specs or ():
+        name, _, value = spec.partition("=")
+        conv_type = ROUTE_NAMES.get(name.strip().lower(), name.strip())
+        value = value.strip().lower()
+        if conv_type not in SUPPORTED_EXTENSIONS:
+            raise ValueError(f"未知的文件类型: {name}，可选: {', '.join(ROUTE_NAMES)}")
+        if value == ROUTE_SKIP:
+            routes.pop(conv_type, None)
+        elif conv_type in TARGET_FORMATS and value in TARGET_FORMATS[conv_type]:
+            routes[conv_type] = value
+        elif conv_type in TARGET_FORMATS:
+            raise ValueError(f"不支持的目标格式: {spec}，可选: {', '.join(TARGET_FORMATS[conv_type] + [ROUTE_SKIP])}")
+        else:
+            raise ValueError(f"{name} 的输出格式是固定的，只能设置为 {ROUTE_SKIP}")
+    return routes
+
+def supported_extensions(conv_type, routes=None):
+    """转换类型支持的源文件扩展名；混合类型为路由规则中各类型扩展名的合集"""
+    if conv_type == AUTO_CONVERSION:
+        return [extension for route_type in (default_routes() if routes is None else routes) for extension in SUPPORTED_EXTENSIONS[route_type]]
+    return SUPPORTED_EXTENSIONS.get(conv_type, [])
+
+def route_batch(conv_type, file_paths, options):
+    """按转换类型把一批文件分组，返回 ([(转换类型, 文件列表, 选项), ...], [(未分组的文件, 识别出的类型或None), ...])
+
+    单一类型的批次原样作为一组；混合类型的批次识别每个文件的类型，各组的选项为options去掉路由规则、
+    换上该类型的目标格式。未识别出类型或该类型不转换的文件不分组
+    """
+    if conv_type != AUTO_CONVERSION:
+        return [(conv_type, list(file_paths), options)], []
+    routes = options.get("routes")
+    if routes is None:
+        routes = default_routes()
+    with ThreadPoolExecutor(max_workers=SNIFF_THREADS) as pool:
+        file_types = list(pool.map(route_conversion_type, file_paths))
+    grouped = {}
+    unrouted = []
+    for file_path, file_type in zip(file_paths, file_types):
+        if file_type in routes:
+            grouped.setdefault(file_type, []).append(file_path)
+        else:
+            unrouted.append((file_path, file_type))
+    groups = []
+    for file_type, group_files in grouped.items():
+        group_options = {key: value for key, value in options.items() if key not in ("routes", "target_format")}
+        if routes[file_type]:
+            group_options["target_format"] = routes[file_type]
+        groups.append((file_type, group_files, group_options))
+    return groups, unrouted
+
+def describe_unrouted(file_type):
+    """文件没有被转换的原因"""
+    if file_type is None:
+        return "无法识别的文件类型"
+    return f"未选择转换此类文件（{CONVERSION_TYPE_NAMES[file_type]}）"
+
+ICO_SIZES = [(16,16), (24,24), (32,32), (48,48), (64,64),
+             (96,96), (128,128), (144,144), (192,192), (256,256)]
+
+IMAGE_REDUCING_GAP = 2.0  # 缩小时先整数倍降采样到目标尺寸的2倍以内，再用LANCZOS精确缩放
+
+# Pillow的保存格式名与目标扩展名不同的情况
+PILLOW_SAVE_FORMATS = {"JPG": "JPEG", "TIF": "TIFF"}
+
+def image_target_size(size, max_dimension=None, min_side=None):
+    """计算缩小后的尺寸，不需要缩小时返回None
+
+    max_dimension: 长边不超过该值；min_side: 短边缩小到该值（生成ICO时保证各尺寸都能从中间图得到）
+    """
+    width, height = size
+    scale = 1.0
+    if max_dimension:
+        scale = min(scale, max_dimension / max(width, height))
+    if min_side:
+        scale = min(scale, min_side / min(width, height))
+    if scale >= 1.0:
+        return None
+    return (max(1, round(width * scale)), max(1, round(height * scale)))
+
+def load_image_scaled(Image, img, target_size, stage=None):
+    """以尽量小的代价把刚打开（尚未解码）的图片缩小到 target_size
+
+    JPEG 先用 draft() 在DCT域按1/2、1/4、1/8直接解码，不解码完整分辨率；
+    其余格式解码后由 resize(reducing_gap=...) 先用 reduce() 整数倍降采样，再做LANCZOS缩放。
+    stage 为 ConversionCore.stage，用于分别统计解码和缩放的耗时
+    """
+    if target_size is None:
+        return img
+    stage = stage or (lambda name: contextlib.nullcontext())
+    img.draft(None, (int(target_size[0] * IMAGE_REDUCING_GAP), int(target_size[1] * IMAGE_REDUCING_GAP)))
+    with stage("decode"):
+        img.load()
+    with stage("transform"):
+        # 调色板和二值图像的resize只能用最近邻插值，先转换为连续色调模式
+        if img.mode == "P":
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+        elif img.mode == "1":
+            img = img.convert("L")
+        if img.size == target_size:
+            return img
+        return img.resize(target_size, Image.Resampling.LANCZOS, reducing_gap=IMAGE_REDUCING_GAP)
+
+# 动画转换: 逐帧读取、逐帧写出，内存中只保留上一帧和待写出的一帧，与帧数无关
+ANIMATION_FORMATS = {"GIF", "WEBP", "PNG"}  # 可以保存动画的目标格式（PNG保存为APNG）
+DEFAULT_FRAME_DURATION = 100  # 源文件没有记录帧时长时使用的默认值（毫秒）
+GIF_ALPHA_THRESHOLD = 128  # GIF只支持全透明，alpha低于此值的像素视为透明
+
+def iter_animation_frames(img, mode="RGBA"):
+    """逐帧解码动画，依次返回 (合成后的完整帧, 时长毫秒)
+
+    帧由Pillow按源文件的处置方式和混合方式合成为完整画面，再由写出端重新决定处置方式，
+    因此各格式之间转换时画面与源文件一致
+    """
+    from PIL import ImageSequence
+    for frame in ImageSequence.Iterator(img):
+        converted = frame.convert(mode)
+        # WebP等格式在解码当前帧之后才写入帧时长
+        duration = frame.info.get("duration", DEFAULT_FRAME_DURATION)
+        yield converted, int(duration or 0)
+
+def animation_durations(img):
+    """各帧时长（毫秒），需要依次解码每一帧读取"""
+    from PIL import ImageSequence
+    durations = []
+    for frame in ImageSequence.Iterator(img):
+        frame.load()
+        durations.append(int(frame.info.get("duration", DEFAULT_FRAME_DURATION) or 0))
+    img.seek(0)
+    return durations
+
+def _frame_has_alpha(frame):
+    return frame.mode == "RGBA" and frame.getextrema()[3][0] < 255
+
+def _diff_bbox(previous, frame):
+    """两帧不同的区域，完全相同时返回None"""
+    from PIL import ImageChops
+    return ImageChops.difference(previous, frame).getbbox(alpha_only=False)
+
+def _quantize_gif_frame(frame, reserve_transparency=False):
+    """把RGBA帧量化为GIF调色板图像，返回 (P模式图像, 透明色索引或None)
+
+    透明像素使用调色板最后一个索引，其余颜色量化到255色以内；
+    reserve_transparency 为真时即使没有透明像素也保留透明色索引
+    """
+    if not reserve_transparency and not _frame_has_alpha(frame):
+        return frame.convert("RGB").quantize(256), None
+    transparent_index = 255
+    paletted = frame.convert("RGB").quantize(transparent_index)
+    palette = paletted.getpalette()[:transparent_index * 3]
+    paletted.putpalette(palette + [0] * (768 - len(palette)))
+    mask = frame.getchannel("A").point(lambda alpha: 255 if alpha < GIF_ALPHA_THRESHOLD else 0, "1")
+    paletted.paste(transparent_index, mask=mask)
+    return paletted, transparent_index
+
+def write_gif_stream(fp, frames, loop=None, on_frame=None):
+    """逐帧写出GIF动画
+
+    Pillow的GIF编码器会缓存全部帧到最后才写出，这里改用它的 getheader/getdata 逐帧编码。
+    GIF的透明像素总是露出下层画面，所以下一帧含透明像素时，当前帧完整写出并在显示后清除（处置方式2）；
+    否则当前帧只写出与上一帧不同的区域并保留（处置方式1）。与上一帧相同的帧合并到上一帧的时长中
+    """
+    from PIL import GifImagePlugin
+    state = {"written": None, "header": False, "count": 0}
+    
+    def write(frame, duration, next_frame):
+        previous = state["written"]
+        full = previous is None or _frame_has_alpha(frame) or (next_frame is not None and _frame_has_alpha(next_frame))
+        bbox = (0, 0) + frame.size if full else (_diff_bbox(previous, frame) or (0, 0, 1, 1))
+        disposal = 2 if next_frame is not None and _frame_has_alpha(next_frame) else 1
+        # 处置方式2清除为背景时，解码器约定用该帧的透明色作为背景（没有时用全局背景色）；
+        # Pillow等解码器按第一帧是否有透明色决定画面是否带透明通道，所以第一帧也总是带上透明色
+        reserve = previous is None or disposal == 2
+        paletted, transparency = _quantize_gif_frame(frame.crop(bbox) if bbox != (0, 0) + frame.size else frame, reserve)
+        info = {"duration": duration, "disposal": disposal, "include_color_table": True}
+        if transparency is not None:
+            info["transparency"] = transparency
+        if not state["header"]:
+            header_info = {"loop": loop} if loop is not None else {}
+            header, _ = GifImagePlugin.getheader(paletted, None, header_info)
+            fp.write(b"".join(header))
+            state["header"] = True
+        for data in GifImagePlugin.getdata(paletted, offset=bbox[:2], **info):
+            fp.write(data)
+        state["written"] = frame
+        state["count"] += 1
+    
+    pending = None  # [帧, 时长]，需要看到下一帧才能决定处置方式
+    for index, (frame, duration) in enumerate(frames):
+        if pending is not None:
+            if _diff_bbox(pending[0], frame) is None:
+                pending[1] += duration
+                continue
+            write(pending[0], pending[1], frame)
+        pending = [frame, duration]
+        if on_frame:
+            on_frame(index)
+    if pending is not None:
+        write(pending[0], pending[1], None)
+    fp.write(b";")
+    return state["count"]
+
+def _png_chunk(chunk_type, data):
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xffffffff)
+
+def _encode_png_frame(frame, compress_level):
+    """用Pillow把单帧编码为PNG，返回 (IHDR数据, 压缩后的图像数据块列表)"""
+    buffer = io.BytesIO()
+    frame.save(buffer, "PNG", compress_level=compress_level)
+    data = buffer.getvalue()
+    position = 8  # 跳过PNG文件签名
+    header, idat = None, []
+    while position < len(data):
+        length, chunk_type = struct.unpack(">I4s", data[position:position + 8])
+        payload = data[position + 8:position + 8 + length]
+        if chunk_type == b"IHDR":
+            header = payload
+        elif chunk_type == b"IDAT":
+            idat.append(payload)
+        position += length + 12
+    return header, idat
+
+def write_apng_stream(fp, frames, frame_count, loop=0, compress_level=6, on_frame=None):
+    """逐帧写出APNG动画
+
+    Pillow的APNG编码器同样会缓存全部帧，这里逐帧编码后直接写出fcTL/fdAT块。
+    每帧只写出与上一帧不同的区域，并以覆盖方式（APNG_BLEND_OP_SOURCE）绘制，透明像素也能正确替换。
+    acTL中的帧数先按frame_count写出，源文件损坏、实际读出的帧较少时回到acTL改为实际帧数；返回写出的帧数
+    """
+    sequence = 0
+    previous = None
+    written = 0
+    actl_position = None
+    fp.write(b"\x89PNG\r\n\x1a\n")
+    for index, (frame, duration) in enumerate(frames):
+        if index >= frame_count:
+            break
+        bbox = (0, 0) + frame.size if previous is None else (_diff_bbox(previous, frame) or (0, 0, 1, 1))
+        region = frame if bbox == (0, 0) + frame.size else frame.crop(bbox)
+        header, idat = _encode_png_frame(region, compress_level)
+        if previous is None:
+            fp.write(_png_chunk(b"IHDR", header))
+            actl_position = fp.tell() if fp.seekable() else None
+            fp.write(_png_chunk(b"acTL", struct.pack(">II", frame_count, loop)))
+        # fcTL: 序号、宽高、偏移、时长（毫秒）、处置方式（保留）、混合方式（覆盖）
+        fp.write(_png_chunk(b"fcTL", struct.pack(
+            ">IIIIIHHBB", sequence, region.width, region.height, bbox[0], bbox[1],
+            min(duration, 65535), 1000, 0, 0
+        )))
+        sequence += 1
+        for data in idat:
+            if previous is None:
+                fp.write(_png_chunk(b"IDAT", data))
+            else:
+                fp.write(_png_chunk(b"fdAT", struct.pack(">I", sequence) + data))
+                sequence += 1
+        previous = frame
+        written += 1
+        if on_frame:
+            on_frame(index)
+    if written == 0:
+        raise ValueError("动画中没有可读取的帧")
+    fp.write(_png_chunk(b"IEND", b""))
+    if written < frame_count:
+        if actl_position is None:
+            raise ValueError(f"动画只读出了 {written} 帧（应为 {frame_count} 帧）")
+        end = fp.tell()
+        fp.seek(actl_position)
+        fp.write(_png_chunk(b"acTL", struct.pack(">II", written, loop)))
+        fp.seek(end)
+    return written
+
+# Office文档转PDF: 应用实例在同一批次内复用，避免每个文件都启动一次Word/Excel/PowerPoint
+OFFICE_RECYCLE_AFTER = 50  # 每个实例转换多少个文档后重启，避免Office长时间运行后内存增长
+
+class ComOfficeBackend:
+    """通过Windows COM驱动Office（pywin32/comtypes）
+
+    后端接口: start()/stop() 在使用实例的线程中调用一次，launch(app_name) 启动应用，
+    export_pdf(...) 打开文档并导出PDF，is_alive(app) 检查实例是否仍可用，quit(app) 退出应用
+    """
+    def start(self):
+        # 非主线程使用COM前需要初始化
+        self.pythoncom = importlib.import_module("pythoncom") if backend_available("win32com") else None
+        if self.pythoncom:
+            self.pythoncom.CoInitialize()
+    
+    def stop(self):
+        if self.pythoncom:
+            self.pythoncom.CoUninitialize()
+    
+    def launch(self, app_name):
+        if app_name == "PowerPoint":
+            # PowerPoint不允许隐藏窗口
+            app = load_backend("comtypes").CreateObject("Powerpoint.Application")
+            app.Visible = 1
+            return app
+        # DispatchEx启动独立的进程，不会占用（或退出）用户已打开的Word/Excel
+        app = load_backend("win32com").DispatchEx(f"{app_name}.Application")
+        app.Visible = False
+        app.DisplayAlerts = False
+        return app
+    
+    def export_pdf(self, app, app_name, file_path, output_file, options):
+        if app_name == "Word":
+            doc = app.Documents.Open(file_path, ReadOnly=True)
+            try:
+                doc.SaveAs(output_file, FileFormat=17)  # 17是PDF格式
+            finally:
+                doc.Close(False)
+        elif app_name == "Excel":
+            workbook = app.Workbooks.Open(file_path, ReadOnly=True)
+            try:
+                # 遍历所有工作表并设置页面
+                for worksheet in workbook.Worksheets:
+                    # 设置页面方向，2 表示横向，1 表示纵向
+                    worksheet.PageSetup.Orientation = 2 if options["excel_orientation"] == "landscape" else 1
+                    # 设置自动调整到一页宽
+                    if options["excel_fit_to_page"]:
+                        worksheet.PageSetup.Zoom = False  # 禁用缩放
+                        worksheet.PageSetup.FitToPagesWide = 1  # 宽度适应1页
+                        worksheet.PageSetup.FitToPagesTall = False  # 高度自动
+                    else:
+                        worksheet.PageSetup.Zoom = 100  # 使用100%缩放
+                workbook.ExportAsFixedFormat(0, output_file)  # 0 表示PDF格式
+            finally:
+                workbook.Close(SaveChanges=False)  # 不保存对原文件的修改
+        else:
+            presentation = app.Presentations.Open(file_path)
+            try:
+                presentation.SaveAs(output_file, 32)  # 32 表示PDF格式
+            finally:
+                presentation.Close()
+    
+    def is_alive(self, app):
+        try:
+            app.Name
+            return True
+        except Exception:
+            return False
+    
+    def quit(self, app):
+        app.Quit()
+
+# 最小的合法PDF，模拟后端用作输出
+FAKE_PDF = (b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+            b"2 0 obj<</Type/Pages/Kids[]/Count 0>>endobj\n"
+            b"trailer<</Root 1 0 R>>\n%%EOF\n")
+
+class FakeOfficeBackend:
+    """模拟的Office后端，不依赖Windows，用于在Linux上测试实例池
+
+    记录每次调用及耗时到 calls，启动和导出按给定延迟模拟；crash_every=N 时每第N次导出模拟应用崩溃
+    """
+    def __init__(self, launch_delay=0.5, export_delay=0.05, crash_every=0):
+        self.launch_delay = launch_delay
+        self.export_delay = export_delay
+        self.crash_every = crash_every
+        self.calls = []  # (操作, 应用名, 文件名, 耗时秒数)
+        self.exports = 0
+    
+    def _record(self, action, app_name, path, started):
+        self.calls.append((action, app_name, os.path.basename(path) if path else None, time.perf_counter() - started))
+    
+    def start(self):
+        pass
+    
+    def stop(self):
+        pass
+    
+    def launch(self, app_name):
+        started = time.perf_counter()
+        time.sleep(self.launch_delay)
+        self._record("launch", app_name, None, started)
+        return {"name": app_name, "alive": True}
+    
+    def export_pdf(self, app, app_name, file_path, output_file, options):
+        started = time.perf_counter()
+        self.exports += 1
+        if self.crash_every and self.exports % self.crash_every == 0:
+            app["alive"] = False
+            self._record("crash", app_name, file_path, started)
+            raise Exception(f"模拟的{app_name}进程崩溃")
+        time.sleep(self.export_delay)
+        with open(output_file, "wb") as f:
+            f.write(FAKE_PDF)
+        self._record("export", app_name, file_path, started)
+    
+    def is_alive(self, app):
+        return app["alive"]
+    
+    def quit(self, app):
+        started = time.perf_counter()
+        app["alive"] = False
+        self._record("quit", app["name"], None, started)
+
+LIBREOFFICE_START_TIMEOUT = 60  # 等待soffice监听就绪的秒数
+
+# 在能 import uno 的Python中运行的辅助脚本: 连接常驻的soffice监听进程，
+# 从stdin逐行读取JSON转换请求（一次可包含多个文件），把每个文件的结果以JSON写回stdout
+LIBREOFFICE_HELPER_SCRIPT = r'''
+import json
+import sys
+import time
+
+import uno
+from com.sun.star.beans import PropertyValue
+from com.sun.star.connection import NoConnectException
+
+PDF_FILTERS = {"Word": "writer_pdf_Export", "Excel": "calc_pdf_Export", "PowerPoint": "impress_pdf_Export"}
+
+
+def prop(name, value):
+    item = PropertyValue()
+    item.Name = name
+    item.Value = value
+    return item
+
+
+def connect(pipe_name, timeout):
+    local = uno.getComponentContext()
+    resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            context = resolver.resolve("uno:pipe,name=%s;urp;StarOffice.ComponentContext" % pipe_name)
+            return context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+        except NoConnectException:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def setup_sheets(doc, landscape, fit_to_page):
+    # 与Excel的PageSetup对应: 页面方向，以及宽度缩放到一页、高度不限
+    styles = doc.StyleFamilies.getByName("PageStyles")
+    sheets = doc.Sheets
+    for index in range(sheets.getCount()):
+        style = styles.getByName(sheets.getByIndex(index).PageStyle)
+        if bool(style.IsLandscape) != landscape:
+            width, height = style.Width, style.Height
+            style.IsLandscape = landscape
+            style.Width, style.Height = height, width
+        if fit_to_page:
+            style.ScaleToPagesX = 1
+            style.ScaleToPagesY = 0
+        else:
+            style.PageScale = 100
+
+
+def convert(desktop, request):
+    results = []
+    for source, target in request["files"]:
+        doc = None
+        try:
+            doc = desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(source), "_blank", 0, (prop("Hidden", True), prop("ReadOnly", True))
+            )
+            if doc is None:
+                raise RuntimeError("cannot open document")
+            if request["app"] == "Excel":
+                setup_sheets(doc, request["orientation"] == "landscape", request["fit_to_page"])
+            doc.storeToURL(uno.systemPathToFileUrl(target), (prop("FilterName", PDF_FILTERS[request["app"]]),))
+            results.append({"file": source, "error": None})
+        except Exception as e:
+            results.append({"file": source, "error": str(e) or type(e).__name__})
+        finally:
+            if doc is not None:
+                doc.close(True)
+    return results
+
+
+def main():
+    desktop = connect(sys.argv[1], float(sys.argv[2]))
+    print(json.dumps({"ready": True}), flush=True)
+    for line in sys.stdin:
+        request = json.loads(line)
+        if request.get("quit"):
+            break
+        print(json.dumps({"results": convert(desktop, request)}), flush=True)
+    try:
+        desktop.terminate()
+    except Exception:
+        pass  # soffice在terminate返回前退出时连接会断开
+
+
+if __name__ == "__main__":
+    main()
+'''
+
+_libreoffice_lock = threading.Lock()
+_libreoffice_paths = {}
+
+def find_soffice():
+    """查找LibreOffice的soffice可执行文件，找不到时返回None"""
+    for name in ("soffice", "libreoffice"):
+        path = shutil.which(name)
+        if path:
+            return path
+    candidates = [
+        os.path.join(os.environ.get("PROGRAMFILES", r"C:\Program Files"), "LibreOffice", "program", "soffice.exe"),
+        os.path.join(os.environ.get("PROGRAMFILES(X86)", r"C:\Program Files (x86)"), "LibreOffice", "program", "soffice.exe"),
+        "/Applications/LibreOffice.app/Contents/MacOS/soffice",
+    ]
+    return next((path for path in candidates if os.path.exists(path)), None)
+
+def find_uno_python(soffice_path):
+    """查找能 import uno 的Python: LibreOffice自带的Python，或安装了python3-uno的系统Python
+
+    找不到时返回None，此时只能用 soffice --convert-to 命令行转换
+    """
+    with _libreoffice_lock:
+        if soffice_path in _libreoffice_paths:
+            return _libreoffice_paths[soffice_path]
+        program_dir = os.path.dirname(os.path.realpath(soffice_path))
+        candidates = [
+            os.path.join(program_dir, "python.exe"),  # Windows
+            os.path.join(program_dir, "python"),
+            os.path.join(program_dir, "..", "Resources", "python"),  # macOS
+        ]
+        if not getattr(sys, "frozen", False):
+            candidates.append(sys.executable)
+        candidates.append(shutil.which("python3"))
+        found = None
+        for python in candidates:
+            if not python or not os.path.exists(python):
+                continue
+            try:
+                process = popen_silently([python, "-c", "import uno"], stdin=subprocess.DEVNULL,
+                                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                if process.wait(timeout=30) == 0:
+                    found = python
+                    break
+            except (OSError, subprocess.TimeoutExpired):
+                continue
+        _libreoffice_paths[soffice_path] = found
+        return found
+
+class LibreOfficeBackend:
+    """通过LibreOffice无界面模式转换，没有Microsoft Office的Linux服务器上使用
+
+    每个线程（实例池）使用独立的用户配置目录，多个转换进程可以同时运行互不干扰。
+    有可用的UNO Python时启动常驻的soffice监听进程，由辅助脚本通过UNO逐个转换，一个热进程处理多个文件，
+    并按 excel_orientation / excel_fit_to_page 设置表格页面；否则退回 soffice --convert-to 命令行
+    （命令行方式每次调用冷启动，也无法设置表格页面）
+    """
+    def start(self):
+        self.soffice = find_soffice()
+        if not self.soffice:
+            raise Exception("未找到LibreOffice（soffice），请先安装LibreOffice")
+        self.uno_python = find_uno_python(self.soffice)
+        self.profile_root = tempfile.mkdtemp(prefix="fc-libreoffice-")
+        self.launches = 0
+        self.helper_path = os.path.join(self.profile_root, "uno_helper.py")
+        with open(self.helper_path, "w", encoding="utf-8") as f:
+            f.write(LIBREOFFICE_HELPER_SCRIPT)
+    
+    def stop(self):
+        shutil.rmtree(self.profile_root, ignore_errors=True)
+    
+    def _profile_args(self, app_name):
+        profile = os.path.join(self.profile_root, f"profile-{app_name}")
+        return [f"-env:UserInstallation={pathlib.Path(profile).resolve().as_uri()}"]
+    
+    def launch(self, app_name):
+        if not self.uno_python:
+            return {"mode": "cli", "profile_args": self._profile_args(app_name)}
+        
+        self.launches += 1
+        pipe_name = f"fc_{os.getpid()}_{threading.get_ident()}_{app_name}_{self.launches}"
+        office = popen_silently(
+            [self.soffice, *self._profile_args(app_name), "--headless", "--invisible", "--nologo",
+             "--norestore", "--nodefault", "--nolockcheck",
+             f"--accept=pipe,name={pipe_name};urp;StarOffice.ComponentContext"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        helper = popen_silently(
+            [self.uno_python, self.helper_path, pipe_name, str(LIBREOFFICE_START_TIMEOUT)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        app = {"mode": "uno", "office": office, "helper": helper}
+        reply = self._read_reply(app)
+        if not reply or not reply.get("ready"):
+            self.quit(app)
+            raise Exception("LibreOffice监听进程启动失败")
+        return app
+    
+    def _send(self, app, request):
+        app["helper"].stdin.write((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+        app["helper"].stdin.flush()
+    
+    def _read_reply(self, app):
+        line = app["helper"].stdout.readline()
+        return json.loads(line.decode("utf-8")) if line else None
+    
+    def convert_files(self, app, app_name, pairs, options):
+        """一次转换多个文档，pairs 为 [(源文件, 输出PDF), ...]，返回 {源文件: 错误信息或None}"""
+        if app["mode"] == "uno":
+            self._send(app, {
+                "app": app_name,
+                "files": [list(pair) for pair in pairs],
+                "orientation": options["excel_orientation"],
+                "fit_to_page": options["excel_fit_to_page"],
+            })
+            reply = self._read_reply(app)
+            if reply is None:
+                raise Exception("LibreOffice进程已退出")
+            return {item["file"]: item["error"] for item in reply["results"]}
+        
+        # 命令行方式: 输出到同一目录的文件在一次调用中转换
+        groups = collections.defaultdict(list)
+        for source, target in pairs:
+            groups[os.path.dirname(target)].append((source, target))
+        errors = {}
+        for output_dir, items in groups.items():
+            for _, target in items:
+                if os.path.exists(target):
+                    os.remove(target)
+            # 先输出到临时目录再改名，避免覆盖输出目录中与源文件同名的PDF
+            work_dir = tempfile.mkdtemp(prefix=".libreoffice-", dir=output_dir)
+            try:
+                process = popen_silently(
+                    [self.soffice, *app["profile_args"], "--headless", "--norestore", "--nolockcheck",
+                     "--convert-to", "pdf", "--outdir", work_dir, *[source for source, _ in items]],
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE
+                )
+                _, stderr = process.communicate()
+                for source, target in items:
+                    produced = os.path.join(work_dir, os.path.splitext(os.path.basename(source))[0] + ".pdf")
+                    if os.path.exists(produced):
+                        os.replace(produced, target)
+                    if os.path.exists(target):
+                        errors[source] = None
+                    else:
+                        errors[source] = stderr.decode("utf-8", errors="ignore").strip()[-300:] or "LibreOffice未生成PDF"
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        return errors
+    
+    def export_pdf(self, app, app_name, file_path, output_file, options):
+        error = self.convert_files(app, app_name, [(file_path, output_file)], options).get(file_path)
+        if error:
+            raise Exception(error)
+    
+    def is_alive(self, app):
+        if app["mode"] != "uno":
+            return True
+        return app["helper"].poll() is None and app["office"].poll() is None
+    
+    def quit(self, app):
+        if app["mode"] != "uno":
+            return
+        helper, office = app["helper"], app["office"]
+        try:
+            self._send(app, {"quit": True})
+            helper.stdin.close()
+            helper.wait(timeout=10)
+        except Exception:
+            helper.kill()
+        try:
+            office.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            office.kill()
+            office.wait()
+
+OFFICE_BACKENDS = {
+    "com": ComOfficeBackend,
+    "libreoffice": LibreOfficeBackend,
+    "fake": FakeOfficeBackend,
+}
+
+def resolve_office_backend(name):
+    """auto: 安装了pywin32（Windows）时使用Office COM，否则使用LibreOffice"""
+    if name == "auto":
+        return "com" if backend_available("win32com") else "libreoffice"
+    return name
+
+class OfficeAppPool:
+    """按应用缓存长期运行的Office实例
+
+    同一线程内的文档复用已启动的实例；实例转换 recycle_after 个文档后重启，
+    导出失败且实例已不可用（崩溃）时丢弃实例并用新实例重试一次。close() 退出全部实例
+    """
+    def __init__(self, backend, recycle_after=OFFICE_RECYCLE_AFTER):
+        self.backend = backend
+        self.recycle_after = max(1, int(recycle_after or OFFICE_RECYCLE_AFTER))
+        self.apps = {}  # 应用名 -> [实例, 已转换文档数]
+        self.stats = {"launches": 0, "documents": 0, "recycles": 0, "crashes": 0}
+        self.backend.start()
+    
+    def _acquire(self, app_name, status=None, stage=None):
+        entry = self.apps.get(app_name)
+        if entry is None:
+            if status:
+                status(f"启动{app_name}实例")
+            with (stage or (lambda name: contextlib.nullcontext()))("launch"):
+                entry = self.apps[app_name] = [self.backend.launch(app_name), 0]
+            self.stats["launches"] += 1
+        return entry
+    
+    def discard(self, app_name):
+        """退出并丢弃实例，下次使用时重新启动"""
+        entry = self.apps.pop(app_name, None)
+        if entry is None:
+            return
+        try:
+            self.backend.quit(entry[0])
+        except Exception:
+            pass  # 实例已崩溃时退出会失败，忽略
+    
+    def export_pdf(self, app_name, file_path, output_file, options, status=None, stage=None):
+        """stage为ConversionCore.stage时分别统计启动实例和导出的耗时"""
+        stage = stage or (lambda name: contextlib.nullcontext())
+        for attempt in range(2):
+            entry = self._acquire(app_name, status, stage)
+            try:
+                with stage("encode"):
+                    self.backend.export_pdf(entry[0], app_name, file_path, output_file, options)
+                break
+            except Exception:
+                if self.backend.is_alive(entry[0]):
+                    raise  # 实例正常，是文档本身的问题
+                self.stats["crashes"] += 1
+                self.discard(app_name)
+                if attempt:
+                    raise
+                if status:
+                    status(f"{app_name}实例已失去响应，重新启动后重试")
+        
+        entry[1] += 1
+        self.stats["documents"] += 1
+        if entry[1] >= self.recycle_after:
+            self.stats["recycles"] += 1
+            self.discard(app_name)
+    
+    def close(self):
+        for app_name in list(self.apps):
+            self.discard(app_name)
+        self.backend.stop()
+
+def describe_office_stats(stats):
+    """Office实例池统计的文字描述"""
+    return (f"Office实例: 启动 {stats['launches']} 次，转换文档 {stats['documents']} 个，"
+            f"定期重启 {stats['recycles']} 次，崩溃 {stats['crashes']} 次")
+
+_office_pools = threading.local()  # COM对象不能跨线程使用，每个线程各自维护实例池
+
+def get_office_pool(backend_name, recycle_after=OFFICE_RECYCLE_AFTER):
+    """当前线程中指定后端的Office实例池"""
+    backend_name = resolve_office_backend(backend_name)
+    pools = getattr(_office_pools, "pools", None)
+    if pools is None:
+        pools = _office_pools.pools = {}
+    if backend_name not in pools:
+        if backend_name not in OFFICE_BACKENDS:
+            raise Exception(f"未知的Office转换后端: {backend_name}")
+        pools[backend_name] = OfficeAppPool(OFFICE_BACKENDS[backend_name](), recycle_after)
+    return pools[backend_name]
+
+def release_office_pools():
+    """退出当前线程中的全部Office实例，返回各后端的统计信息
+
+    某个后端退出失败时仍继续退出其余后端，全部处理完后再抛出第一个错误
+    """
+    pools = getattr(_office_pools, "pools", None) or {}
+    _office_pools.pools = {}
+    stats = {}
+    error = None
+    for name, pool in pools.items():
+        try:
+            pool.close()
+        except Exception as e:
+            error = error or e
+        stats[name] = dict(pool.stats)
+    if error:
+        raise error
+    return stats
+
+# PDF转Word: 页数较多时把页面分块交给多个进程解析，再在主进程中合并生成docx
+PDF_PARALLEL_MIN_PAGES = 20  # 少于此页数时单进程解析，启动子进程的开销不划算
+PDF_CHUNKS_PER_WORKER = 4  # 每个进程平均分到的页面块数，块越小负载越均衡、进度越细
+
+def _parse_pdf_pages(pdf_path, page_indexes, json_path):
+    """在子进程中解析PDF的指定页面，结果序列化到 json_path（模块级函数，可被进程池pickle）
+
+    与pdf2docx自带的多进程模式相同，版面分析（页眉页脚等）只基于本块的页面
+    """
+    converter = load_backend("pdf2docx").Converter(pdf_path)
+    try:
+        settings = converter.default_settings
+        converter.load_pages(pages=page_indexes).parse_document(**settings).parse_pages(**settings).serialize(json_path)
+    finally:
+        converter.close()
+    return len(page_indexes)
+
+# 转换选项默认值，与界面上的默认设置一致
+DEFAULT_OPTIONS = {
+    "target_format": None,
+    "image_quality": 95,
+    "max_dimension": 0,  # 图片长边的最大像素数，0表示保持原尺寸
+    "ico_sizes": list(ICO_SIZES),
+    "excel_orientation": "landscape",
+    "excel_fit_to_page": True,
+    "stream_copy": True,  # 编码兼容时直接复制音视频流，不重新编码
+    "preset": "default",  # 音视频编码预设，见ENCODER_PRESET_NAMES
+    "crf": None,
+    "video_bitrate": None,
+    "audio_bitrate": None,
+    "sample_rate": None,
+    "video_codec": None,
+    "audio_codec": None,
+    "threads": 0,  # 每个ffmpeg进程的线程数，0表示自动
+    "segment_parallel": False,  # 长视频重新编码时按关键帧分段并行转码
+    "segments": 0,  # 分段数，0表示按CPU核心数
+    "segment_min_duration": SEGMENT_MIN_DURATION,
+    "pdf_parallel": True,  # 页数较多的PDF转Word时多进程并行解析页面
+    "pdf_workers": 0,  # 页面解析进程数，0表示按CPU核心数
+    "pdf_parallel_min_pages": PDF_PARALLEL_MIN_PAGES,
+    "office_backend": "auto",  # Office文档转PDF的后端，auto或OFFICE_BACKENDS中的名称
+    "office_recycle_after": OFFICE_RECYCLE_AFTER,
+}
+
+class ConversionCore:
+    """转换核心，不依赖Tkinter，图形界面和命令行共用"""
+    def __init__(self, output_dir, options=None, ffmpeg_path=None, status_callback=None, progress_callback=None, control=None):
+        self.output_dir = output_dir
+        self.options = dict(DEFAULT_OPTIONS, **(options or {}))
+        self.ffmpeg_path = ffmpeg_path
+        self.status_callback = status_callback
+        self.progress_callback = progress_callback
+        self.control = control  # BatchControl，用于暂停、取消时挂起或终止子进程
+        self.segment_control = None  # 分段并行编码期间的BatchControl，一段失败时终止其余各段
+        self.report = {}  # 转换过程的附加信息（例如音视频的转换方式）
+        self.temp_outputs = {}  # 临时输出文件 -> 最终输出文件
+        self.stages = collections.Counter()  # 阶段 -> 累计耗时（秒）
+        self.spans = []  # (阶段, 开始时间, 结束时间, 线程)，用于生成时间线
+        self.stage_lock = threading.Lock()
+    
+    @contextlib.contextmanager
+    def stage(self, name):
+        """统计一个转换阶段的耗时（见STAGE_NAMES），分段并行转码时各线程的阶段分别计入"""
+        started = time.time()
+        try:
+            yield
+        finally:
+            finished = time.time()
+            with self.stage_lock:
+                self.stages[name] += finished - started
+                self.spans.append((name, started, finished, threading.get_ident()))
+    
+    def timing_report(self, started):
+        """本次转换的耗时信息，随任务结果返回（可被pickle）"""
+        with self.stage_lock:
+            return {
+                "started": started,
+                "finished": time.time(),
+                "stages": dict(self.stages),
+                "spans": list(self.spans),
+                "pid": os.getpid(),
+                "thread": threading.get_ident(),
+            }
+    
+    def update_status(self, message):
+        """报告状态信息"""
+        if self.status_callback:
+            self.status_callback(message)
+    
+    def update_progress(self, value):
+        """报告当前文件的转换进度（0-100）"""
+        if self.progress_callback:
+            self.progress_callback(value)
+    
+    def convert(self, conv_type, file_path):
+        """按转换类型转换单个文件，返回输出文件路径"""
+        if conv_type not in SUPPORTED_EXTENSIONS:
+            raise Exception(f"不支持的转换类型: {conv_type}")
+        if self.options["target_format"] is None and conv_type in TARGET_FORMATS:
+            self.options["target_format"] = TARGET_FORMATS[conv_type][0]
+        try:
+            output_file = getattr(self, conv_type)(file_path)
+            final_file = self.temp_outputs.pop(output_file, output_file)
+            if final_file != output_file:
+                with self.stage("write"):
+                    os.replace(output_file, final_file)
+            return final_file
+        finally:
+            # 转换失败或被取消时删除未完成的临时文件
+            for temp_file in self.temp_outputs:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+            self.temp_outputs.clear()
+    
+    def output_path(self, file_name, extension):
+        """生成输出文件路径
+
+        转换器写入的是同一目录下的临时文件，转换成功后由convert改名为最终文件，
+        中途失败、取消或程序被关闭时不会留下不完整的输出。改名替换的是目录项，
+        已有的输出文件是硬链接（查重时与其他输出共用同一份数据）时也不会改动其他文件
+        """
+        final_file = os.path.join(self.output_dir, f"{file_name}.{extension}")
+        temp_file = os.path.join(self.output_dir, f".{file_name}.{os.urandom(4).hex()}{PARTIAL_SUFFIX}.{extension}")
+        self.temp_outputs[temp_file] = final_file
+        return temp_file
+    
+    def display_name(self, output_file):
+        """输出文件在日志中显示的名称（临时文件显示最终文件名）"""
+        return os.path.basename(self.temp_outputs.get(output_file, output_file))
+    
+    def popen(self, cmd, **kwargs):
+        """启动子进程并登记到批量控制，暂停时挂起、取消时终止；结束后需调用release"""
+        process = popen_silently(cmd, **kwargs)
+        for control in (self.control, self.segment_control):
+            if control:
+                control.register(process)
+        return process
+    
+    def release(self, process):
+        for control in (self.control, self.segment_control):
+            if control:
+                control.unregister(process)
+    
+    def check_cancelled(self):
+        if self.control and self.control.cancelled:
+            raise ConversionCancelled("已取消")
+    
+    def write_output(self, output_file, buffer):
+        """把已编码到内存的结果写入输出文件"""
+        with self.stage("write"):
+            with open(output_file, "wb") as f:
+                f.write(buffer.getbuffer())
+    
+    def run_ffmpeg_silently(self, input_file, output_file, output_format, duration=None, extra_args=None, input_args=None, on_progress=None):
+        """静默运行ffmpeg，不显示命令行窗口，实时解析进度
+
+        指定 on_progress 时每个进度块调用 on_progress(FFmpegProgress)，由调用方汇总进度，
+        不再单独更新进度条和日志
+        """
+        try:
+            # 构建ffmpeg命令，进度以key=value形式输出到stdout
+            cmd = [
+                self.ffmpeg_path,
+                '-hide_banner',
+                '-nostats',
+                *(input_args or []),
+                '-i', input_file,
+                *(extra_args or []),
+                '-progress', 'pipe:1',
+                '-y',  # 覆盖输出文件
+                output_file
+            ]
+            
+            with self.stage("spawn"):
+                process = self.popen(
+                    cmd,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE
+                )
+            
+            # 在后台线程中读取stderr，只保留最后若干行用于错误信息，避免长任务占用大量内存
+            stderr_tail = collections.deque(maxlen=FFMPEG_STDERR_TAIL_LINES)
+            stderr_thread = threading.Thread(
+                target=lambda: stderr_tail.extend(line.decode('utf-8', errors='ignore').rstrip() for line in process.stderr)
+            )
+            stderr_thread.daemon = True
+            stderr_thread.start()
+            
+            progress = FFmpegProgress(duration)
+            file_name = os.path.basename(input_file)
+            last_logged = time.time()
+            try:
+                # ffmpeg在同一进程中读取、解码、编码和写入，整体计为编码阶段
+                with self.stage("encode"):
+                    for line in process.stdout:
+                        if not progress.feed(line.decode('utf-8', errors='ignore')):
+                            continue
+                        if on_progress:
+                            on_progress(progress)
+                            continue
+                        if progress.percent is not None:
+                            self.update_progress(progress.percent)
+                        # 日志每隔一段时间输出一次，避免刷屏
+                        if time.time() - last_logged >= FFMPEG_PROGRESS_LOG_INTERVAL and not progress.finished:
+                            self.update_status(f"{file_name}: {progress.describe()}")
+                            last_logged = time.time()
+                    
+                    process.wait()
+            finally:
+                self.release(process)
+            stderr_thread.join()
+            
+            self.check_cancelled()
+            if process.returncode != 0:
+                error_msg = "\n".join(stderr_tail) if stderr_tail else "未知错误"
+                raise Exception(f"FFmpeg转换失败: {error_msg}")
+                
+            return True
+            
+        except Exception as e:
+            raise Exception(f"FFmpeg执行错误: {str(e)}")
+    
+    def pdf_to_word(self, file_path):
+        """PDF转Word，页数较多时多进程并行解析页面"""
+        try:
+            self.update_status(f"开始PDF转Word: {os.path.basename(file_path)}")
+            self.update_progress(5)
+            
+            file_name = os.path.splitext(os.path.basename(file_path))[0]
+            output_file = self.output_path(file_name, "docx")
+            
+            Converter = load_backend("pdf2docx").Converter
+            with self.stage("read"):
+                converter = Converter(file_path)
+            try:
+                settings = converter.default_settings
+                page_count = len(converter.fitz_doc)
+                workers = int(self.options.get("pdf_workers") or 0) or default_worker_count()
+                min_pages = int(self.options.get("pdf_parallel_min_pages") or 0)
+                
+                self.update_status(f"正在转换: {os.path.basename(file_path)}（共 {page_count} 页）")
+                # 页面解析（版面分析）计为解码，生成并保存docx计为编码
+                with self.stage("decode"):
+                    if self.options.get("pdf_parallel") and workers > 1 and page_count >= max(min_pages, 2):
+                        self.parse_pdf_parallel(converter, file_path, page_count, min(workers, page_count))
+                    else:
+                        self.parse_pdf_sequential(converter, settings)
+                
+                self.update_status(f"正在生成Word文档: {self.display_name(output_file)}")
+                with self.stage("encode"):
+                    converter.make_docx(output_file, **settings)
+            finally:
+                converter.close()
+            
+            self.update_progress(100)
+            return output_file
+            
+        except Exception as e:
+            raise Exception(f"PDF转Word失败: {str(e)}")
+    
+    def parse_pdf_sequential(self, converter, settings):
+        """在当前进程中逐页解析，按页报告进度"""
+        converter.load_pages().parse_document(**settings)
+        self.update_progress(30)
+        
+        pages = [page for page in converter.pages if not page.skip_parsing]
+        for index, page in enumerate(pages, start=1):
+            try:
+                page.parse(**settings)
+            except Exception as e:
+                # 与pdf2docx一致: 默认跳过解析出错的页面
+                if settings["raw_exceptions"] or settings["debug"] or not settings["ignore_page_error"]:
+                    raise Exception(f"解析第 {page.id + 1} 页出错: {str(e)}")
+                self.update_status(f"跳过解析出错的第 {page.id + 1} 页: {str(e)}")
+            self.update_progress(30 + 60 * index / len(pages))
+    
+    def parse_pdf_parallel(self, converter, file_path, page_count, workers):
+        """把页面分块交给多个进程解析，每完成一块报告一次进度，最后合并到 converter"""
+        chunk_size = max(1, -(-page_count // (workers * PDF_CHUNKS_PER_WORKER)))
+        chunks = [list(range(start, min(start + chunk_size, page_count))) for start in range(0, page_count, chunk_size)]
+        self.update_status(f"使用 {workers} 个进程并行解析 {page_count} 页（{len(chunks)} 块）")
+        
+        work_dir = tempfile.mkdtemp(prefix="pdf2docx-")
+        try:
+            json_files = [os.path.join(work_dir, f"pages-{index}.json") for index in range(len(chunks))]
+            parsed_pages = 0
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_parse_pdf_pages, file_path, chunk, json_file) for chunk, json_file in zip(chunks, json_files)]
+                try:
+                    for future in as_completed(futures):
+                        parsed_pages += future.result()
+                        self.update_progress(5 + 85 * parsed_pages / page_count)
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+            
+            # 按页码顺序合并各块的解析结果
+            for json_file in json_files:
+                converter.deserialize(json_file)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    def office_export(self, app_name, file_path, output_file):
+        """用实例池中的Office应用把文档导出为PDF"""
+        pool = get_office_pool(self.options["office_backend"], self.options.get("office_recycle_after"))
+        # COM要求绝对路径
+        pool.export_pdf(app_name, os.path.abspath(file_path), os.path.abspath(output_file), self.options, status=self.update_status, stage=self.stage)
+    
+    def word_to_pdf(self, file_path):
+        """Word转PDF - 包含错误处理和备选方案"""
+        self.update_status(f"开始Word转PDF: {os.path.basename(file_path)}")
+        self.update_progress(30)
+        
+        file_name = os.path.splitext(os.path.basename(file_path))[0]
+        output_file = self.output_path(file_name, "pdf")
+        
+        self.update_status(f"正在转换: {os.path.basename(file_path)}")
+        try:
+            # 复用实例池中的Word
+            self.office_export("Word", file_path, output_file)
+            self.update_progress(100)
+            return output_file
+            
+        except Exception as e:
+            # 如果Office自动化失败，尝试使用docx2pdf作为备选方案
+            try:
+                if not backend_available("docx2pdf"):
+                    raise Exception("docx2pdf库未安装，请先运行 'pip install docx2pdf'")
+                self.update_status(f"尝试备选方案转换: {os.path.basename(file_path)}")
+                with self.stage("encode"):
+                    load_backend("docx2pdf").convert(file_path, output_file)
+                
+                self.update_progress(100)
+                return output_file
+                
+            except Exception as e2:
+                raise Exception(f"Word转PDF失败: 主方案[{str(e)}], 备选方案[{str(e2)}]")
+    
+    def excel_to_pdf(self, file_path):
+        """Excel转PDF - 修复表格显示不全问题"""
+        try:
+            self.update_status(f"开始Excel转PDF: {os.path.basename(file_path)}")
+            self.update_progress(20)
+            
+            file_name = os.path.splitext(os.path.basename(file_path))[0]
+            output_file = self.output_path(file_name, "pdf")
+            
+            self.update_status(f"正在转换: {os.path.basename(file_path)}")
+            self.update_progress(40)
+            
+            # 页面方向和缩放由后端按 excel_orientation / excel_fit_to_page 设置
+            self.office_export("Excel", file_path, output_file)
+            
+            self.update_progress(100)
+            return output_file
+            
+        except Exception as e:
+            raise Exception(f"Excel转PDF失败: {str(e)}")
+    
+    def ppt_to_pdf(self, file_path):
+        """PPT转PDF"""
+        try:
+            self.update_status(f"开始PPT转PDF: {os.path.basename(file_path)}")
+            self.update_progress(20)
+            
+            file_name = os.path.splitext(os.path.basename(file_path))[0]
+            output_file = self.output_path(file_name, "pdf")
+            
+            self.update_status(f"正在转换: {os.path.basename(file_path)}")
+            self.update_progress(40)
+            
+            self.office_export("PowerPoint", file_path, output_file)
+            
+            self.update_progress(100)
+            return output_file
+            
+        except Exception as e:
+            raise Exception(f"PPT转PDF失败: {str(e)}")
+    
+    def audio_convert(self, file_path):
+        """音频格式转换"""
+        try:
+            return self.media_convert(file_path, "audio")
+        except Exception as e:
+            raise Exception(f"音频转换失败: {str(e)}")
+    
+    def video_convert(self, file_path):
+        """视频格式转换"""
+        try:
+            return self.media_convert(file_path, "video")
+        except Exception as e:
+            raise Exception(f"视频转换失败: {str(e)}")
+    
+    def media_convert(self, file_path, kind):
+        """音视频转换的公共流程，编码兼容时直接封装，不重新编码"""
+        kind_name = "音频" if kind == "audio" else "视频"
+        
+        # 检查ffmpeg是否存在
+        if not self.ffmpeg_path or not os.path.exists(self.ffmpeg_path):
+            raise Exception(f"无法找到ffmpeg.exe，{kind_name}转换功能无法使用")
+            
+        self.update_status(f"开始{kind_name}格式转换: {os.path.basename(file_path)}")
+        self.update_progress(0)
+        
+        file_name = os.path.splitext(os.path.basename(file_path))[0]
+        output_format = self.options["target_format"]
+        output_file = self.output_path(file_name, output_format)
+        
+        # 先探测时长和编码，用于计算转换百分比并选择转换方式
+        with self.stage("probe"):
+            media_info = probe_media(self.ffmpeg_path, file_path)
+        duration = media_info["duration"]
+        duration_text = format_seconds(duration) if duration else "未知"
+        
+        # 编码参数（预设及用户指定的码率、采样率等）
+        video_args = build_video_args(output_format, self.options) if kind == "video" else []
+        audio_args = build_audio_args(output_format, self.options)
+        transcode_args = video_args + audio_args
+        
+        method, extra_args = "transcode", transcode_args
+        if self.options["stream_copy"]:
+            # 用户指定了视频/音频编码参数时，对应的流需要重新编码
+            video_forced = any(self.options.get(key) for key in ("video_codec", "video_bitrate")) or self.options.get("crf") is not None
+            audio_forced = any(self.options.get(key) for key in ("audio_codec", "audio_bitrate", "sample_rate"))
+            method, copy_args = plan_stream_copy(
+                media_info, output_format, kind,
+                allow_video_copy=not video_forced,
+                allow_audio_copy=not audio_forced
+            )
+            if method == "copy_video":
+                extra_args = copy_args + (audio_args or ["-c:a", AUDIO_ENCODERS[output_format]])
+            elif method == "remux":
+                extra_args = copy_args
+        
+        # 线程数限制同时作用于解码和编码
+        threads = int(self.options.get("threads") or 0)
+        thread_args = ["-threads", str(threads)] if threads > 0 else []
+        
+        preset_name = ENCODER_PRESET_NAMES.get(self.options.get("preset") or "default", "默认")
+        self.update_status(
+            f"正在转换为{output_format}: {os.path.basename(file_path)}"
+            f"（时长 {duration_text}，方式: {CONVERSION_METHOD_NAMES[method]}，预设: {preset_name}）"
+        )
+        
+        # 长视频需要完全重新编码时，按关键帧分段并行编码
+        min_duration = float(self.options.get("segment_min_duration") or 0)
+        if kind == "video" and method == "transcode" and self.options.get("segment_parallel") and duration and duration >= min_duration:
+            try:
+                self.segmented_transcode(file_path, output_file, output_format, media_info, video_args, audio_args)
+                self.report["method"] = "segmented"
+                self.update_progress(100)
+                return output_file
+            except Exception as e:
+                self.update_status(f"分段并行转码失败，改为整体重新编码: {os.path.basename(file_path)} - {str(e)[:200]}")
+                self.update_progress(0)
+        
+        try:
+            # 使用静默方式运行ffmpeg
+            self.run_ffmpeg_silently(
+                file_path, output_file, output_format, duration=duration,
+                extra_args=extra_args + thread_args, input_args=thread_args
+            )
+        except Exception as e:
+            if method == "transcode":
+                raise
+            # 直接封装失败（例如时间戳不兼容）时回退到重新编码
+            self.update_status(f"{CONVERSION_METHOD_NAMES[method]}失败，改为重新编码: {os.path.basename(file_path)} - {str(e)[:200]}")
+            method = "transcode"
+            self.run_ffmpeg_silently(
+                file_path, output_file, output_format, duration=duration,
+                extra_args=transcode_args + thread_args, input_args=thread_args
+            )
+        
+        self.report["method"] = method
+        self.update_progress(100)
+        return output_file
+    
+    def segmented_transcode(self, file_path, output_file, output_format, media_info, video_args, audio_args):
+        """按关键帧把视频切成若干段并行编码，再用concat无损拼接
+
+        切分时直接复制视频流，每段都从关键帧开始，编码后的各段可以直接拼接；
+        音频不切分，整条单独编码一次后与拼接好的视频封装，避免段边界处的音频间隙造成音画不同步。
+        拼接后校验时长和音视频同步，不满足时抛出异常，由调用方改为整体重新编码
+        """
+        duration = media_info["duration"]
+        has_audio = any(stream["type"] == "audio" for stream in media_info["streams"])
+        file_label = os.path.basename(file_path)
+        
+        # 分段数默认等于可用线程数，每段ffmpeg分到的线程数相应减少，总线程数不超过预算
+        budget = int(self.options.get("threads") or 0) or default_worker_count()
+        segment_count = int(self.options.get("segments") or 0) or budget
+        if segment_count < 2:
+            raise Exception("可用CPU核心不足，无需分段")
+        thread_args = ["-threads", str(max(1, budget // segment_count))]
+        
+        work_dir = tempfile.mkdtemp(prefix=".segments-", dir=self.output_dir)
+        try:
+            # 1. 按关键帧切分视频流（直接复制，不编码）
+            self.update_status(f"正在按关键帧切分视频: {file_label}（目标 {segment_count} 段）")
+            with self.stage("spawn"):
+                process = self.popen(
+                    [self.ffmpeg_path, "-hide_banner", "-nostats", "-loglevel", "error",
+                     "-i", file_path, "-map", "0:v:0", "-c", "copy",
+                     "-f", "segment", "-segment_time", f"{duration / segment_count:.3f}",
+                     "-reset_timestamps", "1", os.path.join(work_dir, "source_%04d.mkv")],
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE
+                )
+            try:
+                with self.stage("transform"):
+                    _, stderr = process.communicate()
+            finally:
+                self.release(process)
+            self.check_cancelled()
+            if process.returncode != 0:
+                raise Exception(f"切分失败: {stderr.decode('utf-8', errors='ignore').strip()[-500:]}")
+            sources = sorted(glob.glob(os.path.join(work_dir, "source_*.mkv")))
+            if len(sources) < 2:
+                raise Exception("关键帧间隔过大，无法分段")
+            self.update_progress(5)
+            
+            # 2. 各段视频和整条音频同时编码，进度按已编码的时长汇总
+            jobs = []
+            segments = []
+            for index, source in enumerate(sources):
+                target = os.path.join(work_dir, f"encoded_{index:04d}.{output_format}")
+                segments.append(target)
+                jobs.append((source, target, ["-map", "0:v:0", *video_args, "-an"]))
+            audio_file = None
+            if has_audio:
+                audio_file = os.path.join(work_dir, f"audio.{output_format}")
+                audio_codec_args = audio_args or ["-c:a", AUDIO_ENCODERS[output_format]]
+                jobs.append((file_path, audio_file, ["-map", "0:a:0", "-vn", *audio_codec_args]))
+            
+            encoded_time = {}
+            progress_lock = threading.Lock()
+            last_logged = [time.time()]
+            
+            def on_segment_progress(index, progress):
+                with progress_lock:
+                    encoded_time[index] = progress.out_time
+                    percent = min(sum(encoded_time.values()) / duration * 100, 100)
+                    self.update_progress(5 + percent * 0.9)
+                    if time.time() - last_logged[0] >= FFMPEG_PROGRESS_LOG_INTERVAL:
+                        self.update_status(f"{file_label}: 分段编码 {percent:.1f}%（{len(sources)} 段并行）")
+                        last_logged[0] = time.time()
+            
+            def encode(index, source, target, args):
+                # 音频单独编码，不计入视频进度
+                callback = (lambda progress: on_segment_progress(index, progress)) if index < len(sources) else (lambda progress: None)
+                self.run_ffmpeg_silently(
+                    source, target, output_format,
+                    extra_args=args + thread_args, input_args=thread_args, on_progress=callback
+                )
+            
+            self.update_status(f"正在分段并行编码: {file_label}（{len(sources)} 段）")
+            self.segment_control = BatchControl()
+            try:
+                with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+                    futures = [pool.submit(encode, index, *job) for index, job in enumerate(jobs)]
+                    try:
+                        for future in as_completed(futures):
+                            future.result()
+                    except BaseException:
+                        # 一段失败后其余各段的结果已无用，终止它们的ffmpeg，不等编码完成
+                        for future in futures:
+                            future.cancel()
+                        self.segment_control.cancel(kill=True)
+                        raise
+            finally:
+                self.segment_control = None
+            self.update_progress(95)
+            
+            # 3. concat拼接各段（不重新编码）并封装音频
+            list_file = os.path.join(work_dir, "segments.txt")
+            with open(list_file, "w", encoding="utf-8") as f:
+                for segment in segments:
+                    f.write(f"file '{os.path.basename(segment)}'\n")
+            mux_args = ["-map", "0:v:0"]
+            if audio_file:
+                mux_args = ["-i", audio_file] + mux_args + ["-map", "1:a:0"]
+            mux_args += ["-c", "copy"]
+            if "-tag:v" in video_args:
+                mux_args += ["-tag:v", video_args[video_args.index("-tag:v") + 1]]
+            self.update_status(f"正在拼接分段: {file_label}")
+            self.run_ffmpeg_silently(
+                list_file, output_file, output_format,
+                extra_args=mux_args, input_args=["-f", "concat", "-safe", "0"], on_progress=lambda progress: None
+            )
+            
+            # 4. 校验时长和音视频同步
+            with self.stage("verify"):
+                self.verify_segmented_output(file_path, output_file, duration, has_audio)
+            self.report["segments"] = len(sources)
+            return output_file
+        except Exception:
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            raise
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    def verify_segmented_output(self, source_file, output_file, duration, has_audio):
+        """校验分段拼接结果: 总时长与源文件一致，音视频流的时长差与源文件相同"""
+        output_duration = probe_media(self.ffmpeg_path, output_file)["duration"]
+        if output_duration is None or abs(output_duration - duration) > SEGMENT_DURATION_TOLERANCE:
+            raise Exception(f"拼接后时长不一致: 源文件 {duration:.2f} 秒，输出 {output_duration} 秒")
+        
+        source_video = measure_stream_duration(self.ffmpeg_path, source_file, "v:0")
+        output_video = measure_stream_duration(self.ffmpeg_path, output_file, "v:0")
+        if source_video is None or output_video is None or abs(output_video - source_video) > SEGMENT_DURATION_TOLERANCE:
+            raise Exception(f"拼接后视频流时长不一致: 源文件 {source_video} 秒，输出 {output_video} 秒")
+        if not has_audio:
+            return
+        
+        source_audio = measure_stream_duration(self.ffmpeg_path, source_file, "a:0")
+        output_audio = measure_stream_duration(self.ffmpeg_path, output_file, "a:0")
+        if source_audio is None or output_audio is None:
+            raise Exception("无法测量音频流时长")
+        drift = (output_video - output_audio) - (source_video - source_audio)
+        if abs(drift) > SEGMENT_SYNC_TOLERANCE:
+            raise Exception(f"拼接后音视频不同步: 偏差 {drift:+.3f} 秒")
+    
+    def animation_convert(self, img, output_file, output_format):
+        """GIF、WebP、APNG动画之间的转换，逐帧解码和编码，内存占用与帧数无关"""
+        frame_count = img.n_frames
+        loop = img.info.get("loop")  # GIF没有循环扩展块时只播放一次
+        quality = self.options["image_quality"]
+        self.update_status(f"正在逐帧转换动画: {self.display_name(output_file)}（{frame_count} 帧）")
+        
+        def on_frame(index):
+            self.update_progress(40 + 55 * (index + 1) / frame_count)
+        
+        if output_format == "WEBP":
+            # Pillow的WebP编码器本身逐帧读取源图像，只需预先取得各帧时长
+            durations = animation_durations(img)
+            self.update_progress(60)
+            img.save(output_file, "WEBP", save_all=True, duration=durations,
+                     loop=1 if loop is None else loop, quality=quality)
+        elif output_format == "GIF":
+            with open(output_file, "wb") as f:
+                write_gif_stream(f, iter_animation_frames(img), loop=loop, on_frame=on_frame)
+        else:
+            # APNG的循环次数0表示无限循环
+            mode = "RGBA" if img.has_transparency_data else "RGB"
+            compress_level = 9 - int(quality / 11)  # 与PNG相同，将1-100转换为0-9
+            with open(output_file, "wb") as f:
+                write_apng_stream(f, iter_animation_frames(img, mode), frame_count,
+                                  loop=1 if loop is None else loop, compress_level=compress_level, on_frame=on_frame)
+    
+    def image_convert(self, file_path):
+        """图片格式转换，包含ICO转换和JPG转换修复"""
+        try:
+            # 按需导入Pillow，未安装时给出安装提示
+            Image = load_backend("pillow")
+            
+            self.update_status(f"开始图片格式转换: {os.path.basename(file_path)}")
+            self.update_progress(20)
+            
+            file_name = os.path.splitext(os.path.basename(file_path))[0]
+            output_format = self.options["target_format"].upper()
+            output_file = self.output_path(file_name, output_format.lower())
+            
+            self.update_status(f"正在转换为{output_format}: {os.path.basename(file_path)}")
+            self.update_progress(40)
+            
+            # 打开图片
+            try:
+                # 打开文件并解析文件头计为读取；像素数据在解码时才按需从文件读取（可先draft/reduce），不整个读入内存
+                with self.stage("read"):
+                    img = Image.open(file_path)
+                with img:
+                    save_format = PILLOW_SAVE_FORMATS.get(output_format, output_format)
+                    max_dimension = int(self.options.get("max_dimension") or 0)
+                    
+                    # 动画在GIF、WebP、APNG之间逐帧转换（逐帧解码和编码交替进行，整体计为编码）
+                    if output_format in ANIMATION_FORMATS and getattr(img, "is_animated", False):
+                        with self.stage("encode"):
+                            self.animation_convert(img, output_file, output_format)
+                    
+                    # 处理ICO格式
+                    elif output_format == "ICO":
+                        # 获取用户选择的尺寸
+                        selected_sizes = self.options["ico_sizes"]
+                        if not selected_sizes:
+                            raise Exception("请至少选择一个ICO图标尺寸")
+                        
+                        # 先缩小到能覆盖最大图标尺寸的中间图，各尺寸再从中间图生成
+                        largest = max(max(size) for size in selected_sizes)
+                        img = load_image_scaled(Image, img, image_target_size(img.size, min_side=largest), self.stage)
+                        with self.stage("decode"):
+                            img.load()
+                        if img.mode == "CMYK":
+                            with self.stage("transform"):
+                                img = img.convert("RGB")
+                            
+                        # 保存多尺寸ICO
+                        buffer = io.BytesIO()
+                        with self.stage("encode"):
+                            img.save(buffer, "ICO", sizes=selected_sizes)
+                        self.write_output(output_file, buffer)
+                    
+                    else:
+                        # 按最大尺寸缩小（动画保持原样）
+                        if max_dimension and not getattr(img, "is_animated", False):
+                            img = load_image_scaled(Image, img, image_target_size(img.size, max_dimension=max_dimension), self.stage)
+                        with self.stage("decode"):
+                            img.load()
+                        
+                        with self.stage("transform"):
+                            # 处理透明通道问题（针对JPG等不支持透明的格式）
+                            if output_format in ["JPG", "JPEG", "BMP"] and img.mode in ["RGBA", "LA", "P"]:
+                                # 对于带透明通道的图片，创建白色背景
+                                if img.mode == "P":
+                                    # 处理调色板图像
+                                    img = img.convert("RGBA")
+                                    
+                                background = Image.new("RGB", img.size, (255, 255, 255))
+                                # 处理alpha通道
+                                background.paste(img, mask=img.split()[-1])
+                                img = background
+                            elif img.mode in ["CMYK"] and output_format not in ["TIFF"]:
+                                # 只有JPG和TIFF能保存CMYK，其他格式先转为RGB
+                                img = img.convert('RGB')
+                            
+                            # JPG确保是RGB模式
+                            if output_format in ["JPG", "JPEG"] and img.mode != 'RGB':
+                                img = img.convert('RGB')
+                    
+                        # 获取用户设置的质量值
+                        quality = self.options["image_quality"]
+                        
+                        # 编码到内存，再写入输出文件，编码和写入的耗时分开统计
+                        buffer = io.BytesIO()
+                        with self.stage("encode"):
+                            if output_format in ["JPG", "JPEG"]:
+                                img.save(buffer, save_format, quality=quality, optimize=True, progressive=True)
+                            elif output_format == "PNG":
+                                # PNG格式使用压缩级别参数
+                                compress_level = 9 - int(quality / 11)  # 将1-100转换为0-9
+                                img.save(buffer, save_format, compress_level=compress_level)
+                            else:
+                                img.save(buffer, save_format)
+                        self.write_output(output_file, buffer)
+            
+            except Exception as e:
+                raise Exception(f"图片处理错误: {str(e)}")
+            
+            self.update_progress(100)
+            return output_file
+            
+        except Exception as e:
+            raise Exception(f"图片转换失败: {str(e)}")
+
+def _run_conversion_job(conv_type, file_path, output_dir, options, ffmpeg_path, progress=None, status=None, control=None):
+    """执行单个转换任务（模块级函数，可被进程池pickle）
+
+    返回 {"output": 输出文件路径, "elapsed": 转换耗时（秒）, "timing": 各阶段耗时, ...转换过程的附加信息}，
+    失败时抛出的异常同样带有timing属性
+    """
+    started = time.time()
+    core = ConversionCore(output_dir, options, ffmpeg_path, status_callback=status, progress_callback=progress, control=control)
+    try:
+        output_file = core.convert(conv_type, file_path)
+    except Exception as e:
+        e.timing = core.timing_report(started)
+        raise
+    return dict(core.report, output=output_file, elapsed=time.time() - started, timing=core.timing_report(started))
+
+def default_worker_count():
+    """默认并行任务数（CPU核心数）"""
+    return max(1, os.cpu_count() or 1)
+
+# 各转换类型在批量执行器中使用的执行通道
+# process: CPU密集型任务（Pillow/pdf2docx），进入进程池
+# subprocess: ffmpeg任务，进入有界线程池，每个线程驱动一个ffmpeg子进程
+# serial: Office COM任务，COM对象不能跨线程共享，在单独线程中依次执行
+CONVERSION_LANES = {
+    "pdf_to_word": "process",
+    "image_convert": "process",
+    "audio_convert": "subprocess",
+    "video_convert": "subprocess",
+    "word_to_pdf": "serial",
+    "excel_to_pdf": "serial",
+    "ppt_to_pdf": "serial",
+}
+
+class BatchJob:
+    """批量转换中的单个任务"""
+    def __init__(self, index, file_path, lane, func, args=(), kwargs=None):
+        self.index = index
+        self.file_path = file_path
+        self.lane = lane
+        # 任务函数需接受progress关键字参数；process通道的函数及参数必须可被pickle
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.queued = None  # 进入队列的时间，用于统计排队耗时（默认为批次开始的时间）
+
+_process_progress_queue = None  # 进程池工作进程中向主进程回报任务进度的队列
+
+def _init_progress_worker(progress_queue):
+    """进程池工作进程的初始化函数，保存回报进度的队列"""
+    global _process_progress_queue
+    _process_progress_queue = progress_queue
+    # 进度消息丢失无关紧要，工作进程退出时不等待队列中的消息发送完
+    progress_queue.cancel_join_thread()
+
+def _run_process_job(index, func, args, kwargs):
+    """在进程池中执行任务，进度每变化1%以上时放入队列，由主进程的BatchExecutor读取"""
+    last = [-1.0]
+    
+    def progress(value):
+        if value - last[0] >= 1 or value >= 100:
+            last[0] = value
+            _process_progress_queue.put((index, value))
+    
+    return func(*args, progress=progress, **kwargs)
+
+class BatchExecutor:
+    """并行批量转换执行器，任务结果按完成顺序回调"""
+    def __init__(self, max_workers=None):
+        self.max_workers = max(1, int(max_workers or default_worker_count()))
+        self._fractions = {}
+        self._lock = threading.Lock()
+        self.office_stats = {}  # 本批次Office实例池的统计（启动次数、文档数等）
+
+    def lane_workers(self, lane, count):
+        """某个通道处理count个任务时最多的并行数（各通道同时运行时共用max_workers个名额）"""
+        if lane == "serial" or self.max_workers == 1:
+            return 1
+        return max(1, min(self.max_workers, count))
+
+    def _overall_progress(self):
+        """根据各任务的完成比例计算总体进度（0-100）"""
+        with self._lock:
+            if not self._fractions:
+                return 100.0
+            return sum(self._fractions.values()) / len(self._fractions) * 100
+
+    def _set_fraction(self, job, value):
+        with self._lock:
+            self._fractions[job.index] = min(max(value / 100.0, 0.0), 1.0)
+
+    def _drain_process_progress(self, progress_queue, finished):
+        """读取进程池中的任务回报的进度；已经结束的任务的延迟消息忽略"""
+        while True:
+            try:
+                index, value = progress_queue.get_nowait()
+            except (queue.Empty, OSError, ValueError):
+                return
+            if index not in finished:
+                with self._lock:
+                    self._fractions[index] = min(max(value / 100.0, 0.0), 1.0)
+
+    def run(self, jobs, on_result, on_progress=None, control=None):
+        """执行所有任务
+
+        on_result(job, result, error) 在每个任务结束时按完成顺序调用（result为任务函数的返回值），
+        on_progress(value) 报告总体进度。回调都在调用run的线程中执行。
+        control为BatchControl时可以暂停和取消：暂停期间不再开始新任务，取消后尚未开始的任务
+        以ConversionCancelled结束；线程中的任务收到control，可挂起或终止自己的子进程，
+        进程池中已经开始的任务（单个图片、PDF）等待完成。
+        各通道同时运行时共用max_workers个名额，同时转换的任务数不超过max_workers
+        """
+        jobs = list(jobs)
+        if not jobs:
+            return
+        queued = time.time()
+        for job in jobs:
+            job.queued = job.queued or queued
+        
+        def call(job, **kwargs):
+            """在当前线程中执行任务，开始前检查暂停和取消"""
+            if control:
+                if not control.wait_if_paused():
+                    raise ConversionCancelled("已取消")
+                kwargs["control"] = control
+            try:
+                return job.func(*job.args, **kwargs, **job.kwargs)
+            except Exception:
+                # 子进程被终止等原因导致的错误，取消后统一视为已取消
+                if control and control.cancelled:
+                    raise ConversionCancelled("已取消")
+                raise
+
+        with self._lock:
+            self._fractions = {job.index: 0.0 for job in jobs}
+
+        def job_progress(job):
+            def progress(value):
+                self._set_fraction(job, value)
+                if on_progress and self.max_workers == 1:
+                    on_progress(self._overall_progress())
+            return progress
+
+        # 单任务模式：在当前线程中依次执行，与原有行为一致
+        if self.max_workers == 1:
+            try:
+                for job in jobs:
+                    try:
+                        result, error = call(job, progress=job_progress(job)), None
+                    except Exception as e:
+                        result, error = None, e
+                    self._set_fraction(job, 100)
+                    on_result(job, result, error)
+                    if on_progress:
+                        on_progress(self._overall_progress())
+            finally:
+                # 批次结束时退出本线程启动的Office实例
+                self.office_stats = release_office_pools()
+            return
+
+        results = queue.Queue()
+        slots = threading.Semaphore(self.max_workers)  # 各通道共用的并行名额
+        process_jobs = [job for job in jobs if job.lane == "process"]
+        subprocess_jobs = [job for job in jobs if job.lane == "subprocess"]
+        serial_jobs = [job for job in jobs if job.lane == "serial"]
+
+        process_pool = None
+        progress_queue = None
+        finished = set()  # 已经回调on_result的任务
+        thread_pool = None
+        serial_thread = None
+        feed_thread = None
+        stopped = threading.Event()
+
+        def acquire_slot():
+            """等待空闲的并行名额，批次结束时返回False"""
+            while not slots.acquire(timeout=0.5):
+                if stopped.is_set():
+                    return False
+            return True
+
+        def call_with_slot(job, **kwargs):
+            if not acquire_slot():
+                raise ConversionCancelled("已取消")
+            try:
+                return call(job, **kwargs)
+            finally:
+                slots.release()
+
+        def collect(job, release=False):
+            def done(future):
+                if release:
+                    slots.release()
+                error = future.exception()
+                results.put((job, None if error else future.result(), error))
+            return done
+        
+        def feed_processes():
+            """逐个向进程池提交任务，每个任务占用一个并行名额，暂停和取消因此能及时生效"""
+            for job in process_jobs:
+                if not acquire_slot():
+                    return
+                if stopped.is_set():
+                    slots.release()
+                    return
+                if control and not control.wait_if_paused():
+                    slots.release()
+                    results.put((job, None, ConversionCancelled("已取消")))
+                    continue
+                future = process_pool.submit(_run_process_job, job.index, job.func, job.args, job.kwargs)
+                future.add_done_callback(collect(job, release=True))
+
+        def run_serial():
+            try:
+                for job in serial_jobs:
+                    try:
+                        results.put((job, call_with_slot(job, progress=job_progress(job)), None))
+                    except Exception as e:
+                        results.put((job, None, e))
+            finally:
+                # Office实例在本线程中创建，也必须在本线程中退出
+                self.office_stats = release_office_pools()
+
+        try:
+            if process_jobs:
+                process_workers = self.lane_workers("process", len(process_jobs))
+                # 工作进程通过队列回报进度，长时间的图片、PDF任务期间进度条也会前进
+                progress_queue = multiprocessing.Queue()
+                process_pool = ProcessPoolExecutor(max_workers=process_workers, initializer=_init_progress_worker, initargs=(progress_queue,))
+                if subprocess_jobs or serial_jobs:
+                    # 以fork方式启动的工作进程会继承其他通道此时正在创建的子进程的管道，使其Popen一直等待；
+                    # 第一次提交时进程池一次启动全部工作进程，因此先在当前线程中提交一个空任务，再开始其他通道
+                    process_pool.submit(os.getpid)
+                feed_thread = threading.Thread(target=feed_processes)
+                feed_thread.daemon = True
+                feed_thread.start()
+
+            if subprocess_jobs:
+                thread_pool = ThreadPoolExecutor(max_workers=self.lane_workers("subprocess", len(subprocess_jobs)))
+                for job in subprocess_jobs:
+                    future = thread_pool.submit(call_with_slot, job, progress=job_progress(job))
+                    future.add_done_callback(collect(job))
+
+            if serial_jobs:
+                serial_thread = threading.Thread(target=run_serial)
+                serial_thread.daemon = True
+                serial_thread.start()
+
+            # 按完成顺序处理结果，等待期间定期刷新总体进度
+            remaining = len(jobs)
+            while remaining:
+                try:
+                    job, result, error = results.get(timeout=0.5)
+                except queue.Empty:
+                    if progress_queue:
+                        self._drain_process_progress(progress_queue, finished)
+                    if on_progress:
+                        on_progress(self._overall_progress())
+                    continue
+                remaining -= 1
+                if progress_queue:
+                    self._drain_process_progress(progress_queue, finished)
+                finished.add(job.index)
+                self._set_fraction(job, 100)
+                on_result(job, result, error)
+                if on_progress:
+                    on_progress(self._overall_progress())
+        finally:
+            stopped.set()
+            if feed_thread:
+                feed_thread.join()
+            if process_pool:
+                process_pool.shutdown(wait=True)
+            if progress_queue:
+                progress_queue.close()
+            if thread_pool:
+                thread_pool.shutdown(wait=True)
+            if serial_thread:
+                serial_thread.join()
+
+# 调度：按预计耗时安排任务的开始顺序，使整批完成时间接近 总工作量 / 并行任务数
+COST_MODEL_FILE = "cost-model.json"
+COST_MODEL_DECAY = 0.98  # 每次记录时旧样本的权重衰减，模型主要反映最近约50个任务
+COST_ESTIMATE_THREADS = 8  # 测量工作量（读取图片尺寸、探测时长、PDF页数）的线程数
+COST_PROBE_LIMIT = 2000  # 超过此数量的音视频文件不再逐个探测时长，按文件大小估算
+FAST_LANE_MIN_WORKERS = 3  # 并行任务数达到此值时留出一个快速通道优先处理小任务
+FAST_LANE_MAX_SECONDS = 5.0  # 预计耗时不超过此秒数的任务视为小任务
+
+# 各转换类型的工作量单位，以及没有历史数据时的耗时估计：(固定开销秒数, 每单位秒数)
+COST_UNITS = {
+    "image_convert": "百万像素",
+    "audio_convert": "秒",
+    "video_convert": "秒",
+    "pdf_to_word": "页",
+    "word_to_pdf": "MB",
+    "excel_to_pdf": "MB",
+    "ppt_to_pdf": "MB",
+}
+COST_PRIORS = {
+    "image_convert": (0.05, 0.08),
+    "audio_convert": (0.1, 0.01),
+    "video_convert": (0.3, 0.5),
+    "pdf_to_word": (0.5, 0.3),
+    "word_to_pdf": (1.0, 0.5),
+    "excel_to_pdf": (1.0, 0.5),
+    "ppt_to_pdf": (1.5, 0.5),
+}
+# 无法探测时长时按文件大小估算（秒/MB）：音频约128kbps，视频约4Mbps
+MEDIA_SECONDS_PER_MB = {"audio_convert": 60.0, "video_convert": 2.0}
+
+def measure_job_units(conv_type, file_path, ffmpeg_path=None, probe=True):
+    """测量单个文件的工作量（单位见COST_UNITS），只读取文件头，不解码内容"""
+    size_mb = os.path.getsize(file_path) / (1024 * 1024)
+    try:
+        if conv_type == "image_convert" and backend_available("pillow"):
+            with load_backend("pillow").open(file_path) as img:
+                return img.size[0] * img.size[1] / 1e6 * getattr(img, "n_frames", 1)
+        if conv_type in MEDIA_SECONDS_PER_MB:
+            if probe and ffmpeg_path:
+                duration = probe_media(ffmpeg_path, file_path)["duration"]
+                if duration:
+                    return duration
+            return size_mb * MEDIA_SECONDS_PER_MB[conv_type]
+        if conv_type == "pdf_to_word" and importlib.util.find_spec("fitz"):
+            document = importlib.import_module("fitz").open(file_path)
+            try:
+                return len(document)
+            finally:
+                document.close()
+    except Exception:
+        pass  # 读取失败的文件交给转换步骤报错，按文件大小估计
+    return size_mb
+
+class CostModel:
+    """各转换类型的耗时模型：耗时 ≈ 固定开销 + 系数 × 工作量
+
+    按转换类型和影响结果的选项（例如直接封装与重新编码）分别记录，用衰减的最小二乘拟合，
+    新数据逐渐取代旧数据；没有历史数据时使用COST_PRIORS。保存在缓存目录的JSON文件中
+    """
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_cache_dir(), COST_MODEL_FILE)
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.samples = json.load(f)  # 键 -> [n, Σx, Σy, Σx², Σxy]
+        except (OSError, ValueError):
+            self.samples = {}
+    
+    @staticmethod
+    def keys(conv_type, options):
+        return [f"{conv_type}:{ConversionManifest.options_key(conv_type, options)}", conv_type]
+    
+    def coefficients(self, conv_type, options):
+        """返回 (固定开销, 每单位秒数)，优先使用相同选项的历史数据"""
+        for key in self.keys(conv_type, options):
+            sums = self.samples.get(key)
+            if not sums or sums[0] < 1:
+                continue
+            n, sx, sy, sxx, sxy = sums
+            variance = n * sxx - sx * sx
+            if n >= 3 and variance > 1e-9 * max(n * sxx, 1):
+                slope = (n * sxy - sx * sy) / variance
+                intercept = (sy - slope * sx) / n
+                if slope >= 0 and intercept >= 0:
+                    return intercept, slope
+            # 样本太少或工作量都差不多时按比例估计
+            if sxx > 0:
+                return 0.0, max(sxy / sxx, 0.0)
+            return sy / n, 0.0
+        return COST_PRIORS.get(conv_type, (1.0, 0.1))
+    
+    def estimate(self, conv_type, options, units):
+        intercept, slope = self.coefficients(conv_type, options)
+        return intercept + slope * units
+    
+    def observe(self, conv_type, options, units, seconds):
+        """记录一个已完成任务的实际耗时"""
+        for key in self.keys(conv_type, options):
+            sums = [value * COST_MODEL_DECAY for value in self.samples.get(key, [0, 0, 0, 0, 0])]
+            for index, value in enumerate((1, units, seconds, units * units, units * seconds)):
+                sums[index] += value
+            self.samples[key] = sums
+    
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.samples, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+def plan_schedule(costs, workers):
+    """按预计耗时安排开始顺序，返回 (下标顺序, 预计完成时间)
+
+    模拟列表调度：空闲的执行者取剩余最长的任务（LPT），并行任务数较多时0号执行者作为快速通道，
+    优先取剩余最短的小任务，没有小任务时同样取最长的任务。执行器按顺序先进先出地开始任务，
+    预计准确时实际执行与模拟一致；单个执行者时按从短到长排列，先完成的文件尽早可用
+    """
+    import heapq
+    order = sorted(range(len(costs)), key=lambda index: costs[index], reverse=True)
+    workers = max(1, min(workers, len(costs)))
+    if workers == 1:
+        return order[::-1], sum(costs)
+    fast_lane = workers >= FAST_LANE_MIN_WORKERS
+    remaining = collections.deque(order)
+    free_at = [(0.0, worker) for worker in range(workers)]
+    planned = []
+    finish = 0.0
+    while remaining:
+        start, worker = heapq.heappop(free_at)
+        if worker == 0 and fast_lane and costs[remaining[-1]] <= FAST_LANE_MAX_SECONDS:
+            index = remaining.pop()
+        else:
+            index = remaining.popleft()
+        planned.append(index)
+        finish = max(finish, start + costs[index])
+        heapq.heappush(free_at, (start + costs[index], worker))
+    return planned, finish
+
+class BatchSchedule:
+    """一批任务的调度结果：开始顺序、每个文件的工作量和预计耗时
+
+    tasks为 [(转换类型, 源文件, 选项), ...]；混合类型的批次中各执行通道同时运行，分别安排各通道内的顺序
+    """
+    def __init__(self, tasks, executor, ffmpeg_path=None, model=None):
+        self.model = model or CostModel()
+        self.workers = executor.max_workers
+        probe = len(tasks) <= COST_PROBE_LIMIT
+        with ThreadPoolExecutor(max_workers=COST_ESTIMATE_THREADS) as pool:
+            units = list(pool.map(lambda task: measure_job_units(task[0], task[1], ffmpeg_path, probe), tasks))
+        self.tasks = {file_path: (conv_type, options, value) for (conv_type, file_path, options), value in zip(tasks, units)}
+        self.costs = {file_path: self.model.estimate(conv_type, options, value) for file_path, (conv_type, options, value) in self.tasks.items()}
+        lanes = {}
+        for conv_type, file_path, options in tasks:
+            lanes.setdefault(CONVERSION_LANES[conv_type], []).append(file_path)
+        self.file_paths = []
+        self.makespan = 0.0
+        self.lower_bound = 0.0
+        for lane, file_paths in lanes.items():
+            workers = executor.lane_workers(lane, len(file_paths))
+            costs = [self.costs[path] for path in file_paths]
+            order, makespan = plan_schedule(costs, workers)
+            self.file_paths.extend(file_paths[index] for index in order)
+            # 各通道同时运行，完成时间及其下限（总工作量平均分给各执行者，或最长的单个任务）取最慢的通道
+            self.makespan = max(self.makespan, makespan)
+            self.lower_bound = max(self.lower_bound, sum(costs) / workers, max(costs))
+        self.work = sum(self.costs.values())
+        # 各通道共用并行名额，整批不会快于总工作量平均分给全部并行任务
+        if self.work:
+            self.lower_bound = max(self.lower_bound, self.work / self.workers)
+            self.makespan = max(self.makespan, self.lower_bound)
+    
+    def observe(self, file_path, result):
+        """用已完成任务的实际耗时更新耗时模型"""
+        if file_path in self.tasks and result and result.get("elapsed") is not None:
+            conv_type, options, units = self.tasks[file_path]
+            self.model.observe(conv_type, options, units, result["elapsed"])
+    
+    def save(self):
+        try:
+            self.model.save()
+        except OSError:
+            pass  # 耗时模型只用于安排顺序，保存失败不影响转换结果
+    
+    def describe(self):
+        return (f"调度：最长任务优先，预计用时 {self.makespan:.1f} 秒"
+                f"（总工作量 {self.work:.1f} 秒，{self.workers} 个并行任务的下限 {self.lower_bound:.1f} 秒）")
+
+# 转换耗时指标：每个任务各阶段的耗时，导出为JSON Lines日志、Prometheus文本和Chrome trace
+STAGE_NAMES = {
+    "queue": "排队",
+    "read": "读取",
+    "probe": "探测",
+    "decode": "解码",
+    "transform": "处理",
+    "spawn": "启动进程",
+    "launch": "启动Office",
+    "encode": "编码",
+    "write": "写入",
+    "verify": "校验",
+}
+METRICS_DURATION_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 1800]  # 任务耗时直方图的分桶（秒）
+METRICS_WRITE_INTERVAL = 5  # Prometheus文件最多每隔多少秒重写一次
+TRACE_MAX_EVENTS = 500000  # Chrome trace最多保留的事件数，长时间运行时超出部分丢弃
+
+class ConversionMetrics:
+    """收集每个转换任务、每个阶段的耗时（线程安全）
+
+    record() 接收 _run_conversion_job 的结果（或带有timing属性的异常），
+    log_path 追加JSON Lines日志，每个任务一行；prometheus_path 定期重写Prometheus文本格式的指标；
+    trace_path 在close()时写出Chrome trace事件文件，可在 chrome://tracing 或 Perfetto 中查看并发和停顿。
+    gauges 为返回 {指标名: (说明, 值)} 的函数，其值一并导出（例如监视模式的积压数）
+    """
+    def __init__(self, log_path=None, prometheus_path=None, trace_path=None, gauges=None):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.prometheus_path = prometheus_path
+        self.trace_path = trace_path
+        self.gauges = gauges
+        self.log_file = open(log_path, "a", encoding="utf-8") if log_path else None
+        self.jobs = collections.Counter()  # (转换类型, 状态) -> 任务数
+        self.durations = {}  # 转换类型 -> [各分桶计数, 总耗时, 任务数]
+        self.stage_seconds = collections.Counter()  # (转换类型, 阶段) -> 累计秒数
+        self.input_bytes = collections.Counter()
+        self.output_bytes = collections.Counter()
+        self.trace_events = []
+        self.dropped_events = 0
+        self.last_written = 0
+    
+    def record(self, conv_type, source, result, error, queued=None):
+        """记录一个已结束的任务；queued为任务进入队列的时间，用于计算排队耗时"""
+        timing = (result or {}).get("timing") or getattr(error, "timing", None) or {}
+        status = "ok" if error is None else "cancelled" if isinstance(error, ConversionCancelled) else "failed"
+        stages = dict(timing.get("stages", {}))
+        started = timing.get("started")
+        if queued is not None and started:
+            stages["queue"] = max(0.0, started - queued)
+        elapsed = (result or {}).get("elapsed")
+        if elapsed is None and started:
+            elapsed = timing.get("finished", started) - started
+        try:
+            input_bytes = os.path.getsize(source)
+        except OSError:
+            input_bytes = 0
+        output = (result or {}).get("output")
+        try:
+            output_bytes = os.path.getsize(output) if output else 0
+        except OSError:
+            output_bytes = 0
+        
+        with self.lock:
+            self.jobs[(conv_type, status)] += 1
+            if elapsed is not None:
+                buckets, total, count = self.durations.get(conv_type) or ([0] * len(METRICS_DURATION_BUCKETS), 0.0, 0)
+                for index, bound in enumerate(METRICS_DURATION_BUCKETS):
+                    if elapsed <= bound:
+                        buckets[index] += 1
+                self.durations[conv_type] = (buckets, total + elapsed, count + 1)
+            for stage, seconds in stages.items():
+                self.stage_seconds[(conv_type, stage)] += seconds
+            self.input_bytes[conv_type] += input_bytes
+            self.output_bytes[conv_type] += output_bytes
+            
+            if self.log_file:
+                self.log_file.write(json.dumps({
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "source": source,
+                    "conversion_type": conv_type,
+                    "status": status,
+                    "error": None if error is None else str(error),
+                    "output": output,
+                    "method": (result or {}).get("method"),
+                    "elapsed": None if elapsed is None else round(elapsed, 4),
+                    "stages": {stage: round(seconds, 4) for stage, seconds in stages.items()},
+                    "input_bytes": input_bytes,
+                    "output_bytes": output_bytes,
+                    "pid": timing.get("pid"),
+                    "thread": timing.get("thread"),
+                }, ensure_ascii=False) + "\n")
+                self.log_file.flush()
+            
+            if self.trace_path and started:
+                self._add_trace(conv_type, source, status, timing, elapsed)
+        
+        self.maybe_write_prometheus()
+    
+    def _add_trace(self, conv_type, source, status, timing, elapsed):
+        """任务本身和各阶段都记为完整事件（ph=X），同一线程中的阶段嵌套在任务之下"""
+        pid = timing.get("pid", 0)
+        events = [{
+            "name": os.path.basename(source), "cat": conv_type, "ph": "X",
+            "ts": (timing["started"] - self.started) * 1e6, "dur": (elapsed or 0) * 1e6,
+            "pid": pid, "tid": timing.get("thread", 0), "args": {"source": source, "status": status},
+        }]
+        for stage, start, end, thread in timing.get("spans", []):
+            events.append({
+                "name": STAGE_NAMES.get(stage, stage), "cat": stage, "ph": "X",
+                "ts": (start - self.started) * 1e6, "dur": (end - start) * 1e6,
+                "pid": pid, "tid": thread,
+            })
+        room = TRACE_MAX_EVENTS - len(self.trace_events)
+        self.trace_events.extend(events[:max(room, 0)])
+        self.dropped_events += max(len(events) - max(room, 0), 0)
+    
+    def totals(self):
+        """各阶段在所有任务中的累计耗时（秒）"""
+        with self.lock:
+            totals = collections.Counter()
+            for (conv_type, stage), seconds in self.stage_seconds.items():
+                totals[stage] += seconds
+            return dict(totals)
+    
+    def describe(self):
+        """各阶段累计耗时的文字描述，并行执行的部分分别计入"""
+        totals = self.totals()
+        parts = [f"{STAGE_NAMES[stage]} {totals[stage]:.1f} 秒" for stage in STAGE_NAMES if totals.get(stage, 0) >= 0.05]
+        return "各阶段累计耗时：" + ("，".join(parts) if parts else "无")
+    
+    def prometheus_text(self):
+        """Prometheus文本格式的指标"""
+        lines = []
+        
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP format_converter_{name} {help_text}")
+            lines.append(f"# TYPE format_converter_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{value_text}"' for key, value_text in labels)
+                lines.append(f"format_converter_{name}{{{label_text}}} {value}" if label_text else f"format_converter_{name} {value}")
+        
+        with self.lock:
+            metric("jobs_total", "counter", "Finished conversion jobs",
+                   [((("type", conv_type), ("status", status)), count) for (conv_type, status), count in sorted(self.jobs.items())])
+            metric("job_duration_seconds", "histogram", "Conversion job duration", [])
+            for conv_type, (buckets, total, count) in sorted(self.durations.items()):
+                for bound, bucket in zip(METRICS_DURATION_BUCKETS + ["+Inf"], buckets + [count]):
+                    lines.append(f'format_converter_job_duration_seconds_bucket{{type="{conv_type}",le="{bound}"}} {bucket}')
+                lines.append(f'format_converter_job_duration_seconds_sum{{type="{conv_type}"}} {total:.6f}')
+                lines.append(f'format_converter_job_duration_seconds_count{{type="{conv_type}"}} {count}')
+            metric("stage_seconds_total", "counter", "Time spent per conversion stage",
+                   [((("type", conv_type), ("stage", stage)), f"{seconds:.6f}") for (conv_type, stage), seconds in sorted(self.stage_seconds.items())])
+            metric("input_bytes_total", "counter", "Bytes read from source files",
+                   [((("type", conv_type),), value) for conv_type, value in sorted(self.input_bytes.items())])
+            metric("output_bytes_total", "counter", "Bytes written to output files",
+                   [((("type", conv_type),), value) for conv_type, value in sorted(self.output_bytes.items())])
+        for name, (help_text, value) in (self.gauges() if self.gauges else {}).items():
+            metric(name, "gauge", help_text, [((), value)])
+        return "\n".join(lines) + "\n"
+    
+    def maybe_write_prometheus(self, force=False):
+        """重写Prometheus指标文件（先写临时文件再改名，读取方不会读到写了一半的文件）"""
+        if not self.prometheus_path:
+            return
+        now = time.time()
+        if not force and now - self.last_written < METRICS_WRITE_INTERVAL:
+            return
+        self.last_written = now
+        temp_path = self.prometheus_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, self.prometheus_path)
+    
+    def close(self):
+        """写出最终的Prometheus指标和Chrome trace，关闭日志"""
+        self.maybe_write_prometheus(force=True)
+        if self.trace_path:
+            with self.lock:
+                pids = sorted({event["pid"] for event in self.trace_events})
+                metadata = [{
+                    "name": "process_name", "ph": "M", "pid": pid,
+                    "args": {"name": "全能格式转换器" if pid == os.getpid() else f"转换进程 {pid}"},
+                } for pid in pids]
+                with open(self.trace_path, "w", encoding="utf-8") as f:
+                    json.dump({"traceEvents": metadata + self.trace_events, "displayTimeUnit": "ms",
+                               "otherData": {"dropped_events": self.dropped_events}}, f, ensure_ascii=False)
+        if self.log_file:
+            self.log_file.close()
+            self.log_file = None
+
+def serve_metrics(port, metrics, host="127.0.0.1"):
+    """在后台线程中提供 /metrics HTTP接口（Prometheus抓取用），返回服务器对象，调用shutdown()停止"""
+    import http.server
+    
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            pass  # 不把每次抓取写入日志
+    
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
 
-def extract_ffmpeg():
-    """从程序资源中提取ffmpeg到临时目录，支持PyInstaller打包的--add-data参数"""
-    try:
-        # 在临时目录创建一个子目录
-        temp_dir = tempfile.mkdtemp()
-        ffmpeg_path = os.path.join(temp_dir, "ffmpeg.exe")
-        
-        # 从程序资源中读取ffmpeg
-        if getattr(sys, 'frozen', False):
-            # 打包后的环境，处理PyInstaller --add-data的情况
-            if sys.platform.startswith('win'):
-                # Windows系统路径分隔符处理
-                base_path = sys._MEIPASS
-                source_path = os.path.join(base_path, "ffmpeg.exe")
-                
-                # 检查是否存在于MEIPASS目录
-                if os.path.exists(source_path):
-                    shutil.copy2(source_path, ffmpeg_path)
-                    return ffmpeg_path
+MANIFEST_FILE = "conversions.sqlite3"
+MANIFEST_HASH_LIMIT = 256 * 1024 * 1024  # 不超过此大小的源文件记录内容哈希，修改时间变化但内容相同时仍可跳过
+MANIFEST_COMMIT_EVERY = 200  # 每记录多少个文件提交一次
+
+# 影响输出结果的转换选项，转换记录按这些选项区分（线程数、并行方式等只影响速度，不参与比较）
+MANIFEST_OPTION_KEYS = {
+    "pdf_to_word": (),
+    "word_to_pdf": (),
+    "excel_to_pdf": ("excel_orientation", "excel_fit_to_page"),
+    "ppt_to_pdf": (),
+    "audio_convert": ("target_format", "stream_copy", "preset", "crf", "audio_bitrate", "sample_rate", "audio_codec"),
+    "video_convert": ("target_format", "stream_copy", "preset", "crf", "video_bitrate", "audio_bitrate", "sample_rate", "video_codec", "audio_codec"),
+    "image_convert": ("target_format", "image_quality", "max_dimension", "ico_sizes"),
+}
+
+class ConversionManifest:
+    """持久化的转换记录（SQLite），用于增量转换
+
+    每条记录对应 (源文件, 转换类型, 输出目录)，保存源文件的大小、修改时间、内容哈希、
+    转换选项和输出文件的大小、修改时间。源文件和选项都未变化、输出文件也未被改动时跳过转换。
+    SQLite连接不能跨线程使用，查询和记录需在同一线程中进行。
+    """
+    def __init__(self, path=None):
+        if path is None:
+            os.makedirs(get_cache_dir(), exist_ok=True)
+            path = os.path.join(get_cache_dir(), MANIFEST_FILE)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversions ("
+            "source TEXT NOT NULL, conversion_type TEXT NOT NULL, output_dir TEXT NOT NULL, "
+            "source_size INTEGER NOT NULL, source_mtime_ns INTEGER NOT NULL, source_hash TEXT, "
+            "options TEXT NOT NULL, output TEXT NOT NULL, output_size INTEGER NOT NULL, "
+            "output_mtime_ns INTEGER NOT NULL, method TEXT, converted_at REAL NOT NULL, "
+            "PRIMARY KEY (source, conversion_type, output_dir))"
+        )
+        self.conn.commit()
+        self.pending = 0
+    
+    @staticmethod
+    def options_key(conv_type, options):
+        """生成参与比较的转换选项（JSON字符串）"""
+        options = dict(DEFAULT_OPTIONS, **(options or {}))
+        keys = MANIFEST_OPTION_KEYS.get(conv_type, ())
+        values = {key: options.get(key) for key in keys}
+        if conv_type == "image_convert" and str(values.get("target_format")).lower() != "ico":
+            values.pop("ico_sizes", None)
+        return json.dumps(values, sort_keys=True, ensure_ascii=False)
+    
+    def lookup(self, conv_type, source, output_dir, options_key):
+        """源文件已有有效的转换结果时返回输出文件路径，否则返回None"""
+        source = os.path.abspath(source)
+        output_dir = os.path.abspath(output_dir)
+        row = self.conn.execute(
+            "SELECT source_size, source_mtime_ns, source_hash, options, output, output_size, output_mtime_ns "
+            "FROM conversions WHERE source = ? AND conversion_type = ? AND output_dir = ?",
+            (source, conv_type, output_dir)
+        ).fetchone()
+        if row is None:
+            return None
+        source_size, source_mtime_ns, source_hash, stored_options, output, output_size, output_mtime_ns = row
+        if stored_options != options_key:
+            return None
+        try:
+            source_stat = os.stat(source)
+            output_stat = os.stat(output)
+        except OSError:
+            return None
+        if source_stat.st_size != source_size:
+            return None
+        if output_stat.st_size != output_size or output_stat.st_mtime_ns != output_mtime_ns:
+            return None
+        if source_stat.st_mtime_ns != source_mtime_ns:
+            # 修改时间变了（例如重新同步或复制），内容哈希相同时仍视为未变化
+            if not source_hash or _file_sha256(source) != source_hash:
+                return None
+            self.conn.execute(
+                "UPDATE conversions SET source_mtime_ns = ? WHERE source = ? AND conversion_type = ? AND output_dir = ?",
+                (source_stat.st_mtime_ns, source, conv_type, output_dir)
+            )
+            self._mark_dirty()
+        return output
+    
+    def partition(self, conv_type, file_paths, output_dir, options):
+        """把文件分为需要转换的和可以跳过的，返回 (待转换文件列表, [(源文件, 已有输出文件), ...])"""
+        options_key = self.options_key(conv_type, options)
+        pending, skipped = [], []
+        for file_path in file_paths:
+            output = self.lookup(conv_type, file_path, output_dir, options_key)
+            if output is None:
+                pending.append(file_path)
+            else:
+                skipped.append((file_path, output))
+        return pending, skipped
+    
+    def record(self, conv_type, source, output_dir, options, output, method=None, source_hash=None):
+        """记录一次成功的转换（source_hash为已经算出的源文件哈希，可省去重复计算）"""
+        source = os.path.abspath(source)
+        output = os.path.abspath(output)
+        try:
+            source_stat = os.stat(source)
+            output_stat = os.stat(output)
+        except OSError:
+            return
+        if source_hash is None and source_stat.st_size <= MANIFEST_HASH_LIMIT:
+            source_hash = _file_sha256(source)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO conversions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (source, conv_type, os.path.abspath(output_dir), source_stat.st_size, source_stat.st_mtime_ns,
+             source_hash, self.options_key(conv_type, options), output, output_stat.st_size,
+             output_stat.st_mtime_ns, method, time.time())
+        )
+        self._mark_dirty()
+    
+    def _mark_dirty(self):
+        """累计一定数量的修改后提交，避免每个文件都写一次磁盘"""
+        self.pending += 1
+        if self.pending >= MANIFEST_COMMIT_EVERY:
+            self.conn.commit()
+            self.pending = 0
+    
+    def close(self):
+        """提交未保存的记录并关闭数据库"""
+        try:
+            self.conn.commit()
+        finally:
+            self.conn.close()
+
+JOURNAL_DIR = "journals"  # 缓存目录下保存批量转换日志的子目录
+PARTIAL_STALE_SECONDS = 3600  # 超过此时间未修改的临时输出文件视为中断后的残留
+
+class BatchJournal:
+    """批量转换日志，用于中断后继续
+
+    JSON Lines文件：第一行记录批次信息（转换类型、输出目录、选项和全部文件），之后每完成一个文件
+    追加一行并立即写入。批次正常结束后删除日志；被取消、窗口被关闭或程序崩溃时日志保留，
+    继续时只转换尚未完成的文件
+    """
+    def __init__(self, path, header, done):
+        self.path = path
+        self.header = header
+        self.done = done  # 已完成的源文件 -> 输出文件
+        self.file = None
+    
+    @staticmethod
+    def directory():
+        return os.path.join(get_cache_dir(), JOURNAL_DIR)
+    
+    @classmethod
+    def create(cls, conv_type, output_dir, options, file_paths, settings=None):
+        """创建新的日志，settings为批次的其他设置（是否增量转换、查重等）"""
+        os.makedirs(cls.directory(), exist_ok=True)
+        # 同一进程在同一秒内开始的批次（例如取消后立即重新开始）不能覆盖前一个未完成的日志
+        path = os.path.join(cls.directory(), f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{secrets.token_hex(4)}.jsonl")
+        header = {
+            "conversion_type": conv_type,
+            "output_dir": os.path.abspath(output_dir),
+            "options": options,
+            "settings": settings or {},
+            "files": [os.path.abspath(file_path) for file_path in file_paths],
+            "created": time.time(),
+        }
+        journal = cls(path, header, {})
+        journal.file = open(path, "x", encoding="utf-8")
+        journal.file.write(json.dumps(header, ensure_ascii=False) + "\n")
+        journal.file.flush()
+        return journal
+    
+    @classmethod
+    def load(cls, path):
+        """读取日志，最后一行写了一半（程序在写入时崩溃）时忽略该行"""
+        with open(path, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            done = {}
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                done[record["source"]] = record["output"]
+        # JSON中的元组变成了列表，恢复ICO尺寸的格式
+        if header["options"].get("ico_sizes"):
+            header["options"]["ico_sizes"] = [tuple(size) for size in header["options"]["ico_sizes"]]
+        journal = cls(path, header, done)
+        journal.file = open(path, "a", encoding="utf-8")
+        return journal
+    
+    @classmethod
+    def find_unfinished(cls):
+        """返回未完成的日志文件路径，最近的在前"""
+        paths = glob.glob(os.path.join(cls.directory(), "*.jsonl"))
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+    
+    @property
+    def files(self):
+        return self.header["files"]
+    
+    def pending_files(self):
+        """尚未完成的文件（记录为已完成但输出文件已不存在的也重新转换）"""
+        return [path for path in self.files if path not in self.done or not os.path.exists(self.done[path])]
+    
+    def describe(self):
+        header = self.header
+        created = time.strftime("%Y-%m-%d %H:%M", time.localtime(header["created"]))
+        return (f"{created} 开始的批量转换（{header['conversion_type']}，输出到 {header['output_dir']}）："
+                f"共 {len(self.files)} 个文件，已完成 {len(self.done)} 个")
+    
+    def mark_done(self, source, output):
+        source = os.path.abspath(source)
+        self.done[source] = output
+        self.file.write(json.dumps({"source": source, "output": output}, ensure_ascii=False) + "\n")
+        self.file.flush()
+    
+    def close(self):
+        """关闭日志文件并保留，之后可以继续"""
+        if self.file:
+            self.file.close()
+            self.file = None
+    
+    def finish(self):
+        """批次已全部处理，删除日志"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def remove_stale_partials(output_dir):
+    """删除输出目录中中断后残留的临时输出文件，返回删除的数量"""
+    removed = 0
+    for path in glob.glob(os.path.join(glob.escape(output_dir), f".*{PARTIAL_SUFFIX}.*")):
+        try:
+            if time.time() - os.path.getmtime(path) >= PARTIAL_STALE_SECONDS:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+class DuplicatePlan:
+    """按内容查找批量任务中重复的源文件，每份内容只转换一次
+
+    先按文件大小分组，只有大小相同的文件才流式计算SHA-256。同一批任务的转换选项相同，
+    内容相同的文件转换结果也相同，重复文件的输出用硬链接（不支持时复制）指向第一个文件的转换结果。
+    kinds为 {文件: 转换类型}，混合类型的批次中只有转换类型也相同的文件才视为重复
+    """
+    def __init__(self, file_paths, kinds=None):
+        self.unique = []  # 需要实际转换的文件
+        self.duplicates = {}  # 实际转换的文件 -> 内容与之相同的其他文件
+        self.hashes = {}  # 计算过哈希的文件 -> SHA-256
+        self.sizes = {}
+        self.created_outputs = set()  # 本批次已为重复文件生成的输出文件
+        self.hashed_bytes = 0
+        self.saved_files = 0
+        self.saved_bytes = 0
+        
+        sizes = {}
+        for file_path in file_paths:
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                size = None  # 读取失败的文件交给转换步骤报错
+            sizes[file_path] = size
+        self.sizes = sizes
+        size_counts = collections.Counter(size for size in sizes.values() if size is not None)
+        
+        first_by_hash = {}
+        for file_path in file_paths:
+            size = sizes[file_path]
+            if size is None or size_counts[size] < 2:
+                self.unique.append(file_path)
+                continue
+            try:
+                digest = _file_sha256(file_path)
+            except OSError:
+                self.unique.append(file_path)
+                continue
+            self.hashes[file_path] = digest
+            self.hashed_bytes += size
+            first = first_by_hash.setdefault((kinds.get(file_path) if kinds else None, digest), file_path)
+            if first == file_path:
+                self.unique.append(file_path)
+            else:
+                self.duplicates.setdefault(first, []).append(file_path)
+        # 实际转换的文件输出时使用的文件名（不含扩展名），重复文件的输出不能占用
+        self.planned_names = {os.path.normcase(os.path.splitext(os.path.basename(file_path))[0]) for file_path in self.unique}
+    
+    @property
+    def duplicate_count(self):
+        return sum(len(paths) for paths in self.duplicates.values())
+    
+    def materialize(self, source, output):
+        """为source的重复文件生成输出文件，返回 ([(重复文件, 输出文件), ...], [(重复文件, 错误信息), ...])
+
+        输出文件名取重复文件自己的文件名，扩展名与source的输出文件相同。与本批次中其他文件的输出重名时
+        不覆盖，该重复文件作为失败返回；source自己的转换结果不受影响
+        """
+        created, failed = [], []
+        output_dir = os.path.dirname(output)
+        extension = os.path.splitext(output)[1]
+        for duplicate in self.duplicates.get(source, []):
+            name = os.path.splitext(os.path.basename(duplicate))[0]
+            duplicate_output = os.path.join(output_dir, name + extension)
+            if os.path.abspath(duplicate_output) != os.path.abspath(output):
+                key = os.path.normcase(os.path.abspath(duplicate_output))
+                if os.path.normcase(name) in self.planned_names or key in self.created_outputs:
+                    failed.append((duplicate, f"输出文件 {os.path.basename(duplicate_output)} 与本批次中其他文件的输出重名"))
+                    continue
+                try:
+                    if os.path.lexists(duplicate_output):
+                        os.remove(duplicate_output)  # 上次转换留下的输出
+                    try:
+                        os.link(output, duplicate_output)
+                    except OSError:
+                        # 不支持硬链接的文件系统（如FAT32、网络共享）改为复制
+                        shutil.copy2(output, duplicate_output)
+                except OSError as e:
+                    failed.append((duplicate, f"生成输出文件失败: {str(e)}"))
+                    continue
+                self.created_outputs.add(key)
+            self.saved_files += 1
+            self.saved_bytes += self.sizes.get(duplicate) or 0
+            created.append((duplicate, duplicate_output))
+        return created, failed
+    
+    def describe(self):
+        """重复文件的汇总信息"""
+        return (f"重复文件: {self.saved_files} 个直接复用了相同内容的转换结果，"
+                f"少转换 {self.saved_bytes / (1024 * 1024):.1f} MB（为查重计算哈希 {self.hashed_bytes / (1024 * 1024):.1f} MB）")
+
+WATCH_SETTLE_SECONDS = 2.0  # 文件大小和修改时间保持不变多久后才视为写入完成
+WATCH_POLL_INTERVAL = 2.0  # 轮询模式下扫描目录的间隔（秒）
+WATCH_QUEUE_SIZE = 1000  # 等待转换的任务队列上限
+WATCH_METRICS_INTERVAL = 30  # 输出运行指标的间隔（秒）
+WATCH_RATE_WINDOW = 60  # 计算吞吐量的时间窗口（秒）
+
+SCAN_BATCH_SIZE = 500  # 扫描结果每批最多的文件数
+SCAN_BATCH_INTERVAL = 0.2  # 扫描结果至少每隔多少秒送出一批，保证界面及时显示
+
+# 符号链接的处理方式
+SYMLINK_POLICIES = {
+    "files": "跟随文件链接",
+    "follow": "跟随全部链接",
+    "skip": "忽略链接",
+}
+
+IGNORED_NAME_PATTERNS = (".*", "~$*")  # 隐藏文件和Office打开文档时生成的临时文件
+
+def split_patterns(text):
+    """把用分号分隔的多个通配符拆分为列表"""
+    return [pattern.strip() for pattern in re.split(r"[;；]", text or "") if pattern.strip()]
+
+class DirectoryScanner:
+    """基于os.scandir的目录扫描器，逐个产生匹配的文件，可在其他线程中取消
+
+    扩展名通过一次集合查找匹配；include/exclude为通配符，不含路径分隔符的匹配文件名，
+    含"/"的匹配相对于root的路径，exclude同时用于跳过子目录。max_depth为向下进入的
+    子目录层数（None表示不限，0表示只扫描root本身）。symlinks见SYMLINK_POLICIES，
+    跟随目录链接时记录已访问的目录，避免链接成环
+    """
+    def __init__(self, root, extensions=None, include=(), exclude=(), max_depth=None, symlinks="files", exclude_dirs=()):
+        if symlinks not in SYMLINK_POLICIES:
+            raise ValueError(f"未知的符号链接处理方式: {symlinks}")
+        self.root = root
+        self.extensions = {extension.lower() for extension in extensions} if extensions else None
+        self.include = [pattern.replace("\\", "/") for pattern in include if pattern]
+        self.exclude = [pattern.replace("\\", "/") for pattern in exclude if pattern]
+        self.max_depth = max_depth
+        self.symlinks = symlinks
+        self.exclude_dirs = {os.path.abspath(path) for path in exclude_dirs}
+        self.cancel_event = threading.Event()
+        self.directories = 0  # 已扫描的目录数
+        self.errors = 0  # 无法读取的目录数
+    
+    def cancel(self):
+        self.cancel_event.set()
+    
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+    
+    @staticmethod
+    def _matches(patterns, name, relative_path):
+        for pattern in patterns:
+            if fnmatch.fnmatch(relative_path if "/" in pattern else name, pattern):
+                return True
+        return False
+    
+    def scan(self):
+        """逐个产生匹配的文件路径"""
+        visited = set()
+        stack = [(self.root, "", 0)]
+        while stack and not self.cancelled:
+            directory, relative_dir, depth = stack.pop()
+            if self.symlinks == "follow":
+                try:
+                    stat = os.stat(directory)
+                except OSError:
+                    self.errors += 1
+                    continue
+                if (stat.st_dev, stat.st_ino) in visited:
+                    continue
+                visited.add((stat.st_dev, stat.st_ino))
+            try:
+                with os.scandir(directory) as entries:
+                    entries = list(entries)
+            except OSError:
+                self.errors += 1
+                continue
+            self.directories += 1
+            subdirectories = []
+            for entry in entries:
+                if self.cancel_event.is_set():
+                    return
+                name = entry.name
+                relative_path = f"{relative_dir}{name}"
+                try:
+                    is_symlink = entry.is_symlink()
+                    if is_symlink and self.symlinks == "skip":
+                        continue
+                    if entry.is_dir(follow_symlinks=self.symlinks == "follow"):
+                        if self.max_depth is not None and depth >= self.max_depth:
+                            continue
+                        if self.exclude and self._matches(self.exclude, name, relative_path):
+                            continue
+                        if self.exclude_dirs and os.path.abspath(entry.path) in self.exclude_dirs:
+                            continue
+                        subdirectories.append((entry.path, relative_path + "/", depth + 1))
+                        continue
+                    if self.extensions is not None:
+                        dot = name.rfind(".")
+                        if dot < 0 or name[dot:].lower() not in self.extensions:
+                            continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                if self.include and not self._matches(self.include, name, relative_path):
+                    continue
+                if self.exclude and self._matches(self.exclude, name, relative_path):
+                    continue
+                yield entry.path
+            # 倒序入栈，使子目录按名称顺序扫描
+            stack.extend(reversed(subdirectories))
+    
+    def scan_batches(self, batch_size=SCAN_BATCH_SIZE, interval=SCAN_BATCH_INTERVAL):
+        """按批产生匹配的文件，每批达到batch_size个或距上一批超过interval秒时送出"""
+        batch = []
+        last_sent = time.time()
+        for path in self.scan():
+            batch.append(path)
+            if len(batch) >= batch_size or time.time() - last_sent >= interval:
+                yield batch
+                batch = []
+                last_sent = time.time()
+        if batch:
+            yield batch
+
+class InotifyWatcher:
+    """通过inotify监视目录树（Linux，使用ctypes调用libc，不需要额外依赖）
+
+    poll(timeout) 返回期间有变化的文件路径；新建的子目录会自动加入监视，
+    内核事件队列溢出时返回None，由调用方重新扫描全部目录
+    """
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0x800
+    IN_CLOEXEC = 0x80000
+    WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    EVENT_HEADER = struct.Struct("iIII")
+    
+    def __init__(self, roots, exclude_dirs=()):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify只支持Linux")
+        import ctypes
+        import ctypes.util
+        self.ctypes = ctypes
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1失败")
+        self.exclude_dirs = exclude_dirs
+        self.watches = {}  # 监视描述符 -> 目录
+        try:
+            for root in roots:
+                self._add_tree(root)
+        except Exception:
+            self.close()
+            raise
+    
+    def _add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.WATCH_MASK)
+        if wd < 0:
+            errno_value = self.ctypes.get_errno()
+            raise OSError(errno_value, f"无法监视目录 {directory}: {os.strerror(errno_value)}")
+        self.watches[wd] = directory
+    
+    def _add_tree(self, root):
+        """监视目录及其所有子目录，返回其中已有的文件（目录创建后、加入监视前写入的文件）"""
+        files = []
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            self._add_watch(directory)
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith(".") and os.path.abspath(entry.path) not in self.exclude_dirs:
+                            stack.append(entry.path)
+                    else:
+                        files.append(entry.path)
+                except OSError:
+                    continue
+        return files
+    
+    def poll(self, timeout):
+        import select
+        changed = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + name_length].rstrip(b"\0")
+            offset += name_length
+            if mask & self.IN_Q_OVERFLOW:
+                return None
+            if mask & self.IN_IGNORED:
+                # 目录被删除或移走，内核自动移除了监视
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO) and os.path.abspath(path) not in self.exclude_dirs:
+                    try:
+                        changed.update(self._add_tree(path))
+                    except OSError:
+                        pass
+            else:
+                changed.add(path)
+        return changed
+    
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+class PollingWatcher:
+    """定期扫描目录树，比较文件大小和修改时间（不支持inotify时使用）"""
+    def __init__(self, roots, interval=WATCH_POLL_INTERVAL, exclude_dirs=()):
+        self.roots = roots
+        self.interval = interval
+        self.exclude_dirs = exclude_dirs
+        self.next_scan = 0
+        self.snapshot = self._scan()
+    
+    def _scan(self):
+        snapshot = {}
+        for root in self.roots:
+            stack = [root]
+            while stack:
+                directory = stack.pop()
+                try:
+                    entries = list(os.scandir(directory))
+                except OSError:
+                    continue
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith(".") and os.path.abspath(entry.path) not in self.exclude_dirs:
+                                stack.append(entry.path)
+                        else:
+                            stat = entry.stat()
+                            snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        continue
+        self.next_scan = time.time() + self.interval
+        return snapshot
+    
+    def poll(self, timeout):
+        wait = self.next_scan - time.time()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        if wait > 0:
+            time.sleep(wait)
+        snapshot = self._scan()
+        changed = {path for path, state in snapshot.items() if self.snapshot.get(path) != state}
+        self.snapshot = snapshot
+        return changed
+    
+    def close(self):
+        pass
+
+def create_folder_watcher(roots, exclude_dirs=(), polling=False, poll_interval=WATCH_POLL_INTERVAL):
+    """优先使用inotify，不支持（非Linux、监视数量超过系统上限等）时改为轮询，返回 (监视器, 方式)"""
+    if not polling:
+        try:
+            return InotifyWatcher(roots, exclude_dirs), "inotify"
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(roots, poll_interval, exclude_dirs), "polling"
+
+class WatchMetrics:
+    """监视模式的运行指标（线程安全）"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counts = collections.Counter()  # detected/queued/converted/failed/skipped
+        self.in_flight = 0
+        self.arrivals = collections.deque()  # 文件进入队列的时间
+        self.completions = collections.deque()  # (完成时间, 等待+转换耗时, 转换耗时)
+    
+    def add(self, name, count=1):
+        with self.lock:
+            self.counts[name] += count
+            if name == "queued":
+                self.arrivals.append(time.time())
+    
+    def start_job(self):
+        with self.lock:
+            self.in_flight += 1
+    
+    def finish_job(self, status, latency, duration):
+        with self.lock:
+            self.in_flight -= 1
+            self.counts[status] += 1
+            if status != "skipped":
+                self.completions.append((time.time(), latency, duration))
+    
+    def snapshot(self, settling=0, queued=0, overflow=0):
+        """返回当前指标；backlog为已发现但尚未开始转换的文件数"""
+        with self.lock:
+            now = time.time()
+            while self.arrivals and now - self.arrivals[0] > WATCH_RATE_WINDOW:
+                self.arrivals.popleft()
+            while self.completions and now - self.completions[0][0] > WATCH_RATE_WINDOW:
+                self.completions.popleft()
+            window = min(WATCH_RATE_WINDOW, max(now - self.started, 1e-6))
+            latencies = [sample[1] for sample in self.completions]
+            durations = [sample[2] for sample in self.completions]
+            arrival_rate = len(self.arrivals) * 60 / window
+            throughput = len(self.completions) * 60 / window
+            backlog = queued + overflow
+            return {
+                "uptime": round(now - self.started, 1),
+                "detected": self.counts["detected"],
+                "queued_total": self.counts["queued"],
+                "converted": self.counts["converted"],
+                "failed": self.counts["failed"],
+                "skipped": self.counts["skipped"],
+                "settling": settling,
+                "backlog": backlog,
+                "in_flight": self.in_flight,
+                "arrival_per_min": round(arrival_rate, 1),
+                "throughput_per_min": round(throughput, 1),
+                "avg_latency": round(statistics.mean(latencies), 3) if latencies else None,
+                "avg_duration": round(statistics.mean(durations), 3) if durations else None,
+                "keeping_up": backlog == 0 or throughput >= arrival_rate,
+            }
+
+class WatchService:
+    """监视目录，把新增或修改完成的文件交给后台线程转换
+
+    文件的大小和修改时间在settle秒内都没有变化才视为写入完成；写入完成的文件进入有界队列，
+    队列已满时暂存在溢出列表中，由监视线程在队列有空位时补充。转换前查询转换记录，
+    源文件和选项都未变化的跳过
+    """
+    def __init__(self, roots, conv_type, output_dir, options, workers, ffmpeg_path=None,
+                 settle=WATCH_SETTLE_SECONDS, queue_size=WATCH_QUEUE_SIZE, incremental=True,
+                 polling=False, poll_interval=WATCH_POLL_INTERVAL, status=None, verbose=False, conversion_metrics=None):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.conv_type = conv_type
+        self.output_dir = os.path.abspath(output_dir)
+        self.options = options
+        self.ffmpeg_path = ffmpeg_path
+        self.settle = settle
+        self.incremental = incremental
+        self.status = status or (lambda message: None)
+        self.verbose = verbose
+        self.lane = CONVERSION_LANES[conv_type]
+        # Office任务只能在单个线程中依次执行
+        self.workers = 1 if self.lane == "serial" else max(1, workers)
+        self.extensions = tuple(SUPPORTED_EXTENSIONS[conv_type])
+        self.exclude_dirs = {self.output_dir}
+        self.watcher, self.mode = create_folder_watcher(self.roots, self.exclude_dirs, polling, poll_interval)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.overflow = collections.deque()
+        self.settling = {}  # 文件 -> (大小, 修改时间, 稳定开始时间)
+        self.waiting = set()  # 已进入队列、尚未开始转换的文件
+        self.waiting_lock = threading.Lock()
+        self.metrics = WatchMetrics()
+        self.conversion_metrics = conversion_metrics  # ConversionMetrics，记录各阶段耗时
+        self.stop_event = threading.Event()
+        self.process_pool = ProcessPoolExecutor(max_workers=self.workers) if self.lane == "process" else None
+        self.threads = []
+    
+    def wanted(self, path):
+        name = os.path.basename(path)
+        if name.startswith((".", "~$")) or not name.lower().endswith(self.extensions):
+            return False
+        path = os.path.abspath(path)
+        return not any(path == excluded or path.startswith(excluded + os.sep) for excluded in self.exclude_dirs)
+    
+    def observe(self, path, now, initial=False):
+        """记录发现的文件，开始（或重新开始）等待写入完成"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.settling.pop(path, None)
+            return
+        # 启动时已存在且修改时间较早的文件不再等待
+        since = now - self.settle if initial and now - stat.st_mtime >= self.settle else now
+        previous = self.settling.get(path)
+        if previous is None:
+            self.metrics.add("detected")
+        elif previous[:2] == (stat.st_size, stat.st_mtime_ns):
+            return
+        self.settling[path] = (stat.st_size, stat.st_mtime_ns, since)
+    
+    def check_settled(self, now):
+        """把写入完成的文件移入队列"""
+        for path, (size, mtime_ns, since) in list(self.settling.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.settling[path]
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                self.settling[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - since >= self.settle:
+                del self.settling[path]
+                with self.waiting_lock:
+                    if path in self.waiting:
+                        continue
+                    self.waiting.add(path)
+                self.overflow.append((path, now))
+        while self.overflow:
+            try:
+                self.queue.put_nowait(self.overflow[0])
+            except queue.Full:
+                break
+            self.overflow.popleft()
+            self.metrics.add("queued")
+    
+    def worker(self):
+        manifest = ConversionManifest() if self.incremental else None
+        options_key = ConversionManifest.options_key(self.conv_type, self.options)
+        kwargs = {"status": self.status} if self.verbose and self.lane != "process" else {}
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    path, ready_at = self.queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                with self.waiting_lock:
+                    self.waiting.discard(path)
+                self.metrics.start_job()
+                started = time.time()
+                status = "failed"
+                result = error = None
+                try:
+                    if manifest and manifest.lookup(self.conv_type, path, self.output_dir, options_key):
+                        status = "skipped"
+                        continue
+                    args = (self.conv_type, path, self.output_dir, self.options, self.ffmpeg_path)
+                    if self.process_pool:
+                        result = self.process_pool.submit(_run_conversion_job, *args).result()
+                    else:
+                        result = _run_conversion_job(*args, **kwargs)
+                    if manifest:
+                        manifest.record(self.conv_type, path, self.output_dir, self.options, result["output"], result.get("method"))
+                    status = "converted"
+                    self.status(f"成功: {path} -> {result['output']}")
+                except Exception as e:
+                    error = e
+                    self.status(f"失败: {path} - {str(e)}")
+                finally:
+                    finished = time.time()
+                    if self.conversion_metrics and status != "skipped":
+                        self.conversion_metrics.record(self.conv_type, path, result, error, ready_at)
+                    self.metrics.finish_job(status, finished - ready_at, finished - started)
+                    self.queue.task_done()
+        finally:
+            if manifest:
+                manifest.close()
+            release_office_pools()
+    
+    def describe(self, snapshot):
+        return (f"监视中: 待转换 {snapshot['backlog']} 个，等待写入完成 {snapshot['settling']} 个，"
+                f"正在转换 {snapshot['in_flight']} 个；已转换 {snapshot['converted']} 个，失败 {snapshot['failed']} 个，"
+                f"跳过 {snapshot['skipped']} 个；每分钟新增 {snapshot['arrival_per_min']} 个，"
+                f"处理 {snapshot['throughput_per_min']} 个" + ("" if snapshot["keeping_up"] else "（处理速度跟不上）"))
+    
+    def snapshot(self):
+        return self.metrics.snapshot(len(self.settling), self.queue.qsize(), len(self.overflow))
+    
+    def run(self, metrics_interval=WATCH_METRICS_INTERVAL, on_metrics=None):
+        """监视直到stop()被调用（或收到KeyboardInterrupt），正在转换的文件会等待完成"""
+        self.status(f"开始监视 {', '.join(self.roots)}（{self.mode}），输出到 {self.output_dir}，并行任务数 {self.workers}")
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self.worker)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+        
+        now = time.time()
+        for root in self.roots:
+            for path in DirectoryScanner(root, self.extensions, exclude=IGNORED_NAME_PATTERNS, exclude_dirs=self.exclude_dirs).scan():
+                self.observe(path, now, initial=True)
+        
+        next_metrics = time.time() + metrics_interval
+        tick = min(0.5, self.settle / 2) if self.settle > 0 else 0.1
+        try:
+            while not self.stop_event.is_set():
+                changed = self.watcher.poll(tick)
+                now = time.time()
+                if changed is None:
+                    # 事件队列溢出，可能漏掉了事件，重新扫描全部目录
+                    self.status("文件事件过多，重新扫描监视目录")
+                    for root in self.roots:
+                        for path in DirectoryScanner(root, self.extensions, exclude=IGNORED_NAME_PATTERNS, exclude_dirs=self.exclude_dirs).scan():
+                            self.observe(path, now)
                 else:
-                    # 尝试其他可能的路径
-                    alternative_paths = [
-                        os.path.join(os.path.dirname(sys.executable), "ffmpeg.exe"),
-                        os.path.join(os.path.dirname(os.path.abspath(__file__)), "ffmpeg.exe")
-                    ]
-                    for path in alternative_paths:
-                        if os.path.exists(path):
-                            shutil.copy2(path, ffmpeg_path)
-                            return ffmpeg_path
-                    
-                    raise FileNotFoundError("无法在打包资源中找到ffmpeg.exe")
+                    for path in changed:
+                        if self.wanted(path):
+                            self.observe(path, now)
+                self.check_settled(now)
+                if now >= next_metrics:
+                    snapshot = self.snapshot()
+                    self.status(self.describe(snapshot))
+                    if on_metrics:
+                        on_metrics(snapshot)
+                    next_metrics = now + metrics_interval
+        finally:
+            self.stop()
+            for thread in self.threads:
+                thread.join()
+            if self.process_pool:
+                self.process_pool.shutdown(wait=True)
+            self.watcher.close()
+            if on_metrics:
+                on_metrics(self.snapshot())
+    
+    def stop(self):
+        self.stop_event.set()
+
+# 转换服务：本机HTTP/JSON接口 + SQLite持久化任务队列，多个客户端共用一组工作进程，不再各自占满CPU
+SERVER_PORT = 8765
+SERVER_QUEUE_FILE = "jobs.sqlite3"
+SERVER_POLL_INTERVAL = 0.5  # 工作线程没有任务时重新查询队列的间隔（秒），客户端轮询任务状态的间隔
+SERVER_MAX_BODY = 16 * 1024 * 1024  # 请求体的大小上限
+SERVER_LIST_LIMIT = 1000  # 一次最多列出的任务数
+SERVER_MAX_WAIT = 60  # 等待任务完成的请求最长阻塞的秒数
+SERVER_TOKEN_FILE = "server-token"  # 未指定--token时服务生成的令牌，保存在缓存目录中，本机的客户端自动读取
+SERVER_LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+JOB_STATES = {
+    "queued": "排队中",
+    "running": "转换中",
+    "done": "已完成",
+    "failed": "失败",
+    "cancelled": "已取消",
+}
+JOB_FINISHED_STATES = ("done", "failed", "cancelled")
+
+# 由服务端决定的选项：客户端提交的值被忽略，总是使用服务端的设置（Office后端、线程和进程数由服务按并行任务数分配）
+SERVER_OWNED_OPTIONS = ("office_backend", "office_recycle_after", "threads", "pdf_workers")
+# 客户端提交的数值选项的范围 (最小值, 最大值或None)，超出时取边界值
+JOB_OPTION_RANGES = {
+    "image_quality": (1, 100),
+    "max_dimension": (0, 65535),
+    "crf": (0, 63),
+    "sample_rate": (8000, 384000),
+    "segments": (0, os.cpu_count() or 1),
+    "segment_min_duration": (0.0, None),
+    "pdf_parallel_min_pages": (1, None),
+}
+JOB_OPTION_CHOICES = {
+    "preset": tuple(ENCODER_PRESET_NAMES),
+    "excel_orientation": ("landscape", "portrait"),
+}
+JOB_BOOLEAN_OPTIONS = ("excel_fit_to_page", "stream_copy", "segment_parallel", "pdf_parallel")
+JOB_NAME_OPTIONS = ("video_codec", "audio_codec", "video_bitrate", "audio_bitrate")  # 编码器名称和码率，如 libx264、4M
+JOB_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,32}$")
+
+def client_name():
+    """提交任务时标识客户端：用户名@主机名"""
+    user = os.environ.get("USERNAME") or os.environ.get("USER") or "user"
+    return f"{user}@{platform.node()}"
+
+def server_token_path():
+    return os.path.join(get_cache_dir(), SERVER_TOKEN_FILE)
+
+def load_server_token(create=False):
+    """读取本机转换服务的令牌；create为True且还没有令牌时生成一个（文件仅当前用户可读写）"""
+    path = server_token_path()
+    try:
+        with open(path, encoding="utf-8") as f:
+            token = f.read().strip()
+        if token:
+            return token
+    except FileNotFoundError:
+        pass
+    if not create:
+        return None
+    token = secrets.token_urlsafe(32)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+def path_within_roots(path, roots):
+    """路径（解析符号链接后）是否在roots的某个目录中；roots为None时不限制"""
+    if roots is None:
+        return True
+    path = os.path.normcase(os.path.realpath(path))
+    for root in roots:
+        try:
+            if os.path.commonpath([path, root]) == root:
+                return True
+        except ValueError:
+            pass  # Windows上不在同一个盘
+    return False
+
+def normalize_job_options(conv_type, options, base=None):
+    """检查客户端提交的转换选项，返回合并默认值后的完整选项，无效时抛出ValueError
+
+    SERVER_OWNED_OPTIONS总是取base（服务端的设置）中的值，数值选项限制在JOB_OPTION_RANGES的范围内
+    """
+    options = dict(options or {})
+    unknown = sorted(set(options) - set(DEFAULT_OPTIONS))
+    if unknown:
+        raise ValueError(f"未知的转换选项: {', '.join(unknown)}")
+    for key in SERVER_OWNED_OPTIONS:
+        options.pop(key, None)
+    for key, (low, high) in JOB_OPTION_RANGES.items():
+        value = options.get(key)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"选项 {key} 必须是数字: {value!r}")
+        value = max(low, value) if high is None else min(max(low, value), high)
+        options[key] = type(low)(value)
+    for key, choices in JOB_OPTION_CHOICES.items():
+        if key in options and options[key] not in choices:
+            raise ValueError(f"无效的选项值: {key}={options[key]!r}，可选: {', '.join(choices)}")
+    for key in JOB_BOOLEAN_OPTIONS:
+        if key in options and not isinstance(options[key], bool):
+            raise ValueError(f"选项 {key} 必须是 true 或 false")
+    for key in JOB_NAME_OPTIONS:
+        value = options.get(key)
+        if value is not None and not (isinstance(value, str) and JOB_NAME_PATTERN.match(value)):
+            raise ValueError(f"无效的选项值: {key}={value!r}")
+    if options.get("ico_sizes") is not None:
+        sizes = options["ico_sizes"]
+        if not isinstance(sizes, list) or not all(
+            isinstance(size, (list, tuple)) and len(size) == 2 and all(isinstance(side, int) and not isinstance(side, bool) and 1 <= side <= 256 for side in size)
+            for size in sizes
+        ):
+            raise ValueError("ico_sizes 必须是 [宽, 高] 的列表，边长为1到256")
+    merged = dict(base or DEFAULT_OPTIONS, **options)
+    if conv_type in TARGET_FORMATS:
+        merged["target_format"] = str(merged.get("target_format") or TARGET_FORMATS[conv_type][0]).lower()
+        if merged["target_format"] not in TARGET_FORMATS[conv_type]:
+            raise ValueError(f"不支持的目标格式: {merged['target_format']}，可选: {', '.join(TARGET_FORMATS[conv_type])}")
+    if merged.get("ico_sizes"):
+        merged["ico_sizes"] = [tuple(size) for size in merged["ico_sizes"]]
+    return merged
+
+def normalize_job_routes(routes):
+    """检查客户端提交的路由规则：列表按命令行格式解析（如 ["image=webp"]），字典为完整的规则（不含的类型不转换）"""
+    if routes is None:
+        return default_routes()
+    if isinstance(routes, list):
+        return parse_routes(routes)
+    if not isinstance(routes, dict):
+        raise ValueError("routes 必须是列表或对象")
+    normalized = {}
+    for conv_type, target_format in routes.items():
+        if conv_type not in SUPPORTED_EXTENSIONS:
+            raise ValueError(f"未知的文件类型: {conv_type}")
+        if conv_type in TARGET_FORMATS:
+            target_format = str(target_format or TARGET_FORMATS[conv_type][0]).lower()
+            if target_format not in TARGET_FORMATS[conv_type]:
+                raise ValueError(f"不支持的目标格式: {conv_type}={target_format}")
+            normalized[conv_type] = target_format
         else:
-            # 开发环境，直接返回本地ffmpeg路径
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            dev_ffmpeg_path = os.path.join(script_dir, "ffmpeg.exe")
-            if os.path.exists(dev_ffmpeg_path):
-                # 复制到临时目录使用，避免开发环境文件被占用
-                shutil.copy2(dev_ffmpeg_path, ffmpeg_path)
-                return ffmpeg_path
+            normalized[conv_type] = None
+    return normalized
+
+class JobQueue:
+    """持久化的转换任务队列（SQLite）
+
+    任务按优先级和提交顺序取出，取出和状态更新都在事务中完成；服务重启时把中断前正在转换的任务放回队列。
+    同一源文件以相同选项输出到同一目录的任务还在排队或转换时，再次提交返回已有的任务，不重复转换。
+    连接可在多个线程中使用，由内部的锁保证串行访问
+    """
+    COLUMNS = ("id", "conversion_type", "source", "output_dir", "options", "options_key", "client", "priority",
+               "incremental", "state", "submitted", "started", "finished", "output", "method", "elapsed", "skipped", "error")
+    
+    def __init__(self, path=None):
+        if path is None:
+            os.makedirs(get_cache_dir(), exist_ok=True)
+            path = os.path.join(get_cache_dir(), SERVER_QUEUE_FILE)
+        self.path = path
+        self.lock = threading.Lock()
+        self.finished = threading.Condition()  # 有任务结束时通知等待结果的请求
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, conversion_type TEXT NOT NULL, source TEXT NOT NULL, "
+            "output_dir TEXT NOT NULL, options TEXT NOT NULL, options_key TEXT NOT NULL, client TEXT, "
+            "priority INTEGER NOT NULL DEFAULT 0, incremental INTEGER NOT NULL DEFAULT 1, state TEXT NOT NULL, "
+            "submitted REAL NOT NULL, started REAL, finished REAL, output TEXT, method TEXT, elapsed REAL, "
+            "skipped INTEGER NOT NULL DEFAULT 0, error TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (state, priority, id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_source ON jobs (source, conversion_type, output_dir)")
+        # 上次运行时中断的任务重新排队
+        self.requeued = self.conn.execute("UPDATE jobs SET state = 'queued', started = NULL WHERE state = 'running'").rowcount
+    
+    def _job(self, row):
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job["options"] = json.loads(job["options"])
+        job["incremental"] = bool(job["incremental"])
+        job["skipped"] = bool(job["skipped"])
+        return job
+    
+    def _select(self, where="", params=(), suffix=""):
+        return self.conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs {where} {suffix}", params).fetchall()
+    
+    def submit(self, conv_type, source, output_dir, options, client=None, priority=0, incremental=True):
+        """提交任务，返回 (任务, 是否复用了还未完成的相同任务)"""
+        source = os.path.abspath(source)
+        output_dir = os.path.abspath(output_dir)
+        options_key = ConversionManifest.options_key(conv_type, options)
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                if incremental:
+                    rows = self._select(
+                        "WHERE source = ? AND conversion_type = ? AND output_dir = ? AND options_key = ? AND state IN ('queued', 'running')",
+                        (source, conv_type, output_dir, options_key), "ORDER BY id LIMIT 1"
+                    )
+                    if rows:
+                        self.conn.execute("COMMIT")
+                        return self._job(rows[0]), True
+                job_id = self.conn.execute(
+                    "INSERT INTO jobs (conversion_type, source, output_dir, options, options_key, client, priority, incremental, state, submitted) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'queued', ?)",
+                    (conv_type, source, output_dir, json.dumps(options, ensure_ascii=False), options_key, client,
+                     int(priority), int(incremental), time.time())
+                ).lastrowid
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            return self._job(self._select("WHERE id = ?", (job_id,))[0]), False
+    
+    def claim(self, conv_types):
+        """取出优先级最高、最早提交的一个任务并标记为转换中，没有任务时返回None"""
+        marks = ", ".join("?" for _ in conv_types)
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._select(f"WHERE state = 'queued' AND conversion_type IN ({marks})", tuple(conv_types), "ORDER BY priority DESC, id LIMIT 1")
+                if rows:
+                    self.conn.execute("UPDATE jobs SET state = 'running', started = ? WHERE id = ?", (time.time(), rows[0][0]))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            if not rows:
+                return None
+            return self._job(self._select("WHERE id = ?", (rows[0][0],))[0])
+    
+    def finish(self, job_id, state, output=None, method=None, elapsed=None, skipped=False, error=None):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, finished = ?, output = ?, method = ?, elapsed = ?, skipped = ?, error = ? WHERE id = ?",
+                (state, time.time(), output, method, elapsed, int(skipped), error, job_id)
+            )
+        with self.finished:
+            self.finished.notify_all()
+    
+    def cancel_queued(self, job_id):
+        """取消还在排队的任务，返回是否取消成功（任务已开始转换时返回False）"""
+        with self.lock:
+            cancelled = self.conn.execute(
+                "UPDATE jobs SET state = 'cancelled', finished = ?, error = '已取消' WHERE id = ? AND state = 'queued'",
+                (time.time(), job_id)
+            ).rowcount
+        if cancelled:
+            with self.finished:
+                self.finished.notify_all()
+        return bool(cancelled)
+    
+    def get(self, job_id):
+        with self.lock:
+            rows = self._select("WHERE id = ?", (job_id,))
+        return self._job(rows[0]) if rows else None
+    
+    def wait(self, job_id, timeout):
+        """等待任务结束（最多timeout秒），返回任务的最新状态"""
+        deadline = time.time() + timeout
+        with self.finished:
+            while True:
+                job = self.get(job_id)
+                remaining = deadline - time.time()
+                if job is None or job["state"] in JOB_FINISHED_STATES or remaining <= 0:
+                    return job
+                self.finished.wait(remaining)
+    
+    def list(self, ids=None, state=None, client=None, limit=SERVER_LIST_LIMIT):
+        conditions, params = [], []
+        if ids:
+            conditions.append(f"id IN ({', '.join('?' for _ in ids)})")
+            params.extend(ids)
+        if state:
+            conditions.append("state = ?")
+            params.append(state)
+        if client:
+            conditions.append("client = ?")
+            params.append(client)
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+        with self.lock:
+            rows = self._select(where, tuple(params), f"ORDER BY id DESC LIMIT {int(limit)}")
+        return [self._job(row) for row in rows]
+    
+    def counts(self):
+        """各状态的任务数"""
+        with self.lock:
+            rows = self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = {state: 0 for state in JOB_STATES}
+        counts.update(dict(rows))
+        return counts
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class JobServer:
+    """转换服务：工作线程从任务队列取出任务转换，图片和PDF交给进程池，ffmpeg和Office任务在线程中执行
+
+    各执行通道共用workers个并行名额（Office通道最多占1个），同时转换的任务总数不超过workers。正在转换的ffmpeg、Office任务可以取消（终止子进程），
+    进程池中的任务无法中途停止。转换前查询转换记录，源文件和选项都未变化的直接完成。
+    指定roots时源文件和输出目录必须在其中的某个目录里
+    """
+    def __init__(self, job_queue, workers, ffmpeg_path=None, options=None, status=None, verbose=False, conversion_metrics=None, roots=None):
+        self.queue = job_queue
+        self.workers = max(1, workers)
+        self.ffmpeg_path = ffmpeg_path
+        self.options = dict(DEFAULT_OPTIONS, **(options or {}))  # 服务端的默认选项，客户端提交的选项覆盖其中的值
+        self.status = status or (lambda message: None)
+        self.verbose = verbose
+        self.conversion_metrics = conversion_metrics
+        self.roots = None if roots is None else [os.path.normcase(os.path.realpath(root)) for root in roots]
+        self.lane_workers = {"process": self.workers, "subprocess": self.workers, "serial": 1}
+        self.slots = threading.Semaphore(self.workers)  # 各通道共用的并行名额，工作线程取出任务前先占一个
+        self.started = time.time()
+        self.stop_event = threading.Event()
+        self.available = threading.Condition()  # 有新任务提交时唤醒空闲的工作线程
+        self.controls = {}  # 正在转换的任务 -> BatchControl
+        self.controls_lock = threading.Lock()
+        self.completed = collections.Counter()  # 本次运行中结束的任务数（按状态）
+        self.process_pool = None
+        self.threads = []
+    
+    def start(self):
+        # 先启动进程池的全部工作进程，再启动可能创建子进程的线程（见BatchExecutor.run）
+        self.process_pool = ProcessPoolExecutor(max_workers=self.lane_workers["process"])
+        self.process_pool.submit(os.getpid).result()
+        for lane, count in self.lane_workers.items():
+            for _ in range(count):
+                thread = threading.Thread(target=self.worker, args=(lane,))
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+        self.status(f"转换服务已启动，并行任务数 {self.workers}" + (f"，{self.queue.requeued} 个中断的任务重新排队" if self.queue.requeued else ""))
+    
+    def submit(self, conv_type, sources, output_dir, options=None, routes=None, client=None, priority=0, incremental=True):
+        """提交一批文件（服务端的文件、目录或通配符），返回 (任务列表, [(无法提交的文件, 原因), ...])；混合类型按文件识别转换类型"""
+        base = dict(options or {})
+        if conv_type == AUTO_CONVERSION:
+            base["routes"] = normalize_job_routes(routes)
+        elif conv_type not in CONVERSION_LANES:
+            raise ValueError(f"未知的转换类型: {conv_type}")
+        if not path_within_roots(output_dir, self.roots):
+            raise PermissionError(f"输出目录不在允许的目录中: {output_dir}")
+        rejected = []
+        file_paths = []
+        seen = set()
+        for source in sources:
+            if not path_within_roots(source, self.roots):
+                rejected.append((source, "不在允许的目录中"))
+                continue
+            found = collect_input_files([source], conv_type, routes=base.get("routes"))
+            if not found:
+                rejected.append((source, "文件不存在" if not os.path.exists(source) else "没有找到可转换的文件"))
+            for file_path in found:
+                if not path_within_roots(file_path, self.roots):
+                    rejected.append((file_path, "不在允许的目录中"))  # 目录中指向外部的符号链接
+                elif file_path not in seen:
+                    seen.add(file_path)
+                    file_paths.append(file_path)
+        groups, unrouted = route_batch(conv_type, file_paths, base)
+        rejected.extend((file_path, describe_unrouted(file_type)) for file_path, file_type in unrouted)
+        jobs = []
+        for group_type, group_files, group_options in groups:
+            job_options = normalize_job_options(group_type, {key: value for key, value in group_options.items() if key != "routes"}, self.options)
+            for file_path in group_files:
+                job, reused = self.queue.submit(group_type, file_path, output_dir, job_options, client, priority, incremental)
+                job["reused"] = reused
+                jobs.append(job)
+        with self.available:
+            self.available.notify_all()
+        return jobs, rejected
+    
+    def cancel(self, job_id):
+        """取消任务，返回 (任务, 是否已取消或正在终止)；进程池中正在转换的任务无法取消"""
+        job = self.queue.get(job_id)
+        if job is None:
+            return None, False
+        if job["state"] == "queued" and self.queue.cancel_queued(job_id):
+            return self.queue.get(job_id), True
+        job = self.queue.get(job_id)
+        if job["state"] == "running":
+            with self.controls_lock:
+                control = self.controls.get(job_id)
+            if control is None:
+                return job, False
+            control.cancel()
+            return job, True
+        return job, job["state"] == "cancelled"
+    
+    def worker(self, lane):
+        conv_types = [conv_type for conv_type, conv_lane in CONVERSION_LANES.items() if conv_lane == lane]
+        manifest = ConversionManifest()
+        try:
+            while not self.stop_event.is_set():
+                if not self.slots.acquire(timeout=SERVER_POLL_INTERVAL):
+                    continue
+                try:
+                    job = self.queue.claim(conv_types)
+                    if job is not None:
+                        self.run_job(job, lane, manifest)
+                finally:
+                    self.slots.release()
+                if job is None:
+                    with self.available:
+                        self.available.wait(SERVER_POLL_INTERVAL)
+        finally:
+            manifest.close()
+            release_office_pools()
+    
+    def run_job(self, job, lane, manifest):
+        conv_type = job["conversion_type"]
+        options = dict(job["options"])
+        if options.get("ico_sizes"):
+            options["ico_sizes"] = [tuple(size) for size in options["ico_sizes"]]
+        if conv_type in ("audio_convert", "video_convert") and not options.get("threads"):
+            options["threads"] = cpu_budget(self.workers)
+        if conv_type == "pdf_to_word" and not options.get("pdf_workers"):
+            options["pdf_workers"] = cpu_budget(self.workers)
+        control = None if lane == "process" else BatchControl()
+        if control:
+            with self.controls_lock:
+                self.controls[job["id"]] = control
+        result = error = None
+        try:
+            output = manifest.lookup(conv_type, job["source"], job["output_dir"], job["options_key"]) if job["incremental"] else None
+            if output:
+                self.queue.finish(job["id"], "done", output, skipped=True, elapsed=0.0)
+                self.completed["skipped"] += 1
+                return
+            os.makedirs(job["output_dir"], exist_ok=True)
+            args = (conv_type, job["source"], job["output_dir"], options, self.ffmpeg_path)
+            if control is None:
+                result = self.process_pool.submit(_run_conversion_job, *args).result()
             else:
-                raise FileNotFoundError(f"开发环境中未找到ffmpeg.exe，路径: {dev_ffmpeg_path}")
-                
-        return ffmpeg_path
-    except Exception as e:
-        print(f"提取ffmpeg失败: {str(e)}")
-        return None
+                kwargs = {"status": self.status} if self.verbose else {}
+                result = _run_conversion_job(*args, control=control, **kwargs)
+            manifest.record(conv_type, job["source"], job["output_dir"], options, result["output"], result.get("method"))
+            manifest.conn.commit()  # 其他工作线程和服务重启后都能看到这条记录
+            self.queue.finish(job["id"], "done", result["output"], result.get("method"), result["elapsed"])
+            self.completed["done"] += 1
+            if self.verbose:
+                self.status(f"成功: #{job['id']} {job['source']} -> {result['output']}")
+        except Exception as e:
+            error = e
+            state = "cancelled" if control and control.cancelled else "failed"
+            self.queue.finish(job["id"], state, error=str(e) if state == "failed" else "已取消")
+            self.completed[state] += 1
+            self.status(f"{JOB_STATES[state]}: #{job['id']} {job['source']} - {str(e)}")
+        finally:
+            if control:
+                with self.controls_lock:
+                    self.controls.pop(job["id"], None)
+            if self.conversion_metrics and (result or error):
+                self.conversion_metrics.record(conv_type, job["source"], result, error, job["submitted"])
+    
+    def snapshot(self):
+        counts = self.queue.counts()
+        uptime = time.time() - self.started
+        finished = sum(self.completed.values())
+        return {
+            "workers": dict(self.lane_workers),
+            "queue": counts,
+            "completed": dict(self.completed),
+            "uptime": round(uptime, 1),
+            "jobs_per_sec": round(finished / uptime, 3) if uptime > 0 else None,
+        }
+    
+    def describe(self, snapshot):
+        counts = snapshot["queue"]
+        return (f"转换服务: 排队 {counts['queued']} 个，转换中 {counts['running']} 个；本次运行已完成 {snapshot['completed'].get('done', 0)} 个，"
+                f"跳过未变化 {snapshot['completed'].get('skipped', 0)} 个，失败 {snapshot['completed'].get('failed', 0)} 个")
+    
+    def stop(self):
+        """停止取出新任务，等待正在转换的任务结束"""
+        self.stop_event.set()
+        with self.available:
+            self.available.notify_all()
+        for thread in self.threads:
+            thread.join()
+        if self.process_pool:
+            self.process_pool.shutdown(wait=True)
+
+def serve_jobs(job_server, host="127.0.0.1", port=SERVER_PORT, token=None, allowed_hosts=()):
+    """在后台线程中提供转换服务的HTTP/JSON接口，返回服务器对象，调用shutdown()停止
+
+    POST /jobs 提交任务（JSON：type、sources、output_dir，可选 options、routes、client、priority、force），GET /jobs/<id> 查询状态（?wait=秒数 等待结束），GET /jobs 列出任务，
+    POST /jobs/<id>/cancel 取消，GET /jobs/<id>/result 下载输出文件，GET /status 服务状态，GET /metrics Prometheus指标。
+    设置token时请求必须带有 Authorization: Bearer <token>。Host请求头只能是本机地址、监听地址或allowed_hosts，
+    POST请求的Content-Type必须是application/json，浏览器中其他网站的页面无法借用户的浏览器提交任务
+    """
+    import http.server
+    import urllib.parse
+    
+    hosts = {name.lower() for name in SERVER_LOCAL_HOSTS + tuple(allowed_hosts)}
+    if host not in ("", "0.0.0.0", "::"):
+        hosts.add(host.lower())
+    
+    class JobHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        
+        def send_response(self, code, message=None):
+            self.responded = True
+            super().send_response(code, message)
+        
+        def send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            if self.close_connection:
+                self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def read_json(self):
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                length = -1
+            if length < 0 or length > SERVER_MAX_BODY:
+                self.close_connection = True  # 没有读取请求体，连接上剩下的数据不能当作下一个请求
+                raise ValueError("请求体过大" if length > 0 else "Content-Length无效")
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(payload, dict):
+                raise ValueError("请求体必须是JSON对象")
+            return payload
+        
+        def check_request(self, method):
+            """拒绝Host不在允许列表中、POST不是JSON和未授权的请求；拒绝时不读取请求体，直接关闭连接"""
+            self.close_connection = True
+            try:
+                hostname = urllib.parse.urlsplit("//" + self.headers.get("Host", "")).hostname
+            except ValueError:
+                hostname = None
+            if hostname not in hosts:
+                self.send_json(403, {"error": f"不允许的Host: {self.headers.get('Host', '')}"})
+                return False
+            if method == "POST" and self.headers.get_content_type() != "application/json":
+                self.send_json(415, {"error": "请求的Content-Type必须是 application/json"})
+                return False
+            if token and not secrets.compare_digest(self.headers.get("Authorization", "").encode("utf-8"), f"Bearer {token}".encode("utf-8")):
+                self.send_json(401, {"error": "未授权"})
+                return False
+            self.close_connection = False
+            return True
+        
+        def route(self, method):
+            self.responded = False
+            if not self.check_request(method):
+                return
+            url = urllib.parse.urlsplit(self.path)
+            query = urllib.parse.parse_qs(url.query)
+            parts = [part for part in url.path.split("/") if part]
+            try:
+                if method == "GET" and parts == ["status"]:
+                    self.send_json(200, job_server.snapshot())
+                elif method == "GET" and parts == ["metrics"] and job_server.conversion_metrics:
+                    body = job_server.conversion_metrics.prometheus_text().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif method == "POST" and parts == ["jobs"]:
+                    payload = self.read_json()
+                    sources = payload.get("sources") or ([payload["source"]] if payload.get("source") else [])
+                    if not sources or not payload.get("type") or not payload.get("output_dir"):
+                        raise ValueError("必须提供 type、source（或sources）和 output_dir")
+                    jobs, rejected = job_server.submit(
+                        payload["type"], sources, payload["output_dir"], payload.get("options"), payload.get("routes"),
+                        payload.get("client"), payload.get("priority", 0), not payload.get("force", False)
+                    )
+                    self.send_json(201, {"jobs": jobs, "rejected": [{"source": source, "error": reason} for source, reason in rejected]})
+                elif method == "GET" and parts == ["jobs"]:
+                    ids = [int(value) for value in ",".join(query.get("ids", [])).split(",") if value.strip()]
+                    limit = min(int(query.get("limit", [SERVER_LIST_LIMIT])[0]), SERVER_LIST_LIMIT)
+                    self.send_json(200, {"jobs": job_server.queue.list(ids, query.get("state", [None])[0], query.get("client", [None])[0], limit)})
+                elif len(parts) >= 2 and parts[0] == "jobs" and parts[1].isdigit():
+                    self.route_job(method, int(parts[1]), parts[2:], query)
+                else:
+                    self.send_json(404, {"error": "接口不存在"})
+            except PermissionError as e:
+                self.send_json(403, {"error": str(e)})
+            except (ValueError, KeyError, TypeError) as e:
+                self.send_json(400, {"error": str(e)})
+            except Exception as e:
+                # 任务队列数据库出错、读取输出文件出错等；已经开始发送响应（下载结果）时只能关闭连接
+                job_server.status(f"处理请求出错: {method} {self.path} - {str(e)}")
+                self.close_connection = True
+                if not self.responded:
+                    self.send_json(500, {"error": "服务内部错误"})
+        
+        def route_job(self, method, job_id, action, query):
+            job = job_server.queue.get(job_id)
+            if job is None:
+                self.send_json(404, {"error": f"任务不存在: {job_id}"})
+            elif method == "GET" and not action:
+                wait = min(float(query.get("wait", [0])[0]), SERVER_MAX_WAIT)
+                self.send_json(200, job_server.queue.wait(job_id, wait) if wait > 0 else job)
+            elif (method == "POST" and action == ["cancel"]) or (method == "DELETE" and not action):
+                job, cancelled = job_server.cancel(job_id)
+                if cancelled:
+                    self.send_json(200, job)
+                else:
+                    self.send_json(409, dict(job, error="任务已结束或正在进程池中转换，无法取消"))
+            elif method == "GET" and action == ["result"]:
+                if job["state"] != "done" or not job["output"] or not os.path.isfile(job["output"]):
+                    self.send_json(409, {"error": f"任务没有可下载的结果（{JOB_STATES[job['state']]}）"})
+                    return
+                if not path_within_roots(job["output"], job_server.roots):
+                    self.send_json(403, {"error": "输出文件不在允许的目录中"})
+                    return
+                size = os.path.getsize(job["output"])
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(size))
+                self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{urllib.parse.quote(os.path.basename(job['output']))}")
+                self.end_headers()
+                with open(job["output"], "rb") as f:
+                    shutil.copyfileobj(f, self.wfile)
+            else:
+                self.send_json(404, {"error": "接口不存在"})
+        
+        def do_GET(self):
+            self.route("GET")
+        
+        def do_POST(self):
+            self.route("POST")
+        
+        def do_DELETE(self):
+            self.route("DELETE")
+        
+        def log_message(self, format, *args):
+            pass  # 不把每个请求写入日志
+    
+    server = http.server.ThreadingHTTPServer((host, port), JobHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+class JobClient:
+    """转换服务的客户端，图形界面和压力测试共用；请求失败时抛出Exception，消息为服务端返回的错误
+
+    不指定token且服务在本机时使用服务自动生成的令牌
+    """
+    def __init__(self, url, token=None, timeout=30):
+        import urllib.parse
+        self.url = url.rstrip("/")
+        if token is None and urllib.parse.urlsplit(self.url).hostname in SERVER_LOCAL_HOSTS:
+            token = load_server_token()
+        self.token = token
+        self.timeout = timeout
+    
+    def request(self, method, path, payload=None, timeout=None):
+        import urllib.request
+        import urllib.error
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        data = None if payload is None else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(self.url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error") or str(e)
+            except ValueError:
+                message = str(e)
+            raise Exception(f"转换服务返回错误（{e.code}）: {message}")
+        except (urllib.error.URLError, OSError) as e:
+            raise Exception(f"无法连接转换服务 {self.url}: {str(getattr(e, 'reason', e))}")
+    
+    def submit(self, conv_type, sources, output_dir, options=None, routes=None, client=None, priority=0, force=False):
+        """提交任务，返回 {"jobs": [...], "rejected": [{"source": ..., "error": ...}]}"""
+        return self.request("POST", "/jobs", {
+            "type": conv_type,
+            "sources": list(sources),
+            "output_dir": os.path.abspath(output_dir),
+            "options": options or {},
+            "routes": routes,
+            "client": client or client_name(),
+            "priority": priority,
+            "force": force,
+        })
+    
+    def job(self, job_id, wait=0):
+        return self.request("GET", f"/jobs/{job_id}" + (f"?wait={wait}" if wait else ""), timeout=self.timeout + wait)
+    
+    def jobs(self, ids):
+        """按编号查询多个任务的状态"""
+        jobs = []
+        for start in range(0, len(ids), 200):
+            jobs.extend(self.request("GET", "/jobs?ids=" + ",".join(str(job_id) for job_id in ids[start:start + 200]))["jobs"])
+        return jobs
+    
+    def cancel(self, job_id):
+        return self.request("POST", f"/jobs/{job_id}/cancel")
+    
+    def status(self):
+        return self.request("GET", "/status")
+
+FILE_LIST_ROWS = 6  # 文件列表显示的行数
+UI_REFRESH_MS = 50  # 界面从事件队列取出更新的间隔（毫秒）
+UI_EVENTS_PER_FRAME = 5000  # 每次最多处理的事件数，避免一次处理太久界面无响应
+STATUS_LOG_MAX_LINES = 2000  # 日志区域最多保留的行数，超出时删除最早的行
+
+# 文件列表中各文件的状态
+FILE_STATE_NAMES = {
+    "pending": "等待转换",
+    "running": "转换中",
+    "done": "成功",
+    "failed": "失败",
+    "skipped": "未变化，已跳过",
+    "duplicate": "复用相同内容",
+    "cancelled": "已取消",
+}
+
+def format_file_size(size):
+    """把字节数格式化为便于阅读的文字"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+class VirtualFileList:
+    """只为可见行创建条目的文件列表（ttk.Treeview）
+
+    文件信息保存在普通列表中，Treeview里固定只有FILE_LIST_ROWS个条目，滚动时用它们显示
+    当前窗口内的文件；文件大小在第一次显示时才读取。添加文件、更新单个文件的状态只刷新
+    可见的行，十万个文件也不会卡顿
+    """
+    COLUMNS = (
+        ("name", "文件名", 240),
+        ("state", "状态", 100),
+        ("size", "大小", 80),
+        ("duration", "耗时", 70),
+        ("output", "输出文件", 240),
+    )
+    
+    def __init__(self, parent, rows=FILE_LIST_ROWS):
+        self.frame = tk.Frame(parent, bg="#f0f2f5")
+        self.tree = ttk.Treeview(
+            self.frame,
+            columns=[key for key, _, _ in self.COLUMNS],
+            show="headings",
+            height=rows,
+            selectmode="none"
+        )
+        for key, title, width in self.COLUMNS:
+            self.tree.heading(key, text=title)
+            self.tree.column(key, width=width, stretch=key in ("name", "output"))
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scroll)
+        self.tree.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.scrollbar.pack(side=tk.LEFT, fill=tk.Y)
+        
+        self.rows = rows
+        self.items = [self.tree.insert("", tk.END, values=("",) * len(self.COLUMNS)) for _ in range(rows)]
+        self.entries = []  # 每个文件一项：[路径, 状态, 大小, 耗时, 输出文件或错误信息]
+        self.offset = 0  # 第一个可见行的序号
+        
+        self.tree.bind("<MouseWheel>", self.on_mouse_wheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll_to(self.offset - 3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_to(self.offset + 3))
+        self.render()
+    
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+    
+    def set_files(self, file_paths):
+        """替换全部文件"""
+        self.entries = [[path, "pending", None, None, None] for path in file_paths]
+        self.offset = 0
+        self.render()
+    
+    def append_files(self, file_paths):
+        """追加文件，只有新文件落在可见范围内时才刷新条目"""
+        start = len(self.entries)
+        self.entries.extend([path, "pending", None, None, None] for path in file_paths)
+        if start < self.offset + self.rows:
+            self.render()
+        else:
+            self.update_scrollbar()
+    
+    def reset_states(self):
+        """开始新的转换前把所有文件恢复为等待状态"""
+        for entry in self.entries:
+            entry[1:] = ["pending", entry[2], None, None]
+        self.render()
+    
+    def update_file(self, index, state, duration=None, output=None):
+        """更新单个文件的状态，文件不可见时只修改数据"""
+        entry = self.entries[index]
+        entry[1] = state
+        entry[3] = duration
+        entry[4] = output
+        if self.offset <= index < self.offset + self.rows:
+            self.render_row(index - self.offset)
+    
+    def render_row(self, slot):
+        index = self.offset + slot
+        if index >= len(self.entries):
+            self.tree.item(self.items[slot], values=("",) * len(self.COLUMNS))
+            return
+        entry = self.entries[index]
+        if entry[2] is None:
+            try:
+                entry[2] = os.path.getsize(entry[0])
+            except OSError:
+                entry[2] = -1
+        self.tree.item(self.items[slot], values=(
+            os.path.basename(entry[0]),
+            FILE_STATE_NAMES[entry[1]],
+            format_file_size(entry[2]) if entry[2] >= 0 else "",
+            f"{entry[3]:.1f} 秒" if entry[3] is not None else "",
+            entry[4] or "",
+        ))
+    
+    def render(self):
+        for slot in range(self.rows):
+            self.render_row(slot)
+        self.update_scrollbar()
+    
+    def update_scrollbar(self):
+        total = len(self.entries)
+        if total <= self.rows:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.offset / total, (self.offset + self.rows) / total)
+    
+    def scroll_to(self, offset):
+        offset = max(0, min(int(offset), len(self.entries) - self.rows))
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+        return "break"
+    
+    def on_scroll(self, action, value, unit=None):
+        """滚动条回调：moveto为拖动滑块，scroll为点击箭头或空白处"""
+        if action == "moveto":
+            self.scroll_to(float(value) * len(self.entries))
+        elif action == "scroll":
+            step = self.rows if unit == "pages" else 1
+            self.scroll_to(self.offset + int(value) * step)
+    
+    def on_mouse_wheel(self, event):
+        return self.scroll_to(self.offset - int(event.delta / 120) * 3)
 
 class FormatConverter:
     def __init__(self, root):
@@ -75,26 +4748,6 @@ class FormatConverter:
         self.root.minsize(1050, 750)  # 保持最小尺寸限制
         self.set_icon("图片1.ico")
         self.root.iconbitmap(default="")  # 避免打包时图标报错
-          
-        # 检查docx2pdf是否可用
-        if not docx2pdf_available:
-            messagebox.showwarning(
-                "警告", 
-                "未检测到docx2pdf库，Word转PDF功能可能无法使用。\n"
-                "请运行 'pip install docx2pdf' 安装该库。"
-            )
-        
-        # 检查PIL是否可用
-        try:
-            from PIL import Image
-            self.pil_available = True
-        except ImportError:
-            self.pil_available = False
-            messagebox.showwarning(
-                "警告", 
-                "未检测到Pillow库，图片格式转换功能无法使用。\n"
-                "请运行 'pip install pillow' 安装该库。"
-            )
         
         # 设置中文字体和ttk样式
         self.style = ttk.Style()
@@ -108,8 +4761,9 @@ class FormatConverter:
         
         # 提取或获取ffmpeg路径
         self.ffmpeg_path = extract_ffmpeg()
-        # 检查ffmpeg是否可用
-        self.check_ffmpeg_available()
+        
+        # 依赖检查的提示框在窗口显示之后再弹出，不阻塞窗口的首次显示
+        self.root.after(200, self.show_dependency_warnings)
         
         self.file_paths = []  # 改为支持多个文件路径
         self.output_dir = os.path.expanduser("~/转换输出")
@@ -119,17 +4773,50 @@ class FormatConverter:
         self.excel_fit_to_page = tk.BooleanVar(value=True)  # 默认为自动调整到一页
         self.excel_orientation = tk.StringVar(value="landscape")  # 默认为横向
         
+        # 音视频转换选项
+        self.stream_copy = tk.BooleanVar(value=True)  # 编码兼容时直接复制音视频流
+        self.encoder_preset = tk.StringVar(value=ENCODER_PRESET_NAMES["default"])  # 编码预设（显示名称）
+        self.ffmpeg_threads = tk.IntVar(value=0)  # 每个ffmpeg进程的线程数，0表示自动
+        self.segment_parallel = tk.BooleanVar(value=False)  # 长视频分段并行转码
+        
+        # 混合文件各类型的转换规则：音视频、图片为目标格式，其余为是否转换
+        self.route_targets = {
+            route_type: tk.StringVar(value=TARGET_FORMATS[route_type][0]) if route_type in TARGET_FORMATS else tk.BooleanVar(value=True)
+            for route_type in SUPPORTED_EXTENSIONS
+        }
+        
         # ICO转换相关设置
-        self.ico_sizes = [(16,16), (24,24), (32,32), (48,48), (64,64), 
-                         (96,96), (128,128), (144,144), (192,192), (256,256)]
+        self.ico_sizes = list(ICO_SIZES)
         self.selected_sizes = [tk.BooleanVar(value=True) for _ in self.ico_sizes]
         
         # 批量转换相关变量
         self.batch_mode = tk.BooleanVar(value=False)  # 批量模式开关
         self.current_file_index = 0  # 当前转换的文件索引
         self.total_files = 0  # 总文件数
+        self.max_workers = tk.IntVar(value=default_worker_count())  # 并行任务数
+        self.skip_unchanged = tk.BooleanVar(value=True)  # 跳过源文件和选项都未变化的文件
+        self.server_url = tk.StringVar(value="")  # 转换服务地址，填写后把文件提交给服务转换
+        
+        # 扫描文件夹相关设置
+        self.scan_include = tk.StringVar(value="")  # 只添加匹配的文件，多个通配符用分号分隔
+        self.scan_exclude = tk.StringVar(value="")  # 跳过匹配的文件和子目录
+        self.scan_max_depth = tk.IntVar(value=-1)  # 向下进入的子目录层数，-1表示不限
+        self.scan_symlinks = tk.StringVar(value=SYMLINK_POLICIES["files"])
+        self.scanner = None  # 正在进行的文件夹扫描
+        self.job_options = {}  # 开始转换时收集的转换选项
+        self.batch_control = None  # 正在进行的批量转换的暂停/取消控制
+        self.conversion_thread = None
+        self.resume_journal = None  # 要继续的未完成批次
+        
+        # 界面更新通道：任何线程都只把更新放入队列，由主线程定时取出并合并处理
+        self.ui_events = queue.Queue()
         
         self.create_widgets()
+        self.root.after(UI_REFRESH_MS, self.drain_ui_events)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # 上次有未完成的批量转换时，询问是否继续
+        self.root.after(500, self.offer_resume)
 
     def set_icon(self, image_path):
         """设置应用程序图标 - 适配打包环境"""
@@ -150,6 +4837,27 @@ class FormatConverter:
         except Exception as e:
             print(f"设置图标失败：{e}")
             
+    def show_dependency_warnings(self):
+        """检查各转换后端是否已安装（只查找模块，不导入）"""
+        # 检查docx2pdf是否可用
+        if not backend_available("docx2pdf"):
+            messagebox.showwarning(
+                "警告", 
+                "未检测到docx2pdf库，Word转PDF功能可能无法使用。\n"
+                "请运行 'pip install docx2pdf' 安装该库。"
+            )
+        
+        # 检查PIL是否可用
+        if not backend_available("pillow"):
+            messagebox.showwarning(
+                "警告", 
+                "未检测到Pillow库，图片格式转换功能无法使用。\n"
+                "请运行 'pip install pillow' 安装该库。"
+            )
+        
+        # 检查ffmpeg是否可用
+        self.check_ffmpeg_available()
+    
     def check_ffmpeg_available(self):
         """检查ffmpeg是否可用"""
         if not self.ffmpeg_path or not os.path.exists(self.ffmpeg_path):
@@ -196,15 +4904,8 @@ class FormatConverter:
         canvas.create_window((0, 0), window=type_options, anchor="nw")
         
         self.conversion_type = tk.StringVar(value="pdf_to_word")
-        conversion_types = [
-            ("PDF转Word", "pdf_to_word"),
-            ("Word转PDF", "word_to_pdf"),
-            ("Excel转PDF", "excel_to_pdf"),
-            ("PPT转PDF", "ppt_to_pdf"),
-            ("音频格式转换", "audio_convert"),
-            ("视频格式转换", "video_convert"),
-            ("图片格式转换", "image_convert")
-        ]
+        conversion_types = [(text, value) for value, text in CONVERSION_TYPE_NAMES.items()]
+        conversion_types.append(("混合文件（自动识别）", AUTO_CONVERSION))
         
         for text, value in conversion_types:
             ttk.Radiobutton(
@@ -258,6 +4959,61 @@ class FormatConverter:
         )
         self.format_options.pack(side=tk.LEFT, padx=5, pady=5)
         
+        # 混合文件的转换规则（只在自动识别类型时显示）
+        self.route_frame = tk.Frame(self.root, bg="#f0f2f5")
+        route_labels = {"audio_convert": "音频", "video_convert": "视频", "image_convert": "图片"}
+        ttk.Label(self.route_frame, text="各类文件:").pack(side=tk.LEFT, padx=5, pady=5)
+        for route_type, variable in self.route_targets.items():
+            if route_type in TARGET_FORMATS:
+                ttk.Label(self.route_frame, text=f"{route_labels[route_type]}转为").pack(side=tk.LEFT, padx=(10, 2), pady=5)
+                ttk.Combobox(
+                    self.route_frame,
+                    textvariable=variable,
+                    state="readonly",
+                    width=6,
+                    values=TARGET_FORMATS[route_type] + ["不转换"]
+                ).pack(side=tk.LEFT, padx=2, pady=5)
+            else:
+                ttk.Checkbutton(
+                    self.route_frame,
+                    text=CONVERSION_TYPE_NAMES[route_type],
+                    variable=variable
+                ).pack(side=tk.LEFT, padx=5, pady=5)
+        
+        # 音视频编码选项（只在音视频转换时显示）
+        self.media_options_frame = tk.Frame(self.root, bg="#f0f2f5")
+        
+        ttk.Label(self.media_options_frame, text="编码预设:").pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Combobox(
+            self.media_options_frame,
+            textvariable=self.encoder_preset,
+            state="readonly",
+            width=12,
+            values=list(ENCODER_PRESET_NAMES.values())
+        ).pack(side=tk.LEFT, padx=5, pady=5)
+        
+        ttk.Label(self.media_options_frame, text="每个任务线程数 (0=自动):").pack(side=tk.LEFT, padx=(15, 5), pady=5)
+        ttk.Spinbox(
+            self.media_options_frame,
+            from_=0,
+            to=64,
+            width=5,
+            textvariable=self.ffmpeg_threads
+        ).pack(side=tk.LEFT, padx=5, pady=5)
+        
+        ttk.Checkbutton(
+            self.media_options_frame,
+            text="编码兼容时直接封装（不重新编码，速度更快）",
+            variable=self.stream_copy
+        ).pack(side=tk.LEFT, padx=15, pady=5)
+        
+        # 分段并行转码只用于视频
+        self.segment_checkbox = ttk.Checkbutton(
+            self.media_options_frame,
+            text=f"长视频分段并行转码（{SEGMENT_MIN_DURATION // 60} 分钟以上）",
+            variable=self.segment_parallel
+        )
+        
         # ICO转换选项
         self.ico_options_frame = tk.Frame(self.root, bg="#f0f2f5", relief=tk.RIDGE, bd=2)
         ttk.Label(self.ico_options_frame, text="ICO图标尺寸 (选择需要包含的尺寸):", font=("微软雅黑", 10, "bold")).pack(anchor=tk.W, padx=10, pady=5)
@@ -309,14 +5065,8 @@ class FormatConverter:
         
         ttk.Label(file_frame, text="源文件:").pack(side=tk.LEFT, padx=5, pady=5)
         
-        self.file_entry = tk.Text(
-            file_frame, 
-            font=("微软雅黑", 10),
-            width=50,
-            height=3,
-            wrap=tk.WORD
-        )
-        self.file_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 10), pady=5)
+        self.file_list = VirtualFileList(file_frame)
+        self.file_list.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(5, 10), pady=5)
         
         # 文件选择按钮框架
         file_btn_frame = tk.Frame(file_frame, bg="#f0f2f5")
@@ -336,6 +5086,36 @@ class FormatConverter:
         )
         browse_folder_btn.pack(side=tk.TOP, padx=5, pady=2)
         
+        self.cancel_scan_btn = ttk.Button(
+            file_btn_frame,
+            text="取消扫描",
+            command=self.cancel_scan,
+            state=tk.DISABLED
+        )
+        self.cancel_scan_btn.pack(side=tk.TOP, padx=5, pady=2)
+        
+        # 扫描文件夹的筛选条件
+        scan_frame = tk.Frame(self.root, bg="#f0f2f5")
+        scan_frame.pack(pady=(0, 5), fill=tk.X, padx=20)
+        
+        ttk.Label(scan_frame, text="文件夹筛选 包含:").pack(side=tk.LEFT, padx=5)
+        ttk.Entry(scan_frame, textvariable=self.scan_include, width=14).pack(side=tk.LEFT, padx=5)
+        ttk.Label(scan_frame, text="排除:").pack(side=tk.LEFT, padx=5)
+        ttk.Entry(scan_frame, textvariable=self.scan_exclude, width=14).pack(side=tk.LEFT, padx=5)
+        ttk.Label(scan_frame, text="子目录层数 (-1=不限):").pack(side=tk.LEFT, padx=5)
+        ttk.Spinbox(scan_frame, from_=-1, to=99, width=4, textvariable=self.scan_max_depth).pack(side=tk.LEFT, padx=5)
+        ttk.Label(scan_frame, text="符号链接:").pack(side=tk.LEFT, padx=5)
+        ttk.Combobox(
+            scan_frame,
+            textvariable=self.scan_symlinks,
+            values=list(SYMLINK_POLICIES.values()),
+            state="readonly",
+            width=12
+        ).pack(side=tk.LEFT, padx=5)
+        
+        self.scan_label = ttk.Label(scan_frame, text="")
+        self.scan_label.pack(side=tk.LEFT, padx=10)
+        
         # 批量模式选项
         batch_frame = tk.Frame(self.root, bg="#f0f2f5")
         batch_frame.pack(pady=5, fill=tk.X, padx=20)
@@ -346,6 +5126,29 @@ class FormatConverter:
             variable=self.batch_mode
         ).pack(side=tk.LEFT, padx=5, pady=5)
         
+        # 并行任务数设置
+        ttk.Label(batch_frame, text="并行任务数:").pack(side=tk.LEFT, padx=(15, 5), pady=5)
+        ttk.Spinbox(
+            batch_frame,
+            from_=1,
+            to=64,
+            width=5,
+            textvariable=self.max_workers
+        ).pack(side=tk.LEFT, padx=5, pady=5)
+        
+        ttk.Checkbutton(
+            batch_frame,
+            text="跳过已转换且未变化的文件",
+            variable=self.skip_unchanged
+        ).pack(side=tk.LEFT, padx=(15, 5), pady=5)
+        
+        # 转换服务：多个窗口共用本机的一个服务，避免各自占满CPU
+        server_frame = tk.Frame(self.root, bg="#f0f2f5")
+        server_frame.pack(pady=5, fill=tk.X, padx=20)
+        ttk.Label(server_frame, text="转换服务地址:").pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Entry(server_frame, textvariable=self.server_url, width=30).pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Label(server_frame, text=f"（留空则在本机转换；如 http://127.0.0.1:{SERVER_PORT}）").pack(side=tk.LEFT, padx=5, pady=5)
+        
         # 输出路径选择区域
         output_frame = tk.Frame(self.root, bg="#f0f2f5")
         output_frame.pack(pady=10, fill=tk.X, padx=20)
@@ -393,6 +5196,17 @@ class FormatConverter:
         # 绑定滑块事件，实时显示质量值
         self.image_quality.trace_add("write", self.update_quality_label)
         
+        ttk.Label(self.image_options_frame, text="最大边长 (0=原尺寸):").pack(side=tk.LEFT, padx=(15, 5), pady=5)
+        self.max_dimension = tk.IntVar(value=0)
+        ttk.Spinbox(
+            self.image_options_frame,
+            from_=0,
+            to=20000,
+            increment=100,
+            width=7,
+            textvariable=self.max_dimension
+        ).pack(side=tk.LEFT, padx=5, pady=5)
+        
         # 按钮区域
         btn_frame = tk.Frame(self.root, bg="#f0f2f5")
         btn_frame.pack(pady=15)
@@ -404,6 +5218,22 @@ class FormatConverter:
         )
         self.convert_btn.pack(side=tk.LEFT, padx=10)
         
+        self.pause_btn = ttk.Button(
+            btn_frame, 
+            text="暂停", 
+            command=self.toggle_pause,
+            state=tk.DISABLED
+        )
+        self.pause_btn.pack(side=tk.LEFT, padx=10)
+        
+        self.cancel_btn = ttk.Button(
+            btn_frame, 
+            text="取消转换", 
+            command=self.cancel_conversion,
+            state=tk.DISABLED
+        )
+        self.cancel_btn.pack(side=tk.LEFT, padx=10)
+        
         open_folder_btn = ttk.Button(
             btn_frame, 
             text="打开输出文件夹", 
@@ -476,6 +5306,7 @@ class FormatConverter:
         # 绑定转换类型变化事件
         self.conversion_type.trace_add("write", self.update_format_options)
         self.target_format.trace_add("write", self.update_special_options)
+        self.route_targets["image_convert"].trace_add("write", self.update_special_options)
         self.update_format_options()
         self.update_special_options()
     
@@ -492,18 +5323,31 @@ class FormatConverter:
         self.image_options_frame.pack_forget()
         self.ico_options_frame.pack_forget()
         self.excel_options_frame.pack_forget()
+        self.media_options_frame.pack_forget()
+        self.route_frame.pack_forget()
         
-        if conv_type == "audio_convert":
-            self.format_options['values'] = ["mp3", "wav", "flac", "m4a", "ogg", "aac"]
-            self.target_format.set("mp3")
+        if conv_type == AUTO_CONVERSION:
+            # 混合文件：显示各类型的转换规则，以及音视频、图片、Excel的选项
+            self.route_frame.pack(pady=5, fill=tk.X, padx=20)
+            self.segment_checkbox.pack(side=tk.LEFT, padx=5, pady=5)
+            self.media_options_frame.pack(pady=5, fill=tk.X, padx=20)
+            self.excel_options_frame.pack(pady=5, fill=tk.X, padx=20)
+            self.update_special_options()
+        elif conv_type == "audio_convert":
+            self.format_options['values'] = TARGET_FORMATS[conv_type]
+            self.target_format.set(TARGET_FORMATS[conv_type][0])
             self.format_frame.pack(pady=5, fill=tk.X, padx=20)
+            self.segment_checkbox.pack_forget()
+            self.media_options_frame.pack(pady=5, fill=tk.X, padx=20)
         elif conv_type == "video_convert":
-            self.format_options['values'] = ["mp4", "avi", "mov", "mkv", "flv", "wmv"]
-            self.target_format.set("mp4")
+            self.format_options['values'] = TARGET_FORMATS[conv_type]
+            self.target_format.set(TARGET_FORMATS[conv_type][0])
             self.format_frame.pack(pady=5, fill=tk.X, padx=20)
+            self.segment_checkbox.pack(side=tk.LEFT, padx=5, pady=5)
+            self.media_options_frame.pack(pady=5, fill=tk.X, padx=20)
         elif conv_type == "image_convert":
-            self.format_options['values'] = ["jpg", "jpeg", "png", "bmp", "gif", "tiff", "webp", "ico"]
-            self.target_format.set("jpg")
+            self.format_options['values'] = TARGET_FORMATS[conv_type]
+            self.target_format.set(TARGET_FORMATS[conv_type][0])
             self.format_frame.pack(pady=5, fill=tk.X, padx=20)
             self.update_special_options()
         elif conv_type == "excel_to_pdf":
@@ -512,12 +5356,18 @@ class FormatConverter:
     
     def update_special_options(self, *args):
         """根据目标格式显示特殊选项（图片质量或ICO尺寸）"""
-        if self.conversion_type.get() != "image_convert":
+        conv_type = self.conversion_type.get()
+        if conv_type == AUTO_CONVERSION:
+            target_format = self.route_targets["image_convert"].get().lower()
+        elif conv_type == "image_convert":
+            target_format = self.target_format.get().lower()
+        else:
             return
-            
-        target_format = self.target_format.get().lower()
         
-        if target_format == "ico":
+        if target_format not in TARGET_FORMATS["image_convert"]:
+            self.image_options_frame.pack_forget()
+            self.ico_options_frame.pack_forget()
+        elif target_format == "ico":
             self.ico_options_frame.pack(pady=5, fill=tk.X, padx=20)
             self.image_options_frame.pack_forget()
         else:
@@ -543,6 +5393,8 @@ class FormatConverter:
             filetypes = [("视频文件", "*.mp4;*.avi;*.mov;*.mkv;*.flv;*.wmv"), ("所有文件", "*.*")]
         elif conv_type == "image_convert":
             filetypes = [("图片文件", "*.jpg;*.jpeg;*.png;*.bmp;*.gif;*.tiff;*.webp;*.ico"), ("所有文件", "*.*")]
+        elif conv_type == AUTO_CONVERSION:
+            filetypes = [("支持的文件", ";".join("*" + extension for extension in self.get_supported_extensions(conv_type))), ("所有文件", "*.*")]
         
         file_paths = filedialog.askopenfilenames(
             title="选择文件",
@@ -550,57 +5402,114 @@ class FormatConverter:
         )
         
         if file_paths:
+            self.cancel_scan()
             self.file_paths = list(file_paths)
             self.update_file_list_display()
             self.update_status(f"已选择 {len(self.file_paths)} 个文件")
     
     def browse_folder(self):
-        """浏览并选择文件夹，自动添加文件夹中所有支持的文件"""
+        """浏览并选择文件夹，在后台线程中扫描其中所有支持的文件，结果陆续显示在文件列表中"""
         folder_path = filedialog.askdirectory(title="选择文件夹")
-        if folder_path:
-            conv_type = self.conversion_type.get()
-            
-            # 根据转换类型获取文件扩展名
-            extensions = self.get_supported_extensions(conv_type)
-            
-            # 搜索文件夹中所有支持的文件
-            file_paths = []
-            for root, dirs, files in os.walk(folder_path):
-                for file in files:
-                    if any(file.lower().endswith(ext) for ext in extensions):
-                        file_paths.append(os.path.join(root, file))
-            
-            if file_paths:
-                self.file_paths = file_paths
-                self.update_file_list_display()
-                self.update_status(f"从文件夹 '{folder_path}' 中找到 {len(self.file_paths)} 个支持的文件")
-            else:
-                messagebox.showwarning("警告", f"在文件夹 '{folder_path}' 中未找到支持的文件")
+        if not folder_path:
+            return
+        
+        conv_type = self.conversion_type.get()
+        policies = {name: key for key, name in SYMLINK_POLICIES.items()}
+        try:
+            max_depth = int(self.scan_max_depth.get())
+        except (tk.TclError, ValueError):
+            max_depth = -1
+        scanner = DirectoryScanner(
+            folder_path,
+            self.get_supported_extensions(conv_type),
+            include=split_patterns(self.scan_include.get()),
+            exclude=split_patterns(self.scan_exclude.get()),
+            max_depth=None if max_depth < 0 else max_depth,
+            symlinks=policies.get(self.scan_symlinks.get(), "files"),
+        )
+        
+        self.cancel_scan()
+        self.scanner = scanner
+        self.file_paths = []
+        self.update_file_list_display()
+        self.cancel_scan_btn.config(state=tk.NORMAL)
+        self.scan_label.config(text="正在扫描...")
+        
+        # 扫描线程只把结果放入队列，由主线程定时取出并更新界面
+        results = queue.Queue()
+        scan_thread = threading.Thread(target=self.run_scan, args=(scanner, results))
+        scan_thread.daemon = True
+        scan_thread.start()
+        self.root.after(100, self.drain_scan_results, scanner, results, folder_path)
+    
+    def run_scan(self, scanner, results):
+        """后台线程：扫描文件夹，分批放入结果队列（不访问Tk控件）"""
+        try:
+            for batch in scanner.scan_batches():
+                results.put(("batch", batch))
+            results.put(("done", None))
+        except Exception as e:
+            results.put(("error", e))
+    
+    def drain_scan_results(self, scanner, results, folder_path):
+        """主线程：取出扫描结果追加到文件列表，扫描结束前每100毫秒执行一次"""
+        if scanner is not self.scanner:
+            return  # 已被新的扫描取代
+        
+        new_paths = []
+        finished = False
+        error = None
+        try:
+            while True:
+                kind, payload = results.get_nowait()
+                if kind == "batch":
+                    new_paths.extend(payload)
+                else:
+                    finished = True
+                    error = payload
+                    break
+        except queue.Empty:
+            pass
+        if new_paths:
+            self.append_file_list_display(new_paths)
+        
+        if not finished:
+            self.scan_label.config(text=f"正在扫描: 已找到 {len(self.file_paths)} 个文件，已扫描 {scanner.directories} 个目录")
+            self.root.after(100, self.drain_scan_results, scanner, results, folder_path)
+            return
+        
+        self.scanner = None
+        self.cancel_scan_btn.config(state=tk.DISABLED)
+        self.scan_label.config(text=f"共 {len(self.file_paths)} 个文件")
+        if error is not None:
+            self.update_status(f"扫描文件夹失败: {str(error)}")
+        elif scanner.cancelled:
+            self.update_status(f"已取消扫描，保留已找到的 {len(self.file_paths)} 个文件")
+        elif self.file_paths:
+            unreadable = f"（{scanner.errors} 个目录无法读取）" if scanner.errors else ""
+            self.update_status(f"从文件夹 '{folder_path}' 中找到 {len(self.file_paths)} 个支持的文件{unreadable}")
+        else:
+            messagebox.showwarning("警告", f"在文件夹 '{folder_path}' 中未找到支持的文件")
+    
+    def cancel_scan(self):
+        """取消正在进行的文件夹扫描，已找到的文件保留在列表中"""
+        if self.scanner:
+            self.scanner.cancel()
     
     def get_supported_extensions(self, conv_type):
         """根据转换类型返回支持的文件扩展名"""
-        if conv_type == "pdf_to_word":
-            return [".pdf"]
-        elif conv_type == "word_to_pdf":
-            return [".doc", ".docx"]
-        elif conv_type == "excel_to_pdf":
-            return [".xls", ".xlsx"]
-        elif conv_type == "ppt_to_pdf":
-            return [".ppt", ".pptx"]
-        elif conv_type == "audio_convert":
-            return [".mp3", ".wav", ".flac", ".m4a", ".ogg", ".aac"]
-        elif conv_type == "video_convert":
-            return [".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv"]
-        elif conv_type == "image_convert":
-            return [".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff", ".webp", ".ico"]
-        return []
+        if conv_type == AUTO_CONVERSION:
+            return supported_extensions(conv_type, self.collect_routes())
+        return supported_extensions(conv_type)
     
     def update_file_list_display(self):
         """更新文件列表显示"""
-        self.file_entry.delete(1.0, tk.END)
-        if self.file_paths:
-            file_list = "\n".join([os.path.basename(path) for path in self.file_paths])
-            self.file_entry.insert(1.0, file_list)
+        self.file_list.set_files(self.file_paths)
+    
+    def append_file_list_display(self, file_paths):
+        """把新找到的文件追加到文件列表和显示中"""
+        self.file_paths.extend(file_paths)
+        self.file_list.append_files(file_paths)
     
     def browse_output_dir(self):
         """选择输出文件保存路径"""
@@ -612,360 +5521,128 @@ class FormatConverter:
             self.update_status(f"已选择保存路径: {selected_dir}")
     
     def update_status(self, message):
-        """更新状态文本区域"""
-        self.status_text.config(state=tk.NORMAL)
-        self.status_text.insert(tk.END, message + "\n")
-        self.status_text.see(tk.END)
-        self.status_text.config(state=tk.DISABLED)
+        """添加一行日志（可在任意线程中调用）"""
+        self.ui_events.put(("log", message))
     
     def update_progress(self, value):
-        """更新进度条"""
-        self.progress_var.set(value)
-        self.root.update_idletasks()
-    
-    def update_batch_progress(self, current, total, filename):
-        """更新批量转换进度显示"""
-        progress_text = f"批量转换进度: {current}/{total} - 当前文件: {filename}"
-        self.batch_progress_label.config(text=progress_text)
-    
-    def open_output_folder(self):
-        """打开输出文件夹"""
-        try:
-            os.startfile(self.output_dir)
-            self.update_status(f"已打开输出文件夹: {self.output_dir}")
-        except Exception as e:
-            self.update_status(f"打开文件夹失败: {str(e)}")
-            messagebox.showerror("错误", f"打开文件夹失败: {str(e)}")
-    
-    def run_ffmpeg_silently(self, input_file, output_file, output_format):
-        """静默运行ffmpeg，不显示命令行窗口"""
-        try:
-            # 构建ffmpeg命令
-            cmd = [
-                self.ffmpeg_path,
-                '-i', input_file,
-                '-y',  # 覆盖输出文件
-                output_file
-            ]
-            
-            # Windows系统下隐藏命令行窗口
-            if platform.system() == "Windows":
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                startupinfo.wShowWindow = 0  # 隐藏窗口
-                
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    startupinfo=startupinfo,
-                    creationflags=subprocess.CREATE_NO_WINDOW  # 不创建窗口
-                )
-            else:
-                # 非Windows系统
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE
-                )
-            
-            # 等待进程完成
-            stdout, stderr = process.communicate()
-            
-            if process.returncode != 0:
-                error_msg = stderr.decode('utf-8', errors='ignore') if stderr else "未知错误"
-                raise Exception(f"FFmpeg转换失败: {error_msg}")
-                
-            return True
-            
-        except Exception as e:
-            raise Exception(f"FFmpeg执行错误: {str(e)}")
-    
-    def pdf_to_word(self, file_path):
-        """PDF转Word"""
-        try:
-            self.update_status(f"开始PDF转Word: {os.path.basename(file_path)}")
-            self.update_progress(10)
-            
-            file_name = os.path.splitext(os.path.basename(file_path))[0]
-            output_file = os.path.join(self.output_dir, f"{file_name}.docx")
-            
-            self.update_status(f"正在转换: {os.path.basename(file_path)}")
-            self.update_progress(30)
-            
-            p2w = Converter(file_path)
-            self.update_progress(50)
-            
-            p2w.convert(output_file, start=0, end=None)
-            self.update_progress(80)
-            
-            p2w.close()
-            self.update_progress(100)
-            
-            return output_file
-            
-        except Exception as e:
-            raise Exception(f"PDF转Word失败: {str(e)}")
-    
-    def word_to_pdf(self, file_path):
-        """Word转PDF - 包含错误处理和备选方案"""
-        try:
-            if not docx2pdf_available:
-                raise Exception("docx2pdf库未安装，请先运行 'pip install docx2pdf'")
-                
-            self.update_status(f"开始Word转PDF: {os.path.basename(file_path)}")
-            self.update_progress(30)
-            
-            file_name = os.path.splitext(os.path.basename(file_path))[0]
-            output_file = os.path.join(self.output_dir, f"{file_name}.pdf")
-            
-            self.update_status(f"正在转换: {os.path.basename(file_path)}")
-            
-            # 使用docx2pdf库的convert函数
-            convert(file_path, output_file)
-            self.update_progress(100)
-            
-            return output_file
-            
-        except Exception as e:
-            # 如果docx2pdf失败，尝试使用Word的COM接口作为备选方案
-            try:
-                self.update_status(f"尝试备选方案转换: {os.path.basename(file_path)}")
-                
-                # 使用Word的COM接口
-                word = win32com.client.Dispatch("Word.Application")
-                word.Visible = False
-                doc = word.Documents.Open(file_path)
-                doc.SaveAs(output_file, FileFormat=17)  # 17是PDF格式
-                doc.Close()
-                word.Quit()
-                
-                self.update_progress(100)
-                return output_file
-                
-            except Exception as e2:
-                raise Exception(f"Word转PDF失败: 主方案[{str(e)}], 备选方案[{str(e2)}]")
-    
-    def excel_to_pdf(self, file_path):
-        """Excel转PDF - 修复表格显示不全问题"""
-        try:
-            self.update_status(f"开始Excel转PDF: {os.path.basename(file_path)}")
-            self.update_progress(20)
-            
-            file_name = os.path.splitext(os.path.basename(file_path))[0]
-            output_file = os.path.join(self.output_dir, f"{file_name}.pdf")
-            
-            self.update_status(f"正在转换: {os.path.basename(file_path)}")
-            self.update_progress(40)
-            
-            # 创建Excel应用实例
-            excel = win32com.client.Dispatch("Excel.Application")
-            excel.Visible = False
-            excel.DisplayAlerts = False  # 禁用警告
-            
-            # 打开工作簿
-            workbook = excel.Workbooks.Open(file_path)
-            
-            # 遍历所有工作表并设置页面
-            for worksheet in workbook.Worksheets:
-                # 选择当前工作表
-                worksheet.Select()
-                
-                # 设置页面方向
-                if self.excel_orientation.get() == "landscape":
-                    worksheet.PageSetup.Orientation = 2  # 2 表示横向
-                else:
-                    worksheet.PageSetup.Orientation = 1  # 1 表示纵向
-                
-                # 设置自动调整到一页
-                if self.excel_fit_to_page.get():
-                    worksheet.PageSetup.Zoom = False  # 禁用缩放
-                    worksheet.PageSetup.FitToPagesWide = 1  # 宽度适应1页
-                    worksheet.PageSetup.FitToPagesTall = False  # 高度自动
-                else:
-                    worksheet.PageSetup.Zoom = 100  # 使用100%缩放
-            
-            self.update_progress(60)
-            
-            # 导出为PDF
-            workbook.ExportAsFixedFormat(0, output_file)  # 0 表示PDF格式
-            
-            # 清理资源
-            workbook.Close(SaveChanges=False)  # 不保存对原文件的修改
-            excel.Quit()
-            
-            # 释放COM对象
-            del workbook
-            del excel
-            
-            self.update_progress(100)
-            return output_file
-            
-        except Exception as e:
-            raise Exception(f"Excel转PDF失败: {str(e)}")
-    
-    def ppt_to_pdf(self, file_path):
-        """PPT转PDF"""
-        try:
-            self.update_status(f"开始PPT转PDF: {os.path.basename(file_path)}")
-            self.update_progress(20)
-            
-            file_name = os.path.splitext(os.path.basename(file_path))[0]
-            output_file = os.path.join(self.output_dir, f"{file_name}.pdf")
-            
-            self.update_status(f"正在转换: {os.path.basename(file_path)}")
-            self.update_progress(40)
-            
-            powerpoint = comtypes.client.CreateObject("Powerpoint.Application")
-            powerpoint.Visible = 1
-            presentation = powerpoint.Presentations.Open(file_path)
-            self.update_progress(60)
-            
-            presentation.SaveAs(output_file, 32)  # 32 表示PDF格式
-            presentation.Close()
-            powerpoint.Quit()
-            
-            self.update_progress(100)
-            return output_file
-            
-        except Exception as e:
-            raise Exception(f"PPT转PDF失败: {str(e)}")
-    
-    def audio_convert(self, file_path):
-        """音频格式转换"""
-        try:
-            # 检查ffmpeg是否存在
-            if not self.ffmpeg_path or not os.path.exists(self.ffmpeg_path):
-                raise Exception(f"无法找到ffmpeg.exe，音频转换功能无法使用")
-                
-            self.update_status(f"开始音频格式转换: {os.path.basename(file_path)}")
-            self.update_progress(20)
-            
-            file_name = os.path.splitext(os.path.basename(file_path))[0]
-            output_format = self.target_format.get()
-            output_file = os.path.join(self.output_dir, f"{file_name}.{output_format}")
-            
-            self.update_status(f"正在转换为{output_format}: {os.path.basename(file_path)}")
-            self.update_progress(40)
-            
-            # 使用静默方式运行ffmpeg
-            self.run_ffmpeg_silently(file_path, output_file, output_format)
-            
-            self.update_progress(100)
-            return output_file
-            
-        except Exception as e:
-            raise Exception(f"音频转换失败: {str(e)}")
-    
-    def video_convert(self, file_path):
-        """视频格式转换"""
-        try:
-            # 检查ffmpeg是否存在
-            if not self.ffmpeg_path or not os.path.exists(self.ffmpeg_path):
-                raise Exception(f"无法找到ffmpeg.exe，视频转换功能无法使用")
-                
-            self.update_status(f"开始视频格式转换: {os.path.basename(file_path)}")
-            self.update_progress(20)
-            
-            file_name = os.path.splitext(os.path.basename(file_path))[0]
-            output_format = self.target_format.get()
-            output_file = os.path.join(self.output_dir, f"{file_name}.{output_format}")
-            
-            self.update_status(f"正在转换为{output_format}: {os.path.basename(file_path)}")
-            self.update_progress(40)
-            
-            # 使用静默方式运行ffmpeg
-            self.run_ffmpeg_silently(file_path, output_file, output_format)
-            
-            self.update_progress(100)
-            return output_file
-            
+        """更新进度条（可在任意线程中调用，同一刷新周期内只显示最新的进度）"""
+        self.ui_events.put(("progress", value))
+    
+    def update_batch_progress(self, current, total, filename):
+        """更新批量转换进度显示（可在任意线程中调用）"""
+        progress_text = f"批量转换进度: {current}/{total} - 最近完成: {filename}"
+        self.ui_events.put(("batch", progress_text))
+    
+    def call_in_ui(self, func, *args, **kwargs):
+        """在主线程中执行func（用于后台线程更新控件、弹出对话框）"""
+        self.ui_events.put(("call", (func, args, kwargs)))
+    
+    def drain_ui_events(self):
+        """主线程：取出队列中的界面更新，日志一次性追加，进度只取最新值"""
+        lines = []
+        progress = None
+        batch_text = None
+        try:
+            for _ in range(UI_EVENTS_PER_FRAME):
+                kind, payload = self.ui_events.get_nowait()
+                if kind == "log":
+                    lines.append(payload)
+                elif kind == "progress":
+                    progress = payload
+                elif kind == "batch":
+                    batch_text = payload
+                else:
+                    # 调用需要按顺序执行，先写入之前的日志
+                    self.append_status_lines(lines)
+                    lines = []
+                    func, args, kwargs = payload
+                    func(*args, **kwargs)
+        except queue.Empty:
+            pass
         except Exception as e:
-            raise Exception(f"视频转换失败: {str(e)}")
+            lines.append(f"界面更新出错: {str(e)}")
+        finally:
+            self.append_status_lines(lines)
+            if progress is not None:
+                self.progress_var.set(progress)
+            if batch_text is not None:
+                self.batch_progress_label.config(text=batch_text)
+            self.root.after(UI_REFRESH_MS, self.drain_ui_events)
     
-    def image_convert(self, file_path):
-        """图片格式转换，包含ICO转换和JPG转换修复"""
+    def append_status_lines(self, lines):
+        """把多行日志一次性追加到状态文本区域，只保留最近STATUS_LOG_MAX_LINES行"""
+        if not lines:
+            return
+        lines = lines[-STATUS_LOG_MAX_LINES:]
+        self.status_text.config(state=tk.NORMAL)
+        self.status_text.insert(tk.END, "\n".join(lines) + "\n")
+        line_count = int(self.status_text.index("end-1c").split(".")[0]) - 1
+        if line_count > STATUS_LOG_MAX_LINES:
+            self.status_text.delete("1.0", f"{line_count - STATUS_LOG_MAX_LINES + 1}.0")
+        self.status_text.see(tk.END)
+        self.status_text.config(state=tk.DISABLED)
+    
+    def open_output_folder(self):
+        """打开输出文件夹"""
         try:
-            # 检查PIL是否可用
-            if not self.pil_available:
-                raise Exception("Pillow库未安装，请先运行 'pip install pillow'")
-                
-            self.update_status(f"开始图片格式转换: {os.path.basename(file_path)}")
-            self.update_progress(20)
-            
-            file_name = os.path.splitext(os.path.basename(file_path))[0]
-            output_format = self.target_format.get().upper()
-            output_file = os.path.join(self.output_dir, f"{file_name}.{output_format.lower()}")
-            
-            self.update_status(f"正在转换为{output_format}: {os.path.basename(file_path)}")
-            self.update_progress(40)
-            
-            # 打开图片
-            try:
-                with Image.open(file_path) as img:
-                    # 处理ICO格式
-                    if output_format == "ICO":
-                        # 获取用户选择的尺寸
-                        selected_sizes = [self.ico_sizes[i] for i, var in enumerate(self.selected_sizes) if var.get()]
-                        if not selected_sizes:
-                            raise Exception("请至少选择一个ICO图标尺寸")
-                            
-                        # 保存多尺寸ICO
-                        img.save(output_file, sizes=selected_sizes)
-                    
-                    else:
-                        # 处理透明通道问题（针对JPG等不支持透明的格式）
-                        if output_format in ["JPG", "JPEG", "BMP"] and img.mode in ["RGBA", "LA", "P"]:
-                            # 对于带透明通道的图片，创建白色背景
-                            if img.mode == "P":
-                                # 处理调色板图像
-                                img = img.convert("RGBA")
-                                
-                            background = Image.new("RGB", img.size, (255, 255, 255))
-                            # 处理alpha通道
-                            background.paste(img, mask=img.split()[-1])
-                            img = background
-                        elif output_format in ["JPG", "JPEG"] and img.mode in ["CMYK"]:
-                            # 处理CMYK模式图片转JPG
-                            img = img.convert('RGB')
-                    
-                        # 获取用户设置的质量值
-                        quality = self.image_quality.get()
-                        
-                        # 保存为目标格式
-                        if output_format in ["JPG", "JPEG"]:
-                            # 确保图片是RGB模式
-                            if img.mode != 'RGB':
-                                img = img.convert('RGB')
-                            img.save(output_file, output_format, quality=quality, optimize=True, progressive=True)
-                        elif output_format == "PNG":
-                            # PNG格式使用压缩级别参数
-                            compress_level = 9 - int(quality / 11)  # 将1-100转换为0-9
-                            img.save(output_file, output_format, compress_level=compress_level)
-                        elif output_format == "GIF":
-                            # 处理GIF动画
-                            if img.is_animated:
-                                frames = []
-                                for frame in range(img.n_frames):
-                                    img.seek(frame)
-                                    frames.append(img.copy())
-                                frames[0].save(output_file, format=output_format, save_all=True, append_images=frames[1:], loop=0)
-                            else:
-                                img.save(output_file, output_format)
-                        else:
-                            img.save(output_file, output_format)
-            
-            except Exception as e:
-                raise Exception(f"图片处理错误: {str(e)}")
-            
-            self.update_progress(100)
-            return output_file
-            
+            os.startfile(self.output_dir)
+            self.update_status(f"已打开输出文件夹: {self.output_dir}")
         except Exception as e:
-            raise Exception(f"图片转换失败: {str(e)}")
+            self.update_status(f"打开文件夹失败: {str(e)}")
+            messagebox.showerror("错误", f"打开文件夹失败: {str(e)}")
+    
+    def collect_options(self):
+        """收集当前界面上的转换选项"""
+        preset_keys = {name: key for key, name in ENCODER_PRESET_NAMES.items()}
+        try:
+            threads = max(0, int(self.ffmpeg_threads.get()))
+        except (tk.TclError, ValueError):
+            threads = 0
+        try:
+            max_dimension = max(0, int(self.max_dimension.get()))
+        except (tk.TclError, ValueError):
+            max_dimension = 0
+        options = {
+            "target_format": self.target_format.get(),
+            "image_quality": self.image_quality.get(),
+            "max_dimension": max_dimension,
+            "ico_sizes": [self.ico_sizes[i] for i, var in enumerate(self.selected_sizes) if var.get()],
+            "excel_orientation": self.excel_orientation.get(),
+            "excel_fit_to_page": self.excel_fit_to_page.get(),
+            "stream_copy": self.stream_copy.get(),
+            "preset": preset_keys.get(self.encoder_preset.get(), "default"),
+            "threads": threads,
+            "segment_parallel": self.segment_parallel.get(),
+        }
+        if self.conversion_type.get() == AUTO_CONVERSION:
+            options["routes"] = self.collect_routes()
+        return options
+    
+    def collect_routes(self):
+        """收集混合文件各类型的转换规则，不转换的类型不包含在内"""
+        routes = {}
+        for route_type, variable in self.route_targets.items():
+            value = variable.get()
+            if route_type not in TARGET_FORMATS:
+                if value:
+                    routes[route_type] = None
+            elif value in TARGET_FORMATS[route_type]:
+                routes[route_type] = value
+        return routes
+    
+    def create_batch_job(self, index, conv_type, options, file_path):
+        """根据转换类型创建批量任务"""
+        lane = CONVERSION_LANES[conv_type]
+        args = (conv_type, file_path, self.output_dir, options, self.ffmpeg_path)
+        # 进程池中的任务无法回调界面，只有线程中的任务才输出过程日志
+        kwargs = {} if lane == "process" else {"status": self.update_status}
+        return BatchJob(index, file_path, lane, _run_conversion_job, args, kwargs)
     
     def start_conversion(self):
         """开始转换过程（在新线程中执行）"""
+        if self.scanner:
+            messagebox.showwarning("警告", "正在扫描文件夹，请等待扫描完成或取消扫描")
+            return
         if not self.file_paths:
             messagebox.showwarning("警告", "请选择至少一个文件")
             return
@@ -977,83 +5654,1759 @@ class FormatConverter:
             self.output_entry.insert(0, self.output_dir)
         os.makedirs(self.output_dir, exist_ok=True)
         
+        # 后台线程和子进程中不能访问Tk变量，在主线程中先收集转换选项；继续未完成的批次时使用当时的选项
+        if self.resume_journal:
+            self.job_options = dict(self.resume_journal.header["options"])
+            self.incremental = self.resume_journal.header["settings"].get("incremental", True)
+        else:
+            self.job_options = self.collect_options()
+            self.incremental = self.skip_unchanged.get()
+        self.job_conversion_type = self.conversion_type.get()
+        # 继续未完成的批次总是在本机转换
+        self.job_server_url = None if self.resume_journal else self.server_url.get().strip()
+        try:
+            self.worker_count = max(1, int(self.max_workers.get()))
+        except (tk.TclError, ValueError):
+            self.worker_count = default_worker_count()
+            self.max_workers.set(self.worker_count)
+        
+        # 交给转换服务时由服务按它的并行任务数分配线程
+        if not self.job_server_url:
+            # 多个ffmpeg并行时按CPU核心数分配线程，避免过度占用
+            if self.job_options["threads"] == 0 and self.conversion_type.get() in ("audio_convert", "video_convert", AUTO_CONVERSION):
+                self.job_options["threads"] = cpu_budget(min(self.worker_count, len(self.file_paths)))
+            # 多个PDF同时转换时，每个PDF的页面解析进程数同样按核心数分配
+            if self.conversion_type.get() in ("pdf_to_word", AUTO_CONVERSION):
+                self.job_options["pdf_workers"] = cpu_budget(min(self.worker_count, len(self.file_paths)))
+        
+        self.batch_control = BatchControl()
         self.convert_btn.config(state=tk.DISABLED)
+        # 转换服务中的任务不能暂停
+        self.pause_btn.config(state=tk.DISABLED if self.job_server_url else tk.NORMAL, text="暂停")
+        self.cancel_btn.config(state=tk.NORMAL)
         self.update_progress(0)
         
-        conversion_thread = threading.Thread(
+        self.conversion_thread = threading.Thread(
             target=self.perform_conversion
         )
-        conversion_thread.daemon = True
-        conversion_thread.start()
+        self.conversion_thread.daemon = True
+        self.conversion_thread.start()
+    
+    def toggle_pause(self):
+        """暂停或继续正在进行的批量转换，暂停时挂起正在运行的ffmpeg进程"""
+        control = self.batch_control
+        if not control or control.cancelled:
+            return
+        if control.paused:
+            control.resume()
+            self.pause_btn.config(text="暂停")
+            self.update_status("继续转换")
+        else:
+            control.pause()
+            self.pause_btn.config(text="继续")
+            self.update_status("已暂停，正在进行的ffmpeg转换已挂起")
+    
+    def cancel_conversion(self):
+        """取消正在进行的批量转换，已完成的文件保留，之后可以继续未完成的部分"""
+        control = self.batch_control
+        if not control or control.cancelled:
+            return
+        control.cancel()
+        self.pause_btn.config(state=tk.DISABLED, text="暂停")
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.update_status("正在取消，等待正在进行的任务结束...")
+    
+    def finish_conversion_controls(self):
+        """批量转换结束后恢复按钮状态"""
+        self.batch_control = None
+        self.convert_btn.config(state=tk.NORMAL)
+        self.pause_btn.config(state=tk.DISABLED, text="暂停")
+        self.cancel_btn.config(state=tk.DISABLED)
+    
+    def on_close(self):
+        """关闭窗口：转换进行中时先确认，取消后等待任务结束再退出，未完成的部分下次启动时可以继续"""
+        if self.conversion_thread and self.conversion_thread.is_alive():
+            if not messagebox.askyesno("确认", "正在转换，确定要退出吗？\n未完成的文件下次启动时可以继续转换"):
+                return
+            self.cancel_conversion()
+            self.wait_and_close()
+            return
+        self.root.destroy()
+    
+    def wait_and_close(self):
+        if self.conversion_thread and self.conversion_thread.is_alive():
+            self.root.after(100, self.wait_and_close)
+            return
+        self.root.destroy()
+    
+    def offer_resume(self):
+        """启动时发现未完成的批量转换，询问是否继续；不继续则丢弃该批次"""
+        if self.batch_control:
+            return
+        paths = BatchJournal.find_unfinished()
+        if not paths:
+            return
+        try:
+            journal = BatchJournal.load(paths[0])
+        except (OSError, ValueError, KeyError):
+            return
+        header = journal.header
+        if header["conversion_type"] not in CONVERSION_LANES and header["conversion_type"] != AUTO_CONVERSION:
+            journal.close()
+            return
+        if not journal.pending_files():
+            journal.finish()
+            return
+        if not messagebox.askyesno("继续转换", f"上次有未完成的{journal.describe()}。\n是否继续转换剩余的文件？"):
+            journal.finish()
+            return
+        
+        removed = remove_stale_partials(header["output_dir"])
+        if removed:
+            self.update_status(f"已清理 {removed} 个中断后残留的临时文件")
+        self.conversion_type.set(header["conversion_type"])
+        self.output_entry.delete(0, tk.END)
+        self.output_entry.insert(0, header["output_dir"])
+        self.file_paths = journal.pending_files()
+        self.update_file_list_display()
+        self.resume_journal = journal
+        self.update_status(f"继续{journal.describe()}，剩余 {len(self.file_paths)} 个")
+        self.start_conversion()
     
     def perform_conversion(self):
-        """执行转换"""
+        """执行转换（并行执行，结果按完成顺序显示）"""
+        if self.job_server_url:
+            self.perform_remote_conversion()
+            return
+        manifest = None
+        schedule = None
+        completed = False
+        control = self.batch_control
+        # 记录批量转换日志，取消、关闭窗口或崩溃后下次启动时可以继续
+        journal, self.resume_journal = self.resume_journal, None
         try:
-            conv_type = self.conversion_type.get()
+            conv_type = self.job_conversion_type
             successful_conversions = 0
             failed_conversions = 0
+            cancelled_conversions = 0
+            if journal is None:
+                journal = BatchJournal.create(conv_type, self.output_dir, self.job_options, self.file_paths, {"incremental": self.incremental})
+            
+            # 文件列表中各文件的行号，用于更新每个文件的状态
+            rows = {}
+            for index, file_path in enumerate(self.file_paths):
+                rows.setdefault(file_path, index)
+            self.call_in_ui(self.file_list.reset_states)
+            
+            # 按转换类型分组，混合类型时识别每个文件的类型
+            groups, unrouted = route_batch(conv_type, self.file_paths, self.job_options)
+            for file_path, file_type in unrouted:
+                self.update_status(f"跳过: {os.path.basename(file_path)} - {describe_unrouted(file_type)}")
+                self.call_in_ui(self.file_list.update_file, rows[file_path], "skipped", output=describe_unrouted(file_type))
+            
+            # 增量转换：源文件和选项都未变化、输出文件仍然有效的跳过
+            skipped = []
+            if self.incremental:
+                manifest = ConversionManifest()
+                for index, (group_type, group_files, group_options) in enumerate(groups):
+                    group_files, group_skipped = manifest.partition(group_type, group_files, self.output_dir, group_options)
+                    groups[index] = (group_type, group_files, group_options)
+                    skipped.extend(group_skipped)
+                if skipped:
+                    self.update_status(f"跳过 {len(skipped)} 个已转换且未变化的文件")
+                for file_path, output in skipped:
+                    self.call_in_ui(self.file_list.update_file, rows[file_path], "skipped", output=output)
+            # 每个文件的转换类型和选项
+            routes = {file_path: (group_type, group_options) for group_type, group_files, group_options in groups for file_path in group_files}
+            if conv_type == AUTO_CONVERSION and routes:
+                type_counts = collections.Counter(route[0] for route in routes.values())
+                self.update_status("识别文件类型: " + "，".join(f"{CONVERSION_TYPE_NAMES[group_type]} {count} 个" for group_type, count in type_counts.items()))
+            
+            # 内容相同的文件只转换一次
+            dedup = DuplicatePlan(list(routes), {file_path: route[0] for file_path, route in routes.items()})
+            file_paths = dedup.unique
+            if dedup.duplicate_count:
+                self.update_status(f"发现 {dedup.duplicate_count} 个内容重复的文件，将复用相同内容的转换结果")
+            
+            self.total_files = len(file_paths)
+            self.current_file_index = 0
             
-            self.total_files = len(self.file_paths)
+            executor = BatchExecutor(self.worker_count)
+            # 按预计耗时安排开始顺序：最长的任务先开始，并行任务数较多时留一个通道先处理小文件
+            if file_paths:
+                self.update_status("正在估算各文件的转换耗时...")
+                schedule = BatchSchedule([(routes[file_path][0], file_path, routes[file_path][1]) for file_path in file_paths], executor, self.ffmpeg_path)
+                file_paths = schedule.file_paths
+                self.update_status(schedule.describe())
+            
+            jobs = [self.create_batch_job(i, *routes[file_path], file_path) for i, file_path in enumerate(file_paths)]
+            self.update_status(f"开始批量转换: 共 {self.total_files} 个文件，并行任务数 {executor.max_workers}")
             
-            for i, file_path in enumerate(self.file_paths):
-                self.current_file_index = i + 1
+            method_counts = collections.Counter()
+            metrics = ConversionMetrics()
+            
+            def on_result(job, result, error):
+                nonlocal successful_conversions, failed_conversions, cancelled_conversions
+                self.current_file_index += 1
+                job_type, job_options = routes[job.file_path]
+                metrics.record(job_type, job.file_path, result, error, job.queued)
+                if schedule and error is None:
+                    schedule.observe(job.file_path, result)
                 
                 # 更新批量转换进度显示
-                self.update_batch_progress(self.current_file_index, self.total_files, os.path.basename(file_path))
+                self.update_batch_progress(self.current_file_index, self.total_files, os.path.basename(job.file_path))
                 
-                try:
-                    output_file = ""
-                    
-                    if conv_type == "pdf_to_word":
-                        output_file = self.pdf_to_word(file_path)
-                    elif conv_type == "word_to_pdf":
-                        output_file = self.word_to_pdf(file_path)
-                    elif conv_type == "excel_to_pdf":
-                        output_file = self.excel_to_pdf(file_path)
-                    elif conv_type == "ppt_to_pdf":
-                        output_file = self.ppt_to_pdf(file_path)
-                    elif conv_type == "audio_convert":
-                        output_file = self.audio_convert(file_path)
-                    elif conv_type == "video_convert":
-                        output_file = self.video_convert(file_path)
-                    elif conv_type == "image_convert":
-                        output_file = self.image_convert(file_path)
-                    
-                    self.update_status(f"✓ 转换成功: {os.path.basename(file_path)} -> {os.path.basename(output_file)}")
-                    successful_conversions += 1
-                    
-                except Exception as e:
-                    self.update_status(f"✗ 转换失败: {os.path.basename(file_path)} - {str(e)}")
-                    failed_conversions += 1
+                duplicates, duplicate_errors = dedup.materialize(job.file_path, result["output"]) if error is None else ([], [])
                 
-                # 更新总体进度
-                overall_progress = (self.current_file_index / self.total_files) * 100
-                self.update_progress(overall_progress)
+                if isinstance(error, ConversionCancelled):
+                    duplicates = [job.file_path] + dedup.duplicates.get(job.file_path, [])
+                    for file_path in duplicates:
+                        self.call_in_ui(self.file_list.update_file, rows[file_path], "cancelled")
+                    cancelled_conversions += len(duplicates)
+                elif error is None:
+                    method = result.get("method")
+                    method_text = f"（{CONVERSION_METHOD_NAMES[method]}）" if method else ""
+                    if method:
+                        method_counts[method] += 1
+                    if manifest:
+                        manifest.record(job_type, job.file_path, self.output_dir, job_options, result["output"], method, dedup.hashes.get(job.file_path))
+                        for duplicate, duplicate_output in duplicates:
+                            manifest.record(job_type, duplicate, self.output_dir, job_options, duplicate_output, method, dedup.hashes.get(duplicate))
+                    journal.mark_done(job.file_path, result["output"])
+                    for duplicate, duplicate_output in duplicates:
+                        journal.mark_done(duplicate, duplicate_output)
+                    self.update_status(f"✓ 转换成功: {os.path.basename(job.file_path)} -> {os.path.basename(result['output'])}{method_text}")
+                    self.call_in_ui(self.file_list.update_file, rows[job.file_path], "done", result.get("elapsed"), result["output"])
+                    for duplicate, duplicate_output in duplicates:
+                        self.update_status(f"✓ 复用转换结果: {os.path.basename(duplicate)} -> {os.path.basename(duplicate_output)}")
+                        self.call_in_ui(self.file_list.update_file, rows[duplicate], "duplicate", output=duplicate_output)
+                    successful_conversions += 1 + len(duplicates)
+                    # 没能生成输出的重复文件单独记为失败，留在日志中，继续转换时重新处理
+                    for duplicate, message in duplicate_errors:
+                        self.update_status(f"✗ 转换失败: {os.path.basename(duplicate)} - {message}")
+                        self.call_in_ui(self.file_list.update_file, rows[duplicate], "failed", output=message)
+                    failed_conversions += len(duplicate_errors)
+                else:
+                    duplicates = dedup.duplicates.get(job.file_path, [])
+                    self.update_status(f"✗ 转换失败: {os.path.basename(job.file_path)} - {str(error)}")
+                    self.call_in_ui(self.file_list.update_file, rows[job.file_path], "failed", output=str(error))
+                    for duplicate in duplicates:
+                        self.update_status(f"✗ 转换失败: {os.path.basename(duplicate)} - 与 {os.path.basename(job.file_path)} 内容相同")
+                        self.call_in_ui(self.file_list.update_file, rows[duplicate], "failed", output=str(error))
+                    failed_conversions += 1 + len(duplicates)
+            
+            executor.run(jobs, on_result, on_progress=self.update_progress, control=control)
+            completed = not control.cancelled
             
             # 清空批量进度显示
-            self.batch_progress_label.config(text="")
+            self.ui_events.put(("batch", ""))
             
             # 显示转换结果摘要
             summary = f"批量转换完成！成功: {successful_conversions} 个，失败: {failed_conversions} 个"
+            if control.cancelled:
+                summary = f"批量转换已取消！成功: {successful_conversions} 个，失败: {failed_conversions} 个，未转换: {cancelled_conversions} 个"
+            if skipped:
+                summary += f"，跳过未变化: {len(skipped)} 个"
+            if unrouted:
+                summary += f"，未识别或未选择的类型: {len(unrouted)} 个"
+            if method_counts:
+                summary += f"（{describe_methods(method_counts)}）"
             self.update_status(summary)
+            if dedup.duplicate_count:
+                self.update_status(dedup.describe())
+            for stats in executor.office_stats.values():
+                self.update_status(describe_office_stats(stats))
+            if jobs:
+                self.update_status(metrics.describe())
             
-            if failed_conversions == 0:
-                messagebox.showinfo("成功", f"所有文件转换完成！\n成功转换 {successful_conversions} 个文件")
+            skipped_text = f"\n跳过未变化的文件 {len(skipped)} 个" if skipped else ""
+            if unrouted:
+                skipped_text += f"\n未识别或未选择的类型 {len(unrouted)} 个"
+            if control.cancelled:
+                self.call_in_ui(messagebox.showinfo, "已取消",
+                    f"批量转换已取消！\n"
+                    f"成功: {successful_conversions} 个文件\n"
+                    f"未转换: {cancelled_conversions} 个文件\n"
+                    f"下次启动时可以继续转换剩余的文件")
+            elif failed_conversions == 0:
+                self.call_in_ui(messagebox.showinfo, "成功", f"所有文件转换完成！\n成功转换 {successful_conversions} 个文件{skipped_text}")
             else:
-                messagebox.showwarning("完成", 
+                self.call_in_ui(messagebox.showwarning, "完成", 
                     f"批量转换完成！\n"
                     f"成功: {successful_conversions} 个文件\n"
-                    f"失败: {failed_conversions} 个文件\n"
+                    f"失败: {failed_conversions} 个文件{skipped_text}\n"
                     f"请查看日志了解失败详情")
             
-            self.convert_btn.config(state=tk.NORMAL)
+        except Exception as e:
+            self.update_status(f"批量转换过程出错: {str(e)}")
+            self.call_in_ui(messagebox.showerror, "错误", f"批量转换过程出错: {str(e)}")
+        finally:
+            if manifest:
+                manifest.close()
+            if schedule:
+                schedule.save()
+            if journal:
+                # 全部处理完才删除日志；取消或出错时保留，下次启动时继续
+                if not completed:
+                    journal.close()
+                else:
+                    journal.finish()
+            self.call_in_ui(self.finish_conversion_controls)
+
+    def perform_remote_conversion(self):
+        """把文件提交给转换服务，定期查询各任务的状态；取消时取消服务中还未完成的任务"""
+        control = self.batch_control
+        try:
+            client = JobClient(self.job_server_url)
+            rows = {}
+            for index, file_path in enumerate(self.file_paths):
+                rows.setdefault(os.path.abspath(file_path), index)
+            self.call_in_ui(self.file_list.reset_states)
+            
+            options = dict(self.job_options)
+            routes = options.pop("routes", None)
+            self.update_status(f"正在把 {len(self.file_paths)} 个文件提交到转换服务 {self.job_server_url}")
+            response = client.submit(self.job_conversion_type, self.file_paths, self.output_dir, options, routes, force=not self.incremental)
+            for item in response["rejected"]:
+                self.update_status(f"跳过: {os.path.basename(item['source'])} - {item['error']}")
+                row = rows.get(os.path.abspath(item["source"]))
+                if row is not None:
+                    self.call_in_ui(self.file_list.update_file, row, "skipped", output=item["error"])
+            jobs = {job["id"]: job for job in response["jobs"]}
+            reused = sum(1 for job in jobs.values() if job.get("reused"))
+            self.update_status(f"已提交 {len(jobs)} 个任务" + (f"，其中 {reused} 个与服务中未完成的任务相同，直接等待其结果" if reused else ""))
+            
+            counts = collections.Counter()
+            pending = set(jobs)
+            cancel_sent = False
+            while pending:
+                if control.cancelled and not cancel_sent:
+                    cancel_sent = True
+                    for job_id in sorted(pending):
+                        try:
+                            client.cancel(job_id)
+                        except Exception:
+                            pass  # 已结束或正在进程池中转换的任务无法取消，等待其结束
+                for job in client.jobs(sorted(pending)):
+                    row = rows.get(job["source"])
+                    if job["state"] not in JOB_FINISHED_STATES:
+                        if row is not None and job["state"] == "running":
+                            self.call_in_ui(self.file_list.update_file, row, "running")
+                        continue
+                    pending.discard(job["id"])
+                    name = os.path.basename(job["source"])
+                    if job["state"] == "done" and job["skipped"]:
+                        counts["skipped"] += 1
+                        state = "skipped"
+                    elif job["state"] == "done":
+                        counts["done"] += 1
+                        state = "done"
+                        method_text = f"（{CONVERSION_METHOD_NAMES[job['method']]}）" if job["method"] in CONVERSION_METHOD_NAMES else ""
+                        self.update_status(f"✓ 转换成功: {name} -> {os.path.basename(job['output'])}{method_text}")
+                    elif job["state"] == "cancelled":
+                        counts["cancelled"] += 1
+                        state = "cancelled"
+                    else:
+                        counts["failed"] += 1
+                        state = "failed"
+                        self.update_status(f"✗ 转换失败: {name} - {job['error']}")
+                    if row is not None:
+                        self.call_in_ui(self.file_list.update_file, row, state, job["elapsed"] if state == "done" else None, job["output"] or job["error"])
+                    finished = len(jobs) - len(pending)
+                    self.update_batch_progress(finished, len(jobs), name)
+                    self.update_progress(finished * 100 / len(jobs))
+                if pending:
+                    time.sleep(SERVER_POLL_INTERVAL)
             
+            self.ui_events.put(("batch", ""))
+            lines = [f"成功: {counts['done']} 个", f"失败: {counts['failed']} 个"]
+            if counts["cancelled"]:
+                lines.append(f"已取消: {counts['cancelled']} 个")
+            if counts["skipped"]:
+                lines.append(f"跳过未变化: {counts['skipped']} 个")
+            if response["rejected"]:
+                lines.append(f"未提交: {len(response['rejected'])} 个")
+            self.update_status("转换服务已处理完本批任务！" + "，".join(lines))
+            if control.cancelled:
+                self.call_in_ui(messagebox.showinfo, "已取消", "批量转换已取消！\n" + "\n".join(lines))
+            elif counts["failed"] == 0:
+                self.call_in_ui(messagebox.showinfo, "成功", "所有文件转换完成！\n" + "\n".join(lines))
+            else:
+                self.call_in_ui(messagebox.showwarning, "完成", "批量转换完成！\n" + "\n".join(lines) + "\n请查看日志了解失败详情")
         except Exception as e:
             self.update_status(f"批量转换过程出错: {str(e)}")
-            messagebox.showerror("错误", f"批量转换过程出错: {str(e)}")
-            self.convert_btn.config(state=tk.NORMAL)
+            self.call_in_ui(messagebox.showerror, "错误", f"批量转换过程出错: {str(e)}")
+        finally:
+            self.call_in_ui(self.finish_conversion_controls)
 
-if __name__ == "__main__":
+# 命令行退出码
+EXIT_OK = 0  # 全部转换成功
+EXIT_FAILED = 1  # 有文件转换失败
+EXIT_USAGE = 2  # 参数错误或没有可转换的文件
+EXIT_CANCELLED = 3  # 转换被取消，可用resume子命令继续
+
+def collect_input_files(patterns, conv_type, include=(), exclude=(), max_depth=None, symlinks="files", routes=None):
+    """展开命令行传入的文件、目录和通配符（支持**），返回去重后的文件列表
+
+    include/exclude/max_depth/symlinks用于扫描目录，含义见DirectoryScanner；routes为混合类型批次的路由规则
+    """
+    extensions = tuple(supported_extensions(conv_type, routes))
+    file_paths = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isfile(pattern):
+            # 明确指定的文件不按扩展名过滤
+            candidates = [pattern]
+        elif os.path.isdir(pattern):
+            candidates = list(DirectoryScanner(pattern, extensions, include, exclude, max_depth, symlinks).scan())
+        else:
+            candidates = glob.glob(pattern, recursive=True)
+            candidates = [path for path in candidates if os.path.isfile(path) and path.lower().endswith(extensions)]
+        
+        for path in sorted(candidates):
+            path = os.path.abspath(path)
+            if path not in seen:
+                seen.add(path)
+                file_paths.append(path)
+    return file_paths
+
+def options_from_args(args):
+    """根据命令行参数生成转换选项"""
+    options = {
+        "image_quality": args.quality,
+        "max_dimension": args.max_size,
+        "excel_orientation": args.excel_orientation,
+        "excel_fit_to_page": not args.no_excel_fit,
+        "stream_copy": not args.no_stream_copy,
+        "preset": args.preset,
+        "crf": args.crf,
+        "video_bitrate": args.video_bitrate,
+        "audio_bitrate": args.audio_bitrate,
+        "sample_rate": args.sample_rate,
+        "video_codec": args.video_codec,
+        "audio_codec": args.audio_codec,
+        "threads": args.threads,
+        "segment_parallel": args.segment_parallel,
+        "segments": args.segments,
+        "segment_min_duration": args.segment_min_duration,
+        "pdf_parallel": not args.no_pdf_parallel,
+        "pdf_workers": args.pdf_workers,
+        "pdf_parallel_min_pages": args.pdf_min_pages,
+        "office_backend": args.office_backend,
+        "office_recycle_after": args.office_recycle_after,
+    }
+    if args.format:
+        options["target_format"] = args.format.lower()
+    if args.ico_sizes:
+        sizes = [int(size) for size in args.ico_sizes.split(",") if size.strip()]
+        options["ico_sizes"] = [(size, size) for size in sizes]
+    return options
+
+def run_cli_convert(args):
+    """命令行批量转换，返回退出码"""
+    conv_type = args.type
+    try:
+        options = options_from_args(args)
+    except ValueError:
+        print(f"无效的ICO尺寸: {args.ico_sizes}", file=sys.stderr)
+        return EXIT_USAGE
+    
+    if conv_type in TARGET_FORMATS:
+        options.setdefault("target_format", TARGET_FORMATS[conv_type][0])
+        if options["target_format"] not in TARGET_FORMATS[conv_type]:
+            print(f"不支持的目标格式: {options['target_format']}，可选: {', '.join(TARGET_FORMATS[conv_type])}", file=sys.stderr)
+            return EXIT_USAGE
+    if conv_type == AUTO_CONVERSION:
+        # 混合类型：各类文件的目标格式由--route指定
+        if args.format:
+            print(f"混合类型的批次请用 --route 指定各类文件的目标格式，如 --route image={args.format}", file=sys.stderr)
+            return EXIT_USAGE
+        try:
+            options["routes"] = parse_routes(args.route)
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+            return EXIT_USAGE
+    elif args.route:
+        print("--route 只用于混合类型（-t auto）的批次", file=sys.stderr)
+        return EXIT_USAGE
+    
+    file_paths = collect_input_files(args.inputs, conv_type, args.include or (), args.exclude or (), args.max_depth, args.symlinks, options.get("routes"))
+    if not file_paths:
+        print("未找到需要转换的文件", file=sys.stderr)
+        return EXIT_USAGE
+    
+    output_dir = os.path.abspath(args.output)
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # 记录批次日志，被中断时可以用resume子命令继续
+    journal = BatchJournal.create(conv_type, output_dir, options, file_paths, {"incremental": not args.force, "dedup": not args.no_dedup})
+    return run_cli_batch(args, conv_type, file_paths, output_dir, options, journal)
+
+def run_cli_resume(args):
+    """继续被中断的批量转换，返回退出码"""
+    paths = BatchJournal.find_unfinished()
+    if args.list:
+        for path in paths:
+            journal = BatchJournal.load(path)
+            journal.close()
+            print(f"{path}\n  {journal.describe()}")
+        if not paths:
+            print("没有未完成的批量转换")
+        return EXIT_OK
+    
+    path = args.journal or (paths[0] if paths else None)
+    if not path:
+        print("没有未完成的批量转换", file=sys.stderr)
+        return EXIT_USAGE
+    try:
+        journal = BatchJournal.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"无法读取批量转换日志 {path}: {str(e)}", file=sys.stderr)
+        return EXIT_USAGE
+    
+    header = journal.header
+    output_dir = header["output_dir"]
+    os.makedirs(output_dir, exist_ok=True)
+    removed = remove_stale_partials(output_dir)
+    file_paths = journal.pending_files()
+    print(f"继续{journal.describe()}，剩余 {len(file_paths)} 个" + (f"，已清理 {removed} 个残留的临时文件" if removed else ""), file=sys.stderr)
+    
+    settings = header.get("settings", {})
+    args.force = not settings.get("incremental", True)
+    args.no_dedup = not settings.get("dedup", True)
+    return run_cli_batch(args, header["conversion_type"], file_paths, output_dir, header["options"], journal)
+
+def run_cli_batch(args, conv_type, file_paths, output_dir, options, journal):
+    """执行一批命令行转换（新的批次或继续的批次），第一次按Ctrl+C取消并保留日志，返回退出码
+
+    混合类型的批次按文件类型分组，各组使用自己的选项，所有任务进入同一个执行器，各执行通道同时处理
+    """
+    groups, unrouted = route_batch(conv_type, file_paths, options)
+    
+    # 增量转换：源文件和选项都未变化、输出文件仍然有效的跳过
+    manifest = None if args.force else ConversionManifest()
+    skipped = []
+    if manifest:
+        for index, (group_type, group_files, group_options) in enumerate(groups):
+            group_files, group_skipped = manifest.partition(group_type, group_files, output_dir, group_options)
+            groups[index] = (group_type, group_files, group_options)
+            skipped.extend((source, output, group_type) for source, output in group_skipped)
+    # 每个文件的转换类型和选项
+    routes = {file_path: (group_type, group_options) for group_type, group_files, group_options in groups for file_path in group_files}
+    file_paths = list(routes)
+    
+    # 内容相同的文件只转换一次
+    dedup = None if args.no_dedup else DuplicatePlan(file_paths, {file_path: route[0] for file_path, route in routes.items()})
+    if dedup:
+        file_paths = dedup.unique
+    
+    # 只有音视频转换才需要ffmpeg
+    ffmpeg_path = None
+    type_counts = collections.Counter(routes[file_path][0] for file_path in file_paths)
+    for group_type, group_files, group_options in groups:
+        if not type_counts[group_type]:
+            continue
+        if group_type in ("audio_convert", "video_convert"):
+            ffmpeg_path = ffmpeg_path or extract_ffmpeg()
+            if not group_options["threads"]:
+                # 多个ffmpeg并行时按CPU核心数分配线程，避免过度占用
+                group_options["threads"] = cpu_budget(min(args.workers, type_counts[group_type]))
+        if group_type == "pdf_to_word" and not group_options["pdf_workers"]:
+            # 多个PDF同时转换时按核心数分配每个PDF的页面解析进程
+            group_options["pdf_workers"] = cpu_budget(min(args.workers, type_counts[group_type]))
+    
+    def print_status(message):
+        print(message, file=sys.stderr)
+    
+    executor = BatchExecutor(args.workers)
+    # 按预计耗时安排开始顺序，整批完成时间接近 总工作量 / 并行任务数
+    schedule = None
+    if file_paths and not getattr(args, "no_schedule", False):
+        schedule = BatchSchedule([(routes[file_path][0], file_path, routes[file_path][1]) for file_path in file_paths], executor, ffmpeg_path)
+        file_paths = schedule.file_paths
+        if args.verbose:
+            print_status(schedule.describe())
+    
+    jobs = []
+    for i, file_path in enumerate(file_paths):
+        job_type, job_options = routes[file_path]
+        lane = CONVERSION_LANES[job_type]
+        kwargs = {"status": print_status} if args.verbose and lane != "process" else {}
+        jobs.append(BatchJob(i, file_path, lane, _run_conversion_job, (job_type, file_path, output_dir, job_options, ffmpeg_path), kwargs))
+    
+    results = []
+    
+    method_counts = collections.Counter()
+    # 各阶段耗时指标，按参数写入JSON Lines日志、Prometheus文件和Chrome trace
+    metrics = ConversionMetrics(getattr(args, "metrics_log", None), getattr(args, "prometheus_file", None), getattr(args, "trace", None))
+    
+    def on_result(job, result, error):
+        if getattr(args, "startup_probe", False) and not results:
+            _startup_mark("image")
+        job_type, job_options = routes[job.file_path]
+        metrics.record(job_type, job.file_path, result, error, job.queued)
+        if schedule and error is None:
+            schedule.observe(job.file_path, result)
+        result = result or {}
+        method = result.get("method")
+        if method:
+            method_counts[method] += 1
+        duplicates, duplicate_errors = dedup.materialize(job.file_path, result["output"]) if error is None and dedup else ([], [])
+        if manifest and error is None:
+            manifest.record(job_type, job.file_path, output_dir, job_options, result["output"], method, dedup.hashes.get(job.file_path) if dedup else None)
+            for duplicate, duplicate_output in duplicates:
+                manifest.record(job_type, duplicate, output_dir, job_options, duplicate_output, method, dedup.hashes.get(duplicate))
+        if error is None:
+            journal.mark_done(job.file_path, result["output"])
+            for duplicate, duplicate_output in duplicates:
+                journal.mark_done(duplicate, duplicate_output)
+        status = "ok" if error is None else "cancelled" if isinstance(error, ConversionCancelled) else "failed"
+        results.append({
+            "source": job.file_path,
+            "type": job_type,
+            "output": result.get("output"),
+            "method": method,
+            "status": status,
+            "error": None if error is None else str(error),
+        })
+        if error is not None and dedup:
+            # 转换失败时内容相同的文件同样失败
+            duplicates = [(duplicate, None) for duplicate in dedup.duplicates.get(job.file_path, [])]
+        for duplicate, duplicate_output in duplicates:
+            results.append({
+                "source": duplicate,
+                "type": job_type,
+                "output": duplicate_output,
+                "method": method,
+                "status": status,
+                "error": None if error is None else str(error),
+                "duplicate_of": job.file_path,
+            })
+        for duplicate, message in duplicate_errors:
+            results.append({
+                "source": duplicate,
+                "type": job_type,
+                "output": None,
+                "method": method,
+                "status": "failed",
+                "error": message,
+                "duplicate_of": job.file_path,
+            })
+        if not args.json and status != "cancelled":
+            if error is None:
+                method_text = f"（{CONVERSION_METHOD_NAMES[method]}）" if method else ""
+                print(f"成功: {job.file_path} -> {result['output']}{method_text}")
+                for duplicate, duplicate_output in duplicates:
+                    print(f"成功: {duplicate} -> {duplicate_output}（与 {os.path.basename(job.file_path)} 内容相同）")
+                for duplicate, message in duplicate_errors:
+                    print(f"失败: {duplicate} - {message}")
+            else:
+                print(f"失败: {job.file_path} - {str(error)}")
+                for duplicate, _ in duplicates:
+                    print(f"失败: {duplicate} - 与 {os.path.basename(job.file_path)} 内容相同，{str(error)}")
+    
+    # 第一次Ctrl+C：终止正在运行的ffmpeg，不再开始新任务，已完成的记录在日志中；再按一次强制退出
+    control = BatchControl()
+    
+    def handle_interrupt(signum, frame):
+        if control.cancelled:
+            raise KeyboardInterrupt
+        print("正在取消，等待正在进行的任务结束（再按一次Ctrl+C强制退出）...", file=sys.stderr)
+        control.cancel()
+    
+    previous_handler = signal.signal(signal.SIGINT, handle_interrupt)
+    started = time.time()
+    for file_path, file_type in unrouted:
+        if not args.json:
+            print(f"跳过: {file_path} - {describe_unrouted(file_type)}")
+    try:
+        executor.run(jobs, on_result, control=control)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        metrics.close()
+        if schedule:
+            schedule.save()
+        if manifest:
+            manifest.close()
+        if control.cancelled:
+            journal.close()
+        else:
+            journal.finish()
+    elapsed = time.time() - started
+    
+    cancelled = sum(1 for result in results if result["status"] == "cancelled")
+    failed = sum(1 for result in results if result["status"] == "failed")
+    succeeded = len(results) - failed - cancelled
+    results.extend({
+        "source": source,
+        "type": file_type,
+        "output": output,
+        "method": None,
+        "status": "skipped",
+        "error": None,
+    } for source, output, file_type in skipped)
+    results.extend({
+        "source": source,
+        "type": file_type,
+        "output": None,
+        "method": None,
+        "status": "unsupported",
+        "error": describe_unrouted(file_type),
+    } for source, file_type in unrouted)
+    if args.json:
+        print(json.dumps({
+            "conversion_type": conv_type,
+            "output_dir": output_dir,
+            "workers": executor.max_workers,
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": failed,
+            "cancelled": cancelled,
+            "journal": journal.path if control.cancelled else None,
+            "skipped": len(skipped),
+            "unsupported": len(unrouted),
+            "types": dict(collections.Counter(result["type"] for result in results if result["status"] not in ("skipped", "unsupported"))),
+            "deduplicated": {
+                "files": dedup.saved_files,
+                "bytes": dedup.saved_bytes,
+                "hashed_bytes": dedup.hashed_bytes,
+            } if dedup else None,
+            "methods": dict(method_counts),
+            "elapsed": round(elapsed, 3),
+            "stages": {stage: round(seconds, 3) for stage, seconds in metrics.totals().items()},
+            "schedule": {
+                "workers": schedule.workers,
+                "estimated_work": round(schedule.work, 3),
+                "estimated_makespan": round(schedule.makespan, 3),
+                "lower_bound": round(schedule.lower_bound, 3),
+            } if schedule else None,
+            "office": executor.office_stats,
+            "results": results,
+        }, ensure_ascii=False, indent=2))
+    else:
+        methods_text = f"（{describe_methods(method_counts)}）" if method_counts else ""
+        skipped_text = f"，跳过未变化: {len(skipped)} 个" if skipped else ""
+        if unrouted:
+            skipped_text += f"，未识别或未选择的类型: {len(unrouted)} 个"
+        print(f"转换完成！成功: {succeeded} 个，失败: {failed} 个{skipped_text}{methods_text}，用时 {elapsed:.1f} 秒")
+        if dedup and dedup.duplicate_count:
+            print(dedup.describe())
+        for stats in executor.office_stats.values():
+            print(describe_office_stats(stats))
+        if schedule:
+            print(f"{schedule.describe()}，实际用时 {elapsed:.1f} 秒")
+        if jobs:
+            print(metrics.describe())
+        if control.cancelled:
+            print(f"已取消，{cancelled} 个文件未转换，运行 resume 子命令可以继续")
+    
+    if control.cancelled:
+        return EXIT_CANCELLED
+    return EXIT_OK if failed == 0 else EXIT_FAILED
+
+def run_watch(args):
+    """监视目录，持续转换新增或修改的文件，直到按Ctrl+C或收到SIGTERM"""
+    conv_type = args.type
+    try:
+        options = options_from_args(args)
+    except ValueError:
+        print(f"无效的ICO尺寸: {args.ico_sizes}", file=sys.stderr)
+        return EXIT_USAGE
+    if conv_type in TARGET_FORMATS:
+        options.setdefault("target_format", TARGET_FORMATS[conv_type][0])
+        if options["target_format"] not in TARGET_FORMATS[conv_type]:
+            print(f"不支持的目标格式: {options['target_format']}，可选: {', '.join(TARGET_FORMATS[conv_type])}", file=sys.stderr)
+            return EXIT_USAGE
+    for directory in args.directories:
+        if not os.path.isdir(directory):
+            print(f"监视目录不存在: {directory}", file=sys.stderr)
+            return EXIT_USAGE
+    
+    output_dir = os.path.abspath(args.output)
+    os.makedirs(output_dir, exist_ok=True)
+    ffmpeg_path = None
+    if conv_type in ("audio_convert", "video_convert"):
+        ffmpeg_path = extract_ffmpeg()
+        if not options["threads"]:
+            options["threads"] = cpu_budget(args.workers)
+    if conv_type == "pdf_to_word" and not options["pdf_workers"]:
+        options["pdf_workers"] = cpu_budget(args.workers)
+    
+    def print_status(message):
+        print(f"[{time.strftime('%H:%M:%S')}] {message}", file=sys.stderr, flush=True)
+    
+    def write_metrics(snapshot):
+        if not args.metrics_file:
+            return
+        temp_path = args.metrics_file + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, args.metrics_file)
+    
+    conversion_metrics = ConversionMetrics(args.metrics_log, args.prometheus_file, args.trace)
+    service = WatchService(
+        args.directories, conv_type, output_dir, options, args.workers, ffmpeg_path,
+        settle=args.settle, queue_size=args.queue_size, incremental=not args.force,
+        polling=args.polling, poll_interval=args.poll_interval, status=print_status, verbose=args.verbose,
+        conversion_metrics=conversion_metrics
+    )
+    
+    def watch_gauges():
+        snapshot = service.snapshot()
+        return {
+            "watch_backlog": ("Files waiting to be converted", snapshot["backlog"]),
+            "watch_settling": ("Files still being written", snapshot["settling"]),
+            "watch_in_flight": ("Files being converted", snapshot["in_flight"]),
+            "watch_arrival_per_minute": ("New files per minute", snapshot["arrival_per_min"]),
+            "watch_throughput_per_minute": ("Converted files per minute", snapshot["throughput_per_min"]),
+        }
+    
+    conversion_metrics.gauges = watch_gauges
+    
+    def on_metrics(snapshot):
+        write_metrics(snapshot)
+        conversion_metrics.maybe_write_prometheus(force=True)
+    
+    server = None
+    if args.metrics_port:
+        server = serve_metrics(args.metrics_port, conversion_metrics)
+        print_status(f"指标接口: http://127.0.0.1:{args.metrics_port}/metrics")
+    
+    def handle_sigterm(signum, frame):
+        service.stop()
+    
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    try:
+        service.run(args.metrics_interval, on_metrics)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server:
+            server.shutdown()
+        conversion_metrics.close()
+    print_status(service.describe(service.snapshot()))
+    print_status(conversion_metrics.describe())
+    print_status("已停止监视")
+    return EXIT_OK
+
+def run_server(args):
+    """以转换服务模式运行：在本机提供HTTP/JSON接口，直到按Ctrl+C或收到SIGTERM"""
+    def print_status(message):
+        print(f"[{time.strftime('%H:%M:%S')}] {message}", file=sys.stderr, flush=True)
+    
+    try:
+        token = args.token or load_server_token(create=True)
+    except OSError as e:
+        print(f"无法保存访问令牌 {server_token_path()}: {str(e)}", file=sys.stderr)
+        return EXIT_FAILED
+    if not args.token:
+        print_status(f"访问令牌保存在 {server_token_path()}，本机的图形界面和loadgen自动读取")
+    roots = [os.path.abspath(root) for root in (args.root or [os.getcwd()])]
+    print_status(f"源文件和输出目录必须在以下目录中: {', '.join(roots)}")
+    job_queue = JobQueue(args.queue_db)
+    conversion_metrics = ConversionMetrics(args.metrics_log, args.prometheus_file, args.trace)
+    job_server = JobServer(
+        job_queue, args.workers, extract_ffmpeg(), {"office_backend": args.office_backend},
+        status=print_status, verbose=args.verbose, conversion_metrics=conversion_metrics, roots=roots
+    )
+    
+    def server_gauges():
+        counts = job_queue.counts()
+        return {
+            "server_queued_jobs": ("Jobs waiting in the queue", counts["queued"]),
+            "server_running_jobs": ("Jobs being converted", counts["running"]),
+        }
+    
+    conversion_metrics.gauges = server_gauges
+    job_server.start()
+    try:
+        server = serve_jobs(job_server, args.host, args.port, token, args.allow_host or ())
+    except OSError as e:
+        print(f"无法监听 {args.host}:{args.port}: {str(e)}", file=sys.stderr)
+        job_server.stop()
+        job_queue.close()
+        return EXIT_FAILED
+    print_status(f"转换服务地址: http://{args.host}:{server.server_address[1]}（任务队列: {job_queue.path}）")
+    
+    stopped = threading.Event()
+    
+    def handle_sigterm(signum, frame):
+        stopped.set()
+    
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    next_metrics = time.time() + WATCH_METRICS_INTERVAL
+    try:
+        while not stopped.wait(SERVER_POLL_INTERVAL):
+            if time.time() >= next_metrics:
+                conversion_metrics.maybe_write_prometheus(force=True)
+                next_metrics = time.time() + WATCH_METRICS_INTERVAL
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print_status("正在停止，等待转换中的任务结束")
+        server.shutdown()
+        job_server.stop()
+        conversion_metrics.close()
+        print_status(job_server.describe(job_server.snapshot()))
+        job_queue.close()
+    print_status("转换服务已停止")
+    return EXIT_OK
+
+def run_gui(args=None):
+    """启动图形界面"""
+    if tk is None:
+        print("未安装tkinter，无法启动图形界面，请使用 convert 子命令进行命令行转换", file=sys.stderr)
+        return EXIT_USAGE
     root = tk.Tk()
     app = FormatConverter(root)
+    if getattr(args, "startup_probe", False):
+        # 启动耗时测试：窗口完成首次绘制后立即退出
+        root.update()
+        _startup_mark("window")
+        root.destroy()
+        return EXIT_OK
     root.mainloop()
+    return EXIT_OK
+
+def run_backends(args):
+    """列出各转换后端的可用情况"""
+    report = backend_report()
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        for name, info in report.items():
+            state = "可用" if info["available"] else f"未安装 (pip install {info['package']})"
+            print(f"{name:<10} {info['purpose']:<16} {state}")
+    return EXIT_OK
+
+def _startup_mark(label):
+    """启动耗时测试的探针：输出当前时间戳，由父进程计算从进程启动到此刻的耗时"""
+    print(f"STARTUP_MARK {label} {time.time():.6f}", flush=True)
+
+def _self_command():
+    """返回重新启动本程序的命令（兼容打包后的exe）"""
+    if getattr(sys, 'frozen', False):
+        return [sys.executable]
+    return [sys.executable, os.path.abspath(__file__)]
+
+def _measure_startup(cmd, label, timeout=120):
+    """启动子进程并返回从启动到探针输出的秒数"""
+    started = time.time()
+    process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    for line in process.stdout.decode("utf-8", errors="ignore").splitlines():
+        parts = line.split()
+        if len(parts) == 3 and parts[0] == "STARTUP_MARK" and parts[1] == label:
+            return float(parts[2]) - started
+    error_msg = process.stderr.decode("utf-8", errors="ignore").strip()
+    raise Exception(error_msg[-500:] or f"子进程退出码 {process.returncode}")
+
+def run_startup_benchmark(args):
+    """测量从进程启动到首个窗口显示、到完成首次图片转换的耗时"""
+    work_dir = tempfile.mkdtemp(prefix="startup-bench-")
+    try:
+        probes = [("window", _self_command() + ["gui", "--startup-probe"])]
+        if backend_available("pillow"):
+            sample = os.path.join(work_dir, "sample.jpg")
+            load_backend("pillow").new("RGB", (1920, 1080), (30, 120, 200)).save(sample, "JPEG")
+            probes.append(("image", _self_command() + [
+                "convert", "-t", "image_convert", "-f", "png", sample,
+                "-o", os.path.join(work_dir, "output"), "-j", "1", "--startup-probe"
+            ]))
+        
+        results = {}
+        for label, cmd in probes:
+            timings = []
+            error = None
+            for _ in range(args.runs):
+                try:
+                    timings.append(_measure_startup(cmd, label))
+                except Exception as e:
+                    error = str(e)
+                    break
+            results[label] = {
+                "runs": len(timings),
+                "min_ms": round(min(timings) * 1000, 1) if timings else None,
+                "median_ms": round(statistics.median(timings) * 1000, 1) if timings else None,
+                "max_ms": round(max(timings) * 1000, 1) if timings else None,
+                "error": error,
+            }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        names = {"window": "启动到首个窗口", "image": "启动到首次图片转换"}
+        for label, result in results.items():
+            if result["error"]:
+                print(f"{names[label]}: 测试失败 - {result['error']}")
+            else:
+                print(f"{names[label]}: 中位数 {result['median_ms']} ms (最快 {result['min_ms']} ms，最慢 {result['max_ms']} ms，共 {result['runs']} 次)")
+    return EXIT_OK if all(not result["error"] for result in results.values()) else EXIT_FAILED
+
+# 基准测试：离线生成的合成语料 + 每个转换类型、每组选项的吞吐量/延迟/内存/输出大小
+BENCH_CORPUS_VERSION = 1  # 语料生成方式变化时递增，旧语料自动重新生成
+BENCH_SEED = 20240601
+BENCH_DEFAULT_THRESHOLD = 0.10  # 比基线差超过10%视为退化
+BENCH_LATENCY_NOISE_MS = 2.0  # 延迟变化小于此毫秒数时不算退化（计时抖动）
+
+# 语料规模：各语料组的文件规格
+# images: (颜色模式, 尺寸, 保存格式)；animations: (帧数, 尺寸)；audio: (时长秒, 格式)；
+# video: (时长秒, 尺寸)；pdf: 页数；word/excel/ppt: 段落数/行数/幻灯片数
+BENCH_SCALES = {
+    "small": {
+        "images": [("RGB", (1920, 1080), "jpg"), ("RGB", (4000, 3000), "jpg"), ("RGBA", (1024, 1024), "png"),
+                   ("L", (2048, 1536), "png"), ("P", (800, 600), "png"), ("CMYK", (2400, 1600), "tiff"),
+                   ("RGB", (640, 480), "bmp"), ("RGB", (1280, 720), "webp")],
+        "animations": [(24, (480, 270)), (60, (320, 240))],
+        "audio": [(30, "wav"), (30, "flac"), (60, "m4a")],
+        "video": [(6, (640, 360)), (10, (1280, 720))],
+        "pdf": [4, 24],
+        "word": [20, 80],
+        "excel": [200, 1000],
+        "ppt": [5, 20],
+    },
+}
+BENCH_SCALES["medium"] = {group: specs * 4 for group, specs in BENCH_SCALES["small"].items()}
+
+# 基准用例：(名称, 语料组, 转换类型, 选项)
+BENCH_CASES = [
+    ("image-jpg", "images", "image_convert", {"target_format": "jpg", "image_quality": 85}),
+    ("image-png", "images", "image_convert", {"target_format": "png"}),
+    ("image-webp", "images", "image_convert", {"target_format": "webp"}),
+    ("image-ico", "images", "image_convert", {"target_format": "ico"}),
+    ("image-thumbnail", "images", "image_convert", {"target_format": "jpg", "max_dimension": 512}),
+    ("gif-webp", "animations", "image_convert", {"target_format": "webp"}),
+    ("audio-mp3", "audio", "audio_convert", {"target_format": "mp3"}),
+    ("audio-flac", "audio", "audio_convert", {"target_format": "flac"}),
+    ("video-mkv-copy", "video", "video_convert", {"target_format": "mkv"}),
+    ("video-mp4-fast", "video", "video_convert", {"target_format": "mp4", "stream_copy": False, "preset": "fast"}),
+    ("video-mp4-segments", "video", "video_convert", {"target_format": "mp4", "stream_copy": False, "preset": "fast",
+                                                      "segment_parallel": True, "segment_min_duration": 5}),
+    ("pdf-docx", "pdf", "pdf_to_word", {"pdf_parallel": False}),
+    ("pdf-docx-parallel", "pdf", "pdf_to_word", {"pdf_parallel": True, "pdf_parallel_min_pages": 10}),
+    ("word-pdf", "word", "word_to_pdf", {}),
+    ("excel-pdf", "excel", "excel_to_pdf", {}),
+    ("ppt-pdf", "ppt", "ppt_to_pdf", {}),
+]
+
+# 对比基线时检查的指标：(键名, 显示名称, 是否越大越好)
+BENCH_METRICS = [
+    ("files_per_sec", "吞吐量", True),
+    ("p50_ms", "p50延迟", False),
+    ("p95_ms", "p95延迟", False),
+    ("peak_rss_mb", "峰值内存", False),
+    ("output_bytes", "输出大小", False),
+]
+
+BENCH_WORDS = ("alpha beta gamma delta render layout table column invoice report summary total "
+               "quarter revenue margin forecast region product budget review draft final").split()
+
+def _bench_text(rng, words):
+    return " ".join(rng.choice(BENCH_WORDS) for _ in range(words)).capitalize() + "."
+
+def _bench_image(rng, mode, size):
+    """生成一张合成图片：渐变背景、随机形状和少量噪声，压缩难度接近真实照片"""
+    Image = load_backend("pillow")
+    ImageDraw = importlib.import_module("PIL.ImageDraw")
+    width, height = size
+    image = Image.merge("RGB", [
+        Image.linear_gradient("L").resize(size),
+        Image.radial_gradient("L").resize(size),
+        Image.linear_gradient("L").rotate(90).resize(size),
+    ])
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        w, h = rng.randrange(width // 10 + 1), rng.randrange(height // 10 + 1)
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        if rng.random() < 0.5:
+            draw.ellipse((x, y, x + w, y + h), fill=color)
+        else:
+            draw.rectangle((x, y, x + w, y + h), fill=color)
+    noise_size = (max(1, width // 4), max(1, height // 4))
+    noise = Image.frombytes("L", noise_size, rng.randbytes(noise_size[0] * noise_size[1])).resize(size)
+    image = Image.blend(image, Image.merge("RGB", [noise] * 3), 0.15)
+    if mode == "RGBA":
+        image.putalpha(Image.radial_gradient("L").resize(size))
+    elif mode == "P":
+        image = image.convert("P", palette=Image.Palette.ADAPTIVE)
+    elif mode != "RGB":
+        image = image.convert(mode)
+    return image
+
+def _bench_animation(rng, frames, size):
+    """生成GIF动画的各帧：在固定背景上移动的色块"""
+    Image = load_backend("pillow")
+    ImageDraw = importlib.import_module("PIL.ImageDraw")
+    background = _bench_image(rng, "RGB", size)
+    width, height = size
+    shapes = [(rng.randrange(width), rng.randrange(height), rng.randrange(1, 8), rng.randrange(1, 8),
+               (rng.randrange(256), rng.randrange(256), rng.randrange(256))) for _ in range(8)]
+    images = []
+    for index in range(frames):
+        frame = background.copy()
+        draw = ImageDraw.Draw(frame)
+        for x, y, dx, dy, color in shapes:
+            cx, cy = (x + dx * index * 4) % width, (y + dy * index * 4) % height
+            draw.ellipse((cx - 20, cy - 20, cx + 20, cy + 20), fill=color)
+        images.append(frame.convert("P", palette=Image.Palette.ADAPTIVE))
+    return images
+
+def _bench_ffmpeg(ffmpeg_path, args, output):
+    """用ffmpeg的lavfi测试源生成音视频文件"""
+    cmd = [ffmpeg_path, "-hide_banner", "-loglevel", "error", "-y"] + args + [output]
+    process = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise Exception(process.stderr.decode("utf-8", errors="ignore").strip()[-300:])
+
+def _bench_generate_group(group, specs, group_dir, rng, ffmpeg_path):
+    """生成一个语料组的全部文件，返回相对语料目录的文件名列表"""
+    files = []
+    for index, spec in enumerate(specs):
+        if group == "images":
+            mode, size, fmt = spec
+            name = f"{mode.lower()}-{size[0]}x{size[1]}-{index}.{fmt}"
+            image = _bench_image(rng, mode, size)
+            image.save(os.path.join(group_dir, name), **({"quality": 90} if fmt in ("jpg", "webp") else {}))
+        elif group == "animations":
+            frames, size = spec
+            name = f"anim-{frames}f-{index}.gif"
+            images = _bench_animation(rng, frames, size)
+            images[0].save(os.path.join(group_dir, name), save_all=True, append_images=images[1:], duration=40, loop=0)
+        elif group == "audio":
+            duration, fmt = spec
+            name = f"tone-{duration}s-{index}.{fmt}"
+            frequency = 220 + rng.randrange(660)
+            codec = ["-c:a", "aac", "-b:a", "128k"] if fmt == "m4a" else []
+            _bench_ffmpeg(ffmpeg_path, ["-f", "lavfi", "-i", f"sine=frequency={frequency}:sample_rate=44100:duration={duration}",
+                                        "-ac", "2"] + codec, os.path.join(group_dir, name))
+        elif group == "video":
+            duration, size = spec
+            name = f"testsrc-{size[0]}x{size[1]}-{duration}s-{index}.mp4"
+            _bench_ffmpeg(ffmpeg_path, [
+                "-f", "lavfi", "-i", f"testsrc2=size={size[0]}x{size[1]}:rate=25:duration={duration}",
+                "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={duration}",
+                "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-g", "50",
+                "-c:a", "aac", "-shortest",
+            ], os.path.join(group_dir, name))
+        elif group == "pdf":
+            fitz = importlib.import_module("fitz")
+            name = f"document-{spec}p-{index}.pdf"
+            document = fitz.open()
+            for page_number in range(spec):
+                page = document.new_page()
+                page.insert_text((72, 72), f"Benchmark page {page_number + 1}", fontsize=18)
+                y = 110
+                for _ in range(24):
+                    page.insert_text((72, y), _bench_text(rng, 10), fontsize=10)
+                    y += 14
+                # 简单的表格，让版面分析有表格可识别
+                for row in range(6):
+                    for column in range(4):
+                        rect = fitz.Rect(72 + column * 110, y + 10 + row * 20, 182 + column * 110, y + 30 + row * 20)
+                        page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+                        page.insert_text((rect.x0 + 4, rect.y1 - 6), str(rng.randrange(10000)), fontsize=9)
+            document.save(os.path.join(group_dir, name))
+            document.close()
+        elif group == "word":
+            docx = importlib.import_module("docx")
+            name = f"document-{spec}-{index}.docx"
+            document = docx.Document()
+            document.add_heading("Benchmark document", 0)
+            for paragraph in range(spec):
+                if paragraph % 10 == 0:
+                    document.add_heading(_bench_text(rng, 4), 1)
+                document.add_paragraph(_bench_text(rng, 60))
+            table = document.add_table(rows=10, cols=4)
+            for cell in table._cells:
+                cell.text = str(rng.randrange(10000))
+            document.save(os.path.join(group_dir, name))
+        elif group == "excel":
+            openpyxl = importlib.import_module("openpyxl")
+            name = f"sheet-{spec}rows-{index}.xlsx"
+            workbook = openpyxl.Workbook()
+            sheet = workbook.active
+            sheet.append(["Region", "Product", "Quarter", "Revenue", "Margin"])
+            for _ in range(spec):
+                sheet.append([rng.choice(BENCH_WORDS), rng.choice(BENCH_WORDS), f"Q{rng.randrange(1, 5)}",
+                              rng.randrange(100000), round(rng.random(), 3)])
+            workbook.save(os.path.join(group_dir, name))
+        elif group == "ppt":
+            pptx = importlib.import_module("pptx")
+            name = f"slides-{spec}-{index}.pptx"
+            presentation = pptx.Presentation()
+            for _ in range(spec):
+                slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+                slide.shapes.title.text = _bench_text(rng, 4)
+                slide.placeholders[1].text = "\n".join(_bench_text(rng, 8) for _ in range(5))
+            presentation.save(os.path.join(group_dir, name))
+        files.append(os.path.join(group, name))
+    return files
+
+# 生成各语料组需要的模块（不可用时该组的用例跳过）
+BENCH_GROUP_MODULES = {
+    "images": "PIL",
+    "animations": "PIL",
+    "pdf": "fitz",
+    "word": "docx",
+    "excel": "openpyxl",
+    "ppt": "pptx",
+}
+
+def build_bench_corpus(corpus_dir, scale, groups, ffmpeg_path=None, status=None):
+    """生成（或复用已生成的）基准测试语料，返回 {语料组: {"files": [绝对路径], "error": 无法生成的原因}}
+
+    语料只依赖固定随机种子，相同版本和规模生成的文件完全相同；已生成的语料组直接复用
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    index_path = os.path.join(corpus_dir, "corpus.json")
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != BENCH_CORPUS_VERSION or index.get("scale") != scale:
+            index = None
+    except (OSError, ValueError):
+        index = None
+    if index is None:
+        index = {"version": BENCH_CORPUS_VERSION, "scale": scale, "seed": BENCH_SEED, "groups": {}}
+    
+    corpus = {}
+    for group in groups:
+        entry = index["groups"].get(group)
+        if entry and all(os.path.exists(os.path.join(corpus_dir, name)) for name in entry):
+            corpus[group] = {"files": [os.path.join(corpus_dir, name) for name in entry], "error": None}
+            continue
+        
+        module = BENCH_GROUP_MODULES.get(group)
+        if module and importlib.util.find_spec(module) is None:
+            corpus[group] = {"files": [], "error": f"未安装{module}，无法生成测试文件"}
+            continue
+        if group in ("audio", "video") and not ffmpeg_path:
+            corpus[group] = {"files": [], "error": "未找到ffmpeg，无法生成测试文件"}
+            continue
+        
+        if status:
+            status(f"生成测试语料: {group}")
+        group_dir = os.path.join(corpus_dir, group)
+        shutil.rmtree(group_dir, ignore_errors=True)
+        os.makedirs(group_dir)
+        # 每组使用独立的随机序列，增删其他组不影响本组的内容
+        rng = random.Random(f"{BENCH_SEED}-{group}")
+        try:
+            names = _bench_generate_group(group, BENCH_SCALES[scale][group], group_dir, rng, ffmpeg_path)
+        except Exception as e:
+            corpus[group] = {"files": [], "error": f"生成测试文件失败: {str(e)}"}
+            continue
+        index["groups"][group] = names
+        corpus[group] = {"files": [os.path.join(corpus_dir, name) for name in names], "error": None}
+    
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    return corpus
+
+def _percentile(values, fraction):
+    """线性插值的百分位数"""
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def _peak_rss_mb():
+    """当前进程及已结束子进程（ffmpeg等）的峰值内存，不支持的系统返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linux上单位为KB，macOS上为字节
+    unit = 1 if sys.platform == "darwin" else 1024
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak * unit / (1024 * 1024), 1)
+
+def _bench_run_case(conv_type, file_paths, output_dir, options, ffmpeg_path):
+    """在独立的子进程中依次转换一组文件（模块级函数，可被进程池pickle）
+
+    先转换第一个文件预热（导入后端、启动Office实例），不计入结果
+    """
+    warmup_dir = os.path.join(output_dir, "warmup")
+    os.makedirs(warmup_dir, exist_ok=True)
+    try:
+        _run_conversion_job(conv_type, file_paths[0], warmup_dir, options, ffmpeg_path)
+    except Exception:
+        pass  # 预热失败时正式转换同样会失败并记录错误
+    
+    latencies = []
+    output_bytes = 0
+    errors = []
+    started = time.perf_counter()
+    for file_path in file_paths:
+        file_started = time.perf_counter()
+        try:
+            result = _run_conversion_job(conv_type, file_path, output_dir, options, ffmpeg_path)
+        except Exception as e:
+            errors.append(f"{os.path.basename(file_path)}: {str(e)}")
+            continue
+        latencies.append(time.perf_counter() - file_started)
+        output_bytes += os.path.getsize(result["output"])
+    wall = time.perf_counter() - started
+    release_office_pools()
+    return {"latencies": latencies, "wall": wall, "output_bytes": output_bytes, "errors": errors, "peak_rss_mb": _peak_rss_mb()}
+
+def bench_case_unavailable(conv_type, options, ffmpeg_path):
+    """返回用例无法运行的原因，可以运行时返回None"""
+    if conv_type == "image_convert" and not backend_available("pillow"):
+        return "未安装pillow"
+    if conv_type == "pdf_to_word" and not backend_available("pdf2docx"):
+        return "未安装pdf2docx"
+    if conv_type in ("audio_convert", "video_convert") and not ffmpeg_path:
+        return "未找到ffmpeg"
+    if conv_type in ("word_to_pdf", "excel_to_pdf", "ppt_to_pdf"):
+        backend = resolve_office_backend(options.get("office_backend", "auto"))
+        if backend == "com" and not backend_available("comtypes" if conv_type == "ppt_to_pdf" else "win32com"):
+            return "未安装Office自动化组件"
+        if backend == "libreoffice" and not find_soffice():
+            return "未找到LibreOffice"
+    return None
+
+def run_bench_case(name, conv_type, file_paths, work_dir, options, ffmpeg_path, runs):
+    """运行一个基准用例 runs 次，每次在新的子进程中进行，汇总吞吐量、延迟、内存和输出大小"""
+    input_bytes = sum(os.path.getsize(file_path) for file_path in file_paths)
+    latencies = []
+    throughputs = []
+    peaks = []
+    output_bytes = 0
+    converted = 0
+    errors = []
+    for run in range(runs):
+        output_dir = os.path.join(work_dir, name, str(run))
+        os.makedirs(output_dir, exist_ok=True)
+        # 每次用spawn方式启动新进程，峰值内存不包含主进程（生成语料时导入的模块等）的内存
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            result = pool.submit(_bench_run_case, conv_type, file_paths, output_dir, options, ffmpeg_path).result()
+        latencies.extend(result["latencies"])
+        if result["latencies"]:
+            throughputs.append(len(result["latencies"]) / result["wall"])
+        if result["peak_rss_mb"] is not None:
+            peaks.append(result["peak_rss_mb"])
+        output_bytes = result["output_bytes"]
+        converted = len(result["latencies"])
+        errors.extend(result["errors"])
+        shutil.rmtree(output_dir, ignore_errors=True)
+    
+    return {
+        "conversion_type": conv_type,
+        "options": options,
+        "files": len(file_paths),
+        "converted": converted,
+        "runs": runs,
+        "input_bytes": input_bytes,
+        "files_per_sec": round(statistics.median(throughputs), 3) if throughputs else None,
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        "peak_rss_mb": max(peaks) if peaks else None,
+        "output_bytes": output_bytes,
+        "errors": errors[:10],
+    }
+
+def compare_bench_results(baseline, current, threshold=BENCH_DEFAULT_THRESHOLD):
+    """对比两次基准测试结果，返回 [(用例, 指标键名, 基线值, 当前值, 相对变化, 是否退化)]"""
+    rows = []
+    for name, case in current["cases"].items():
+        base_case = baseline.get("cases", {}).get(name)
+        if not base_case or case.get("skipped") or base_case.get("skipped"):
+            continue
+        for key, _, higher_is_better in BENCH_METRICS:
+            old, new = base_case.get(key), case.get(key)
+            if not old or new is None:
+                continue
+            if key == "output_bytes" and case.get("converted") != base_case.get("converted"):
+                continue  # 成功转换的文件数不同，输出大小没有可比性
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            regressed = worse > threshold
+            if regressed and key in ("p50_ms", "p95_ms") and abs(new - old) < BENCH_LATENCY_NOISE_MS:
+                regressed = False
+            rows.append((name, key, old, new, change, regressed))
+    return rows
+
+def run_benchmark(args):
+    """运行基准测试，保存结果并可与基线对比，有退化时返回EXIT_FAILED"""
+    if args.list:
+        for name, group, conv_type, options in BENCH_CASES:
+            print(f"{name:<20} {group:<11} {conv_type:<14} {json.dumps(options, ensure_ascii=False)}")
+        return EXIT_OK
+    
+    def print_status(message):
+        print(message, file=sys.stderr)
+    
+    if args.load:
+        with open(args.load, "r", encoding="utf-8") as f:
+            results = json.load(f)
+    else:
+        patterns = split_patterns(";".join(args.cases or [])) or ["*"]
+        cases = [case for case in BENCH_CASES if any(fnmatch.fnmatch(case[0], pattern) for pattern in patterns)]
+        if not cases:
+            print(f"没有匹配的基准用例: {', '.join(patterns)}", file=sys.stderr)
+            return EXIT_USAGE
+        
+        ffmpeg_path = extract_ffmpeg()
+        corpus_dir = args.corpus_dir or os.path.join(get_cache_dir(), "bench-corpus", args.scale)
+        corpus = build_bench_corpus(corpus_dir, args.scale, sorted({case[1] for case in cases}), ffmpeg_path, print_status)
+        
+        results = {
+            "version": BENCH_CORPUS_VERSION,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "scale": args.scale,
+            "runs": args.runs,
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "ffmpeg": ffmpeg_path,
+            },
+            "cases": {},
+        }
+        work_dir = tempfile.mkdtemp(prefix="bench-")
+        try:
+            for name, group, conv_type, case_options in cases:
+                options = dict(DEFAULT_OPTIONS, **case_options)
+                options["office_backend"] = args.office_backend
+                reason = corpus[group]["error"] or bench_case_unavailable(conv_type, options, ffmpeg_path)
+                if reason:
+                    results["cases"][name] = {"conversion_type": conv_type, "skipped": reason}
+                    print_status(f"跳过 {name}: {reason}")
+                    continue
+                print_status(f"运行 {name}（{len(corpus[group]['files'])} 个文件 × {args.runs} 次）")
+                results["cases"][name] = run_bench_case(name, conv_type, corpus[group]["files"], work_dir, options, ffmpeg_path, args.runs)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            print_status(f"结果已保存到 {args.output}")
+    
+    regressions = []
+    comparison = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != results.get("scale"):
+            print_status(f"注意：基线的语料规模（{baseline.get('scale')}）与本次（{results.get('scale')}）不同，结果不可直接比较")
+        comparison = compare_bench_results(baseline, results, args.threshold)
+        regressions = [row for row in comparison if row[5]]
+    
+    if args.json:
+        output = dict(results)
+        if comparison is not None:
+            output["comparison"] = [
+                {"case": name, "metric": key, "baseline": old, "current": new, "change": round(change, 4), "regression": regressed}
+                for name, key, old, new, change, regressed in comparison
+            ]
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+    else:
+        print(f"{'用例':<20}{'文件数':>6}{'文件/秒':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'峰值内存(MB)':>14}{'输出大小':>12}")
+        for name, case in results["cases"].items():
+            if case.get("skipped"):
+                print(f"{name:<20}跳过：{case['skipped']}")
+                continue
+            print(f"{name:<20}{case['files']:>6}{case['files_per_sec'] or '-':>10}{case['p50_ms'] or '-':>10}"
+                  f"{case['p95_ms'] or '-':>10}{case['peak_rss_mb'] or '-':>14}{format_file_size(case['output_bytes']):>12}")
+            for error in case["errors"]:
+                print(f"    失败: {error}")
+        if comparison is not None:
+            names = {key: label for key, label, _ in BENCH_METRICS}
+            directions = {key: higher_is_better for key, _, higher_is_better in BENCH_METRICS}
+            changed = [row for row in comparison if row[5] or abs(row[4]) > args.threshold]
+            print(f"\n与基线 {args.compare} 对比（阈值 {args.threshold:.0%}）：")
+            for name, key, old, new, change, regressed in changed:
+                mark = "退化" if regressed else "改进" if (change > 0) == directions[key] else "变化"
+                print(f"  [{mark}] {name} {names[key]}: {old} -> {new} ({change:+.1%})")
+            if not changed:
+                print("  各项指标变化都在阈值以内")
+    
+    if any(case.get("errors") for case in results["cases"].values()):
+        return EXIT_FAILED
+    return EXIT_FAILED if regressions else EXIT_OK
+
+def run_loadgen(args):
+    """压力测试：用基准测试语料向转换服务并发提交任务，统计吞吐量和延迟分布
+
+    不指定 --url 时在本进程中启动一个使用临时任务队列的服务。每个客户端线程提交一个任务后等待其结束再提交下一个，
+    端到端延迟包括提交、排队和转换；任务都带force提交，不会因转换记录而跳过
+    """
+    def print_status(message):
+        print(message, file=sys.stderr)
+    
+    patterns = split_patterns(";".join(args.cases or [])) or ["image-*"]
+    cases = [case for case in BENCH_CASES if any(fnmatch.fnmatch(case[0], pattern) for pattern in patterns)]
+    if not cases:
+        print(f"没有匹配的基准用例: {', '.join(patterns)}", file=sys.stderr)
+        return EXIT_USAGE
+    ffmpeg_path = extract_ffmpeg()
+    corpus_dir = args.corpus_dir or os.path.join(get_cache_dir(), "bench-corpus", args.scale)
+    corpus = build_bench_corpus(corpus_dir, args.scale, sorted({case[1] for case in cases}), ffmpeg_path, print_status)
+    work = []  # (用例, 转换类型, 源文件, 选项)
+    for name, group, conv_type, case_options in cases:
+        reason = corpus[group]["error"] or bench_case_unavailable(conv_type, dict(DEFAULT_OPTIONS, office_backend=args.office_backend, **case_options), ffmpeg_path)
+        if reason:
+            print_status(f"跳过 {name}: {reason}")
+            continue
+        work.extend((name, conv_type, file_path, case_options) for file_path in corpus[group]["files"])
+    if not work:
+        print("没有可运行的用例", file=sys.stderr)
+        return EXIT_FAILED
+    
+    work_dir = tempfile.mkdtemp(prefix="loadgen-")
+    job_queue = job_server = server = None
+    url = args.url
+    token = args.token
+    try:
+        if not url:
+            token = secrets.token_urlsafe(32)
+            job_queue = JobQueue(os.path.join(work_dir, SERVER_QUEUE_FILE))
+            job_server = JobServer(job_queue, args.workers, ffmpeg_path, {"office_backend": args.office_backend}, status=print_status, roots=[corpus_dir, work_dir])
+            job_server.start()
+            server = serve_jobs(job_server, "127.0.0.1", 0, token)
+            url = f"http://127.0.0.1:{server.server_address[1]}"
+        client = JobClient(url, token)
+        print_status(f"向 {url} 提交 {args.jobs} 个任务（并发 {args.concurrency}，用例: {', '.join(sorted({item[0] for item in work}))}）")
+        
+        samples = []  # (用例, 状态, 端到端延迟, 提交延迟, 排队耗时, 错误)
+        samples_lock = threading.Lock()
+        counter = iter(range(args.jobs))
+        counter_lock = threading.Lock()
+        
+        def run_client(index):
+            output_dir = os.path.join(work_dir, f"client-{index}")
+            while True:
+                with counter_lock:
+                    number = next(counter, None)
+                if number is None:
+                    return
+                name, conv_type, file_path, case_options = work[number % len(work)]
+                started = time.perf_counter()
+                try:
+                    response = client.submit(conv_type, [file_path], output_dir, case_options, client=f"loadgen-{index}", force=True)
+                    submitted = time.perf_counter()
+                    if response["rejected"]:
+                        raise Exception(response["rejected"][0]["error"])
+                    job = response["jobs"][0]
+                    while job["state"] not in JOB_FINISHED_STATES:
+                        job = client.job(job["id"], wait=SERVER_MAX_WAIT)
+                    finished = time.perf_counter()
+                    queue_wait = job["started"] - job["submitted"] if job["started"] else None
+                    sample = (name, job["state"], finished - started, submitted - started, queue_wait, job["error"])
+                except Exception as e:
+                    sample = (name, "failed", time.perf_counter() - started, None, None, str(e))
+                with samples_lock:
+                    samples.append(sample)
+        
+        wall_started = time.perf_counter()
+        threads = [threading.Thread(target=run_client, args=(index,)) for index in range(max(1, args.concurrency))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - wall_started
+    finally:
+        if server:
+            server.shutdown()
+        if job_server:
+            job_server.stop()
+        if job_queue:
+            job_queue.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    
+    def summary(values):
+        values = [value * 1000 for value in values if value is not None]
+        return {key: round(_percentile(values, fraction), 1) if values else None
+                for key, fraction in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99), ("max_ms", 1.0))}
+    
+    done = [sample for sample in samples if sample[1] == "done"]
+    report = {
+        "url": args.url or "（本进程内的服务）",
+        "jobs": len(samples),
+        "done": len(done),
+        "failed": len(samples) - len(done),
+        "concurrency": args.concurrency,
+        "seconds": round(wall, 3),
+        "jobs_per_sec": round(len(done) / wall, 2) if wall > 0 else None,
+        "latency": summary(sample[2] for sample in done),
+        "submit_latency": summary(sample[3] for sample in done),
+        "queue_wait": summary(sample[4] for sample in done),
+        "cases": {name: {"jobs": sum(1 for sample in samples if sample[0] == name),
+                         "latency": summary(sample[2] for sample in done if sample[0] == name)}
+                  for name in sorted({sample[0] for sample in samples})},
+        "errors": sorted({f"{sample[0]}: {sample[5]}" for sample in samples if sample[1] != "done"}),
+    }
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"任务: {report['jobs']} 个（成功 {report['done']}，失败 {report['failed']}），并发 {report['concurrency']}，"
+              f"用时 {report['seconds']} 秒，吞吐量 {report['jobs_per_sec']} 个/秒")
+        print(f"{'':<16}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'最大(ms)':>10}")
+        rows = [("端到端延迟", report["latency"]), ("提交请求", report["submit_latency"]), ("排队等待", report["queue_wait"])]
+        rows.extend((name, case["latency"]) for name, case in report["cases"].items())
+        for label, values in rows:
+            print(f"{label:<16}" + "".join(f"{values[key] if values[key] is not None else '-':>10}" for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms")))
+        for error in report["errors"][:10]:
+            print(f"    失败: {error}")
+        if len(report["errors"]) > 10:
+            print(f"    ……另有 {len(report['errors']) - 10} 种错误，用 --json 查看全部")
+    return EXIT_FAILED if report["failed"] else EXIT_OK
+
+def add_conversion_arguments(parser, mixed=False):
+    """添加convert和watch子命令共用的转换参数，mixed表示支持混合类型（auto）"""
+    choices = list(SUPPORTED_EXTENSIONS) + ([AUTO_CONVERSION] if mixed else [])
+    parser.add_argument("-t", "--type", required=True, choices=choices, help="转换类型" + ("（auto: 按文件内容自动识别每个文件的类型）" if mixed else ""))
+    parser.add_argument("-f", "--format", help="目标格式（音频、视频、图片转换时使用）")
+    parser.add_argument("-o", "--output", default=os.path.expanduser("~/转换输出"), help="输出目录")
+    parser.add_argument("-j", "--workers", type=int, default=default_worker_count(), help="并行任务数")
+    parser.add_argument("--quality", type=int, default=DEFAULT_OPTIONS["image_quality"], help="图片质量 (1-100)")
+    parser.add_argument("--max-size", type=int, default=0, help="图片长边的最大像素数，超过时按比例缩小（0表示保持原尺寸）")
+    parser.add_argument("--ico-sizes", help="ICO图标尺寸，用逗号分隔，如 16,32,48")
+    parser.add_argument("--excel-orientation", choices=["landscape", "portrait"], default=DEFAULT_OPTIONS["excel_orientation"], help="Excel转PDF页面方向")
+    parser.add_argument("--no-excel-fit", action="store_true", help="Excel转PDF时不自动调整到单页宽度")
+    parser.add_argument("--no-stream-copy", action="store_true", help="音视频始终重新编码，不直接复制兼容的音视频流")
+    parser.add_argument("--preset", choices=list(ENCODER_PRESET_NAMES), default="default", help="音视频编码预设")
+    parser.add_argument("--crf", type=int, help="视频质量CRF值（x264/x265/vpx编码器）")
+    parser.add_argument("--video-bitrate", help="视频码率，如 4M")
+    parser.add_argument("--audio-bitrate", help="音频码率，如 192k")
+    parser.add_argument("--sample-rate", type=int, help="音频采样率，如 44100")
+    parser.add_argument("--video-codec", help="视频编码器，如 libx264、libx265、libvpx-vp9")
+    parser.add_argument("--audio-codec", help="音频编码器，如 aac、libmp3lame")
+    parser.add_argument("--threads", type=int, default=0, help="每个ffmpeg进程的线程数（0表示按并行任务数自动分配）")
+    parser.add_argument("--segment-parallel", action="store_true", help="视频需要重新编码时按关键帧分段并行转码")
+    parser.add_argument("--segments", type=int, default=0, help="分段并行转码的分段数（0表示按CPU核心数）")
+    parser.add_argument("--segment-min-duration", type=float, default=SEGMENT_MIN_DURATION, help="时长达到此秒数的视频才分段转码")
+    parser.add_argument("--no-pdf-parallel", action="store_true", help="PDF转Word时不使用多进程并行解析页面")
+    parser.add_argument("--pdf-workers", type=int, default=0, help="PDF页面解析进程数（0表示按CPU核心数和并行任务数自动分配）")
+    parser.add_argument("--pdf-min-pages", type=int, default=PDF_PARALLEL_MIN_PAGES, help="PDF达到此页数才并行解析")
+    parser.add_argument("--office-backend", choices=["auto"] + list(OFFICE_BACKENDS), default=DEFAULT_OPTIONS["office_backend"], help="Office文档转PDF使用的后端（auto: 安装了pywin32时用Office COM，否则用LibreOffice；fake为测试用的模拟后端）")
+    parser.add_argument("--office-recycle-after", type=int, default=OFFICE_RECYCLE_AFTER, help="每个Office实例转换多少个文档后重启")
+    parser.add_argument("--force", action="store_true", help="忽略转换记录，重新转换所有文件（默认跳过源文件和选项都未变化的文件）")
+    add_metrics_arguments(parser)
+
+def add_metrics_arguments(parser):
+    """添加各阶段耗时指标的导出参数"""
+    parser.add_argument("--metrics-log", help="把每个任务的各阶段耗时以JSON Lines格式追加到此文件")
+    parser.add_argument("--prometheus-file", help="定期把指标以Prometheus文本格式写入此文件（供node_exporter的textfile收集器读取）")
+    parser.add_argument("--trace", help="结束时把各任务、各阶段的时间线写入此Chrome trace文件（在chrome://tracing或Perfetto中打开）")
+
+def build_arg_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(
+        prog="全能格式转换器",
+        description="全能格式转换工具，不带参数运行时启动图形界面"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    
+    gui_parser = subparsers.add_parser("gui", help="启动图形界面")
+    gui_parser.add_argument("--startup-probe", action="store_true", help=argparse.SUPPRESS)
+    gui_parser.set_defaults(func=run_gui)
+    
+    convert_parser = subparsers.add_parser("convert", help="不启动界面，直接批量转换")
+    convert_parser.add_argument("inputs", nargs="+", help="源文件、目录或通配符（如 'photos/**/*.jpg'）")
+    add_conversion_arguments(convert_parser, mixed=True)
+    convert_parser.add_argument("--route", action="append", help=f"混合类型批次中某类文件的目标格式，如 image=webp、video=mkv，设为 {ROUTE_SKIP} 则不转换（可重复指定；类型: {', '.join(ROUTE_NAMES)}）")
+    convert_parser.add_argument("--include", action="append", help="扫描目录时只转换匹配此通配符的文件（可重复指定；含/时匹配相对路径，否则匹配文件名）")
+    convert_parser.add_argument("--exclude", action="append", help="扫描目录时跳过匹配此通配符的文件和子目录（可重复指定）")
+    convert_parser.add_argument("--max-depth", type=int, help="扫描目录时向下进入的子目录层数（默认不限，0表示不进入子目录）")
+    convert_parser.add_argument("--symlinks", choices=list(SYMLINK_POLICIES), default="files", help="扫描目录时符号链接的处理方式（files: 跟随文件链接；follow: 同时进入目录链接；skip: 忽略）")
+    convert_parser.add_argument("--no-dedup", action="store_true", help="不查找内容重复的源文件（默认内容相同的文件只转换一次，其余用硬链接或复制生成输出）")
+    convert_parser.add_argument("--no-schedule", action="store_true", help="按文件列表顺序开始转换（默认按预计耗时安排，最长的任务先开始）")
+    convert_parser.add_argument("--json", action="store_true", help="以JSON格式输出转换结果")
+    convert_parser.add_argument("-v", "--verbose", action="store_true", help="输出转换过程日志")
+    convert_parser.add_argument("--startup-probe", action="store_true", help=argparse.SUPPRESS)
+    convert_parser.set_defaults(func=run_cli_convert)
+    
+    watch_parser = subparsers.add_parser("watch", help="监视目录，自动转换新增或修改的文件")
+    watch_parser.add_argument("directories", nargs="+", help="要监视的目录（包括子目录）")
+    add_conversion_arguments(watch_parser)
+    watch_parser.add_argument("--settle", type=float, default=WATCH_SETTLE_SECONDS, help="文件大小和修改时间保持不变多少秒后才开始转换")
+    watch_parser.add_argument("--queue-size", type=int, default=WATCH_QUEUE_SIZE, help="等待转换的任务队列上限")
+    watch_parser.add_argument("--polling", action="store_true", help="不使用inotify，定期扫描目录（网络共享目录等inotify收不到事件时使用）")
+    watch_parser.add_argument("--poll-interval", type=float, default=WATCH_POLL_INTERVAL, help="轮询模式下扫描目录的间隔（秒）")
+    watch_parser.add_argument("--metrics-interval", type=float, default=WATCH_METRICS_INTERVAL, help="输出运行指标的间隔（秒）")
+    watch_parser.add_argument("--metrics-file", help="定期把运行指标以JSON格式写入此文件")
+    watch_parser.add_argument("--metrics-port", type=int, help="在此端口（仅本机）提供Prometheus格式的 /metrics 接口")
+    watch_parser.add_argument("-v", "--verbose", action="store_true", help="输出转换过程日志")
+    watch_parser.set_defaults(func=run_watch)
+    
+    resume_parser = subparsers.add_parser("resume", help="继续被取消或中断的批量转换")
+    resume_parser.add_argument("journal", nargs="?", help="批量转换日志文件（默认最近一次未完成的批次）")
+    resume_parser.add_argument("--list", action="store_true", help="列出所有未完成的批量转换")
+    resume_parser.add_argument("-j", "--workers", type=int, default=default_worker_count(), help="并行任务数")
+    resume_parser.add_argument("--json", action="store_true", help="以JSON格式输出转换结果")
+    resume_parser.add_argument("-v", "--verbose", action="store_true", help="输出转换过程日志")
+    add_metrics_arguments(resume_parser)
+    resume_parser.set_defaults(func=run_cli_resume)
+    
+    backends_parser = subparsers.add_parser("backends", help="列出各转换后端是否可用（不导入后端）")
+    backends_parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    backends_parser.set_defaults(func=run_backends)
+    
+    startup_parser = subparsers.add_parser("bench-startup", help="测量启动到首个窗口、到首次图片转换的耗时")
+    startup_parser.add_argument("--runs", type=int, default=5, help="每项测试的运行次数")
+    startup_parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    startup_parser.set_defaults(func=run_startup_benchmark)
+    
+    bench_parser = subparsers.add_parser("bench", help="用离线生成的测试语料测量各转换类型的吞吐量、延迟、内存和输出大小")
+    bench_parser.add_argument("--scale", choices=list(BENCH_SCALES), default="small", help="测试语料规模")
+    bench_parser.add_argument("--cases", action="append", help="只运行名称匹配此通配符的用例（可重复指定，如 'image-*'）")
+    bench_parser.add_argument("--runs", type=int, default=3, help="每个用例的运行次数")
+    bench_parser.add_argument("--corpus-dir", help="测试语料目录（默认在缓存目录中，生成后复用）")
+    bench_parser.add_argument("--office-backend", choices=["auto"] + list(OFFICE_BACKENDS), default="auto", help="Office用例使用的后端")
+    bench_parser.add_argument("-o", "--output", help="把结果保存为JSON文件，可作为之后对比的基线")
+    bench_parser.add_argument("--compare", help="与此基线结果文件对比，有指标退化时退出码为1")
+    bench_parser.add_argument("--threshold", type=float, default=BENCH_DEFAULT_THRESHOLD, help="指标比基线差超过此比例时视为退化")
+    bench_parser.add_argument("--load", help="不运行测试，直接读取此结果文件（与--compare一起对比两次已保存的结果）")
+    bench_parser.add_argument("--list", action="store_true", help="列出所有基准用例")
+    bench_parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    bench_parser.set_defaults(func=run_benchmark)
+    
+    serve_parser = subparsers.add_parser("serve", help="以转换服务模式运行，在本机提供HTTP/JSON接口（提交、查询、取消任务和下载结果）")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认仅本机）")
+    serve_parser.add_argument("--port", type=int, default=SERVER_PORT, help="监听端口")
+    serve_parser.add_argument("-j", "--workers", type=int, default=default_worker_count(), help="并行任务数")
+    serve_parser.add_argument("--queue-db", help="任务队列数据库文件（默认在缓存目录中，服务重启后未完成的任务继续转换）")
+    serve_parser.add_argument("--token", help="访问令牌，请求必须带有 Authorization: Bearer <令牌>（默认自动生成并保存在缓存目录中）")
+    serve_parser.add_argument("--root", action="append", help="允许提交的源文件和输出目录所在的目录（可重复指定，默认为启动服务时的当前目录）")
+    serve_parser.add_argument("--allow-host", action="append", help="除本机地址和监听地址外允许的Host请求头，例如服务器的域名（可重复指定）")
+    serve_parser.add_argument("--office-backend", choices=["auto"] + list(OFFICE_BACKENDS), default=DEFAULT_OPTIONS["office_backend"], help="Office文档转PDF使用的后端")
+    serve_parser.add_argument("-v", "--verbose", action="store_true", help="输出转换过程日志")
+    add_metrics_arguments(serve_parser)
+    serve_parser.set_defaults(func=run_server)
+    
+    loadgen_parser = subparsers.add_parser("loadgen", help="向转换服务并发提交基准测试语料，测量吞吐量和延迟分布")
+    loadgen_parser.add_argument("--url", help="转换服务地址（默认在本进程中启动一个临时服务）")
+    loadgen_parser.add_argument("--token", help="转换服务的访问令牌（默认读取本机服务自动生成的令牌）")
+    loadgen_parser.add_argument("--jobs", type=int, default=100, help="提交的任务总数")
+    loadgen_parser.add_argument("--concurrency", type=int, default=4, help="同时等待结果的客户端数")
+    loadgen_parser.add_argument("--cases", action="append", help="使用名称匹配此通配符的基准用例（可重复指定，默认 'image-*'）")
+    loadgen_parser.add_argument("--scale", choices=list(BENCH_SCALES), default="small", help="测试语料规模")
+    loadgen_parser.add_argument("--corpus-dir", help="测试语料目录（默认在缓存目录中，与bench共用）")
+    loadgen_parser.add_argument("-j", "--workers", type=int, default=default_worker_count(), help="临时服务的并行任务数（指定--url时无效）")
+    loadgen_parser.add_argument("--office-backend", choices=["auto"] + list(OFFICE_BACKENDS), default="auto", help="临时服务的Office后端")
+    loadgen_parser.add_argument("--json", action="store_true", help="以JSON格式输出")
+    loadgen_parser.set_defaults(func=run_loadgen)
+    
+    return parser
+
+def main(argv=None):
+    """程序入口：不带参数时启动图形界面，否则执行命令行子命令"""
+    parser = build_arg_parser()
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    if not args.command:
+        return run_gui(args)
+    return args.func(args)
+
+if __name__ == "__main__":
+    # 打包为exe后，进程池的子进程需要此调用才能正常启动
+    multiprocessing.freeze_support()
+    sys.exit(main())